@@ -13,6 +13,7 @@ from .api.routes.brainstorm import brainstorm_bp
 from .api.routes.prompt import prompt_bp
 from .api.routes.assistant import assistant_bp
 from .api.routes.rag import rag_bp
+from .api.routes.jobs import jobs_bp
 from flask_cors import CORS
 import os
 
@@ -47,6 +48,8 @@ def create_app() -> Flask:
     app.register_blueprint(prompt_bp)
     # 注册同步与分析
     app.register_blueprint(analyze_bp)
+    # 注册后台任务查询
+    app.register_blueprint(jobs_bp)
     # 注册 Markdown 浏览
     app.register_blueprint(markdown_bp)
     # 注册助手配置
@@ -58,6 +61,24 @@ def create_app() -> Flask:
     return app
 
 
+def warm_up_services() -> None:
+    """
+    预先创建全局服务（索引、笔记、Git 同步、任务队列）、导入分块依赖，RAG_SEARCH_MODE 不是 vector 时构建 BM25 索引。
+    create_app() 不再触发这些初始化；多进程部署时在每个 worker fork 之后调用，
+    避免第一个请求承担加载索引的延迟，也避免在父进程中创建的线程/文件句柄被子进程继承。
+    """
+    from .api.services.git_sync import get_git_sync
+    from .api.services.indexer import get_note_indexer
+    from .api.services.jobs import get_job_manager
+    from .api.services.notes import get_notes
+
+    get_notes()
+    get_git_sync()
+    get_job_manager()
+    get_note_indexer().warm_up()
+    import langchain_text_splitters  # noqa: F401
+
+
 if __name__ == '__main__':
     app = create_app()
     app.run(debug=True, host='0.0.0.0', port=8000)
\ No newline at end of file
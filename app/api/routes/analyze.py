@@ -2,17 +2,25 @@
 同步、标签与关系建议接口
 """
 
-from typing import List, Optional
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, List, Optional
 
 from flask import Blueprint, request, jsonify
 from flask.typing import ResponseReturnValue
 from pathlib import Path
 
 from app.config.settings import settings
-from app.api.services.git_sync import git_sync
-from app.api.services.markdown_io import read_markdown_files, upsert_tags_to_frontmatter
-from app.api.services.indexer import note_indexer
+from app.api.services.git_sync import get_git_sync
+from app.api.services.markdown_io import (
+    match_note_glob,
+    read_markdown_files,
+    read_markdown_files_by_paths,
+    upsert_tags_to_frontmatter,
+)
+from app.api.services.indexer import get_note_indexer
+from app.api.services.jobs import Job, get_job_manager
 from app.api.services.ai_providers import get_chat_client
+from app.utils.file_lock import interprocess_lock
 
 analyze_bp = Blueprint("analyze", __name__, url_prefix="/api")
 
@@ -20,25 +28,163 @@ analyze_bp = Blueprint("analyze", __name__, url_prefix="/api")
 @analyze_bp.route("/sync", methods=["POST"])
 def sync_repo_and_index() -> ResponseReturnValue:
     """
-    触发 Git pull 并重建向量索引
+    提交后台同步任务并立即返回任务 id，进度通过 GET /api/jobs/<id> 查询
+    body（可选）: {"full": true} 强制全量重建
+    排队中的同步任务会合并后续触发，连续多次触发只会多跑一次
     """
     if not settings.NOTE_REPO_URL:
         return jsonify({"error": "未配置 NOTE_REPO_URL，请在 .env 文件中设置笔记仓库地址。"}), 400
+    if settings.INDEX_READ_ONLY:
+        return jsonify({"error": "当前进程为只读检索模式（INDEX_READ_ONLY=true），请在写进程中执行同步。"}), 409
+
+    data = request.get_json(silent=True) or {}
+    full = bool(data.get("full", False))
+    job, coalesced = get_job_manager().submit(
+        "sync",
+        lambda job: _run_sync(job, full),
+        coalesce_key="sync:full" if full else "sync",
+    )
+    return jsonify({"job_id": job.id, "status": job.status, "coalesced": coalesced, "job": job.to_dict()}), 202
+
+
+def _run_sync(job: Job, full: bool = False) -> Dict[str, Any]:
+    """
+    后台同步：Git pull 后按“索引记录的提交（source_head）→ 新 HEAD”的 diff 增量更新向量索引；
+    索引为空、没有记录提交、该提交已不存在（diff 失败）或指定 full 时回退到全量重建。
+    新 HEAD 只在全部文件写入后与索引一同落盘，嵌入失败、取消或进程退出都会让下一次同步从原提交重新比较。
+    嵌入接口只跳过个别 chunk 时其余内容照常写入、HEAD 照常前进，这些文件记入索引的重试列表，
+    之后的增量同步重新嵌入（最多 SYNC_RETRY_LIMIT 次）；任务结果标记 partial 并列出这些文件。
+    多 worker 部署（配置了 JOB_STATE_DIR）时各进程的同步通过共享目录下的 sync.lock 串行执行，避免同时操作同一个 Git 工作区
+    """
+    with _sync_lock():
+        return _sync_locked(job, full)
+
+
+def _sync_lock() -> ContextManager[None]:
+    """多 worker 部署时串行化各进程的同步（JOB_STATE_DIR 下的 sync.lock），单进程时不加锁。"""
+    if not settings.JOB_STATE_DIR:
+        return nullcontext()
+    return interprocess_lock(Path(settings.JOB_STATE_DIR) / "sync.lock")
 
-    pulled = git_sync.pull()
-    
-    if not pulled:
-        return jsonify({"error": "Git pull 执行失败，请检查服务端日志以获取详情（如网络问题、权限错误或冲突）。"}), 500
 
-    files = read_markdown_files(settings.NOTE_LOCAL_PATH, settings.NOTE_FILE_GLOB)
-    indexed = note_indexer.rebuild_index(files)
-    return jsonify(
-        {
-            "pulled": pulled,
+def _sync_locked(job: Job, full: bool) -> Dict[str, Any]:
+    job.report("pull")
+    heads = get_git_sync().pull()
+    if heads is None:
+        raise RuntimeError("Git pull 执行失败，请检查服务端日志以获取详情（如网络问题、权限错误或冲突）。")
+
+    old_head, new_head = heads
+    indexer = get_note_indexer()
+    indexed_head = indexer.source_head
+    changes = None
+    if len(indexer.chunks) and indexed_head and not full:
+        changes = get_git_sync().diff_changes(indexed_head, new_head)
+
+    if changes is None:
+        job.report("read")
+        files = read_markdown_files(settings.NOTE_LOCAL_PATH, settings.NOTE_FILE_GLOB)
+        indexed = indexer.rebuild_index(files, progress=job.report, source_head=new_head)
+        return {
+            "pulled": True,
+            "mode": "full",
+            "old_head": old_head,
+            "new_head": new_head,
+            "indexed_head": indexed_head,
             "indexed_chunks": indexed,
             "files": len(files),
+            **_skipped_summary(),
+            "embedding_cache": indexer.embedding_cache_stats(),
         }
-    ), 200
+
+    return _apply_repo_changes(changes, old_head, new_head, job, indexed_head)
+
+
+def _skipped_summary() -> Dict[str, Any]:
+    """同步结果中的部分成功标记：索引中仍有 chunk 被嵌入接口跳过的文件及其已失败次数。"""
+    skipped = get_note_indexer().retry_paths
+    return {"partial": bool(skipped), "skipped_files": skipped}
+
+
+def _apply_repo_changes(
+    changes: Dict[str, List[Any]], old_head: str, new_head: str, job: Job, indexed_head: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    将 git diff 结果应用到索引：删除/重命名的旧路径移出索引，新增/修改/重命名后的路径重新嵌入，
+    重试列表中的文件一并重新嵌入（已不存在的移出），写入后记录 new_head 为索引对应的提交
+    """
+    glob_pattern = settings.NOTE_FILE_GLOB
+    note_changes: Dict[str, List[Any]] = {
+        "added": [p for p in changes["added"] if match_note_glob(p, glob_pattern)],
+        "modified": [p for p in changes["modified"] if match_note_glob(p, glob_pattern)],
+        "deleted": [p for p in changes["deleted"] if match_note_glob(p, glob_pattern)],
+        "renamed": [
+            r for r in changes["renamed"]
+            if match_note_glob(r["from"], glob_pattern) or match_note_glob(r["to"], glob_pattern)
+        ],
+    }
+
+    removed_paths = list(note_changes["deleted"])
+    upsert_paths = note_changes["added"] + note_changes["modified"]
+    for renamed in note_changes["renamed"]:
+        removed_paths.append(renamed["from"])
+        if match_note_glob(renamed["to"], glob_pattern):
+            upsert_paths.append(renamed["to"])
+
+    indexer = get_note_indexer()
+    retried = [p for p in indexer.pending_retries() if p not in upsert_paths and p not in removed_paths]
+    root = Path(settings.NOTE_LOCAL_PATH)
+    for path in retried:
+        if (root / path).is_file():
+            upsert_paths.append(path)
+        else:
+            removed_paths.append(path)
+    job.report("remove")
+    removed_chunks = indexer.remove_files(removed_paths)
+    job.report("read")
+    files = read_markdown_files_by_paths(settings.NOTE_LOCAL_PATH, upsert_paths)
+    if files:
+        indexed = indexer.upsert_files(files, progress=job.report, source_head=new_head)
+    else:
+        indexed = 0
+        indexer.set_source_head(new_head)
+    return {
+        "pulled": True,
+        "mode": "incremental",
+        "old_head": old_head,
+        "new_head": new_head,
+        "indexed_head": indexed_head,
+        "changes": note_changes,
+        "retried": retried,
+        "indexed_chunks": indexed,
+        "removed_chunks": removed_chunks,
+        "files": len(files),
+        **_skipped_summary(),
+        "embedding_cache": indexer.embedding_cache_stats(),
+    }
+
+
+@analyze_bp.route("/index/snapshots", methods=["GET"])
+def list_index_snapshots() -> ResponseReturnValue:
+    """
+    列出已保存的索引快照（从新到旧），包含版本号、创建时间、chunk 数、维度与嵌入模型
+    """
+    return jsonify({"snapshots": get_note_indexer().list_snapshots()}), 200
+
+
+@analyze_bp.route("/index/rollback", methods=["POST"])
+def rollback_index() -> ResponseReturnValue:
+    """
+    回滚索引到指定快照（body: {"version": "000003"}），不传 version 时回滚到上一份快照
+    """
+    if settings.INDEX_READ_ONLY:
+        return jsonify({"error": "当前进程为只读检索模式（INDEX_READ_ONLY=true），请在写进程中回滚索引。"}), 409
+    data = request.get_json(silent=True) or {}
+    version = data.get("version")
+    try:
+        result = get_note_indexer().rollback(str(version) if version else None)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(result), 200
 
 
 def _generate_tags_via_llm(
@@ -102,11 +248,17 @@ def auto_tags() -> ResponseReturnValue:
         except Exception as e:
             return jsonify({"error": f"写入标签失败: {e}"}), 500
         if commit_after:
-            git_sync.commit_and_push(message=f"chore: auto tag {Path(file_path).name}")
+            get_git_sync().commit_and_push(message=f"chore: auto tag {Path(file_path).name}")
 
-    # 重新索引该文件
+    # 在后台重新索引该文件，同一文件排队中的重建会被合并
     if file_path:
-        note_indexer.upsert_files([{"path": file_path, "content": updated_content}])
+        reindexed = [{"path": file_path, "content": updated_content}]
+        job, _ = get_job_manager().submit(
+            "reindex",
+            lambda job: {"indexed_chunks": get_note_indexer().upsert_files(reindexed, progress=job.report)},
+            coalesce_key=f"reindex:{file_path}",
+        )
+        return jsonify({"tags": tags, "job_id": job.id}), 200
 
     return jsonify({"tags": tags}), 200
 
@@ -133,7 +285,7 @@ def suggest_relations() -> ResponseReturnValue:
     if not search_text:
         return jsonify({"error": "需要 query 或 content/file_path"}), 400
 
-    candidates = note_indexer.search(search_text, top_k=top_k + 1)
+    candidates = get_note_indexer().search(search_text, top_k=top_k + 1)
     suggestions = []
     for c in candidates:
         if file_path and c.get("file_path") == file_path:
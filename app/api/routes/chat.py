@@ -4,8 +4,8 @@ AI聊天相关API路由
 
 from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app.config.settings import settings
-from app.api.services.notes import note
-from app.api.services.indexer import note_indexer
+from app.api.services.notes import get_notes
+from app.api.services.indexer import get_note_indexer
 from app.api.services.ai_providers import get_chat_client
 from app.api.services.tools import tool_registry
 import json
@@ -125,12 +125,12 @@ def format_messages_for_openai(messages: list, persona: str = None) -> list:
 def get_relevant_notes(query: str, top_k: int = 3) -> list:
     """从笔记中搜索相关内容"""
     try:
-        # 优先使用向量搜索
-        vec_results = note_indexer.search(query=query, top_k=top_k)
+        # 优先检索索引（默认向量检索，见 RAG_SEARCH_MODE）
+        vec_results = get_note_indexer().search(query=query, top_k=top_k, mode=settings.RAG_SEARCH_MODE)
         if vec_results:
             return vec_results
         # 退化为关键词搜索
-        return note.search_notes(query=query, top_k=top_k)
+        return get_notes().search_notes(query=query, top_k=top_k)
     except Exception:
         return []
 
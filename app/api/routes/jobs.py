@@ -0,0 +1,41 @@
+"""
+后台任务查询与取消接口
+"""
+
+from flask import Blueprint, jsonify
+from flask.typing import ResponseReturnValue
+
+from app.api.services.jobs import get_job_manager
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api")
+
+
+@jobs_bp.route("/jobs", methods=["GET"])
+def list_jobs() -> ResponseReturnValue:
+    """
+    列出最近的后台任务（从新到旧）
+    """
+    return jsonify({"jobs": [job.to_dict() for job in get_job_manager().list()]}), 200
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str) -> ResponseReturnValue:
+    """
+    查询任务状态与进度：已扫描文件数、已嵌入 chunk 数、吞吐（chunk/秒）与预计剩余秒数
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@jobs_bp.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id: str) -> ResponseReturnValue:
+    """
+    取消任务：排队中的任务不再执行，运行中的任务在下一个进度检查点停止，索引保持取消前的状态；
+    被取消的同步不会记录新提交，下一次同步从索引记录的提交重新比较，已拉取但未嵌入的变更不会遗漏
+    """
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job.to_dict()), 200
@@ -3,7 +3,7 @@
 """
 
 from flask import Blueprint, request, jsonify
-from app.api.services.notes import note
+from app.api.services.notes import get_notes
 
 # 创建笔记API蓝图
 notes_bp = Blueprint('notes', __name__, url_prefix='/api')
@@ -40,7 +40,7 @@ def add_note():
         tags = data.get('tags', [])
         source = data.get('source')
         
-        note_id = note.add_note(
+        note_id = get_notes().add_note(
             content=content,
             title=title,
             tags=tags,
@@ -70,7 +70,7 @@ def get_note(note_id):
         }
     """
     try:
-        note_data = note.get_note(note_id)
+        note_data = get_notes().get_note(note_id)
         if not note_data:
             return jsonify({'error': '笔记不存在'}), 404
         
@@ -110,7 +110,7 @@ def list_notes():
         # 限制limit的最大值
         limit = min(limit, 100)
         
-        notes_list = note.list_notes(limit=limit, offset=offset)
+        notes_list = get_notes().list_notes(limit=limit, offset=offset)
         return jsonify({'result': notes_list}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -128,7 +128,7 @@ def delete_note(note_id):
         }
     """
     try:
-        success = note.delete_note(note_id)
+        success = get_notes().delete_note(note_id)
         if not success:
             return jsonify({'error': '笔记不存在'}), 404
         
@@ -165,7 +165,7 @@ def update_note(note_id):
         tags = data.get('tags')
         source = data.get('source')
         
-        success = note.update_note(
+        success = get_notes().update_note(
             note_id=note_id,
             content=content,
             title=title,
@@ -214,7 +214,7 @@ def search_notes():
         
         top_k = data.get('top_k', 5)
         
-        results = note.search_notes(query=query, top_k=top_k)
+        results = get_notes().search_notes(query=query, top_k=top_k)
         return jsonify(results), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -8,6 +8,7 @@ from flask import Blueprint, jsonify, request
 from flask.typing import ResponseReturnValue
 
 from app.api.services.rag import run_rag_pipeline
+from app.api.services.search_filters import SearchFilters
 from app.config.settings import settings
 
 rag_bp = Blueprint("rag", __name__, url_prefix="/api")
@@ -15,11 +16,33 @@ rag_bp = Blueprint("rag", __name__, url_prefix="/api")
 
 @rag_bp.route("/rag/query", methods=["POST"])
 def rag_query() -> ResponseReturnValue:
-    """提交问题并返回带引用的回答。"""
+    """
+    提交问题并返回带引用的回答。
+    检索范围可用查询参数 ?tags=a,b&path_prefix=projects/&status=publish 限定，
+    也可在请求体中传 "filters": {"tags": [...], "path_prefix": "...", "status": "..."}（优先）。
+    """
     data: Dict[str, Any] = request.get_json() or {}
     question = data.get("question")
     if not question:
         return jsonify({"error": "question 不能为空"}), 400
+    raw_filters = data.get("filters")
+    if raw_filters is not None and not isinstance(raw_filters, dict):
+        return jsonify({"error": "filters 必须是对象"}), 400
+    try:
+        if raw_filters is not None:
+            filters = SearchFilters.parse(
+                tags=raw_filters.get("tags"),
+                path_prefix=raw_filters.get("path_prefix"),
+                status=raw_filters.get("status"),
+            )
+        else:
+            filters = SearchFilters.parse(
+                tags=request.args.getlist("tags"),
+                path_prefix=request.args.getlist("path_prefix"),
+                status=request.args.get("status"),
+            )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
     top_k = int(data.get("top_k", 5))
     provider = data.get("provider", settings.DEFAULT_PROVIDER)
@@ -41,6 +64,7 @@ def rag_query() -> ResponseReturnValue:
             temperature=temperature,
             max_tokens=max_tokens,
             persona=persona,
+            filters=filters,
         )
         return jsonify(result), 200
     except Exception as exc:  # noqa: BLE001
@@ -4,7 +4,8 @@
 
 from flask import Blueprint, request, jsonify
 
-from app.api.services.indexer import note_indexer
+from app.api.services.indexer import SEARCH_MODES, SEARCH_VECTOR, get_note_indexer
+from app.api.services.search_filters import SearchFilters
 
 search_bp = Blueprint("search", __name__, url_prefix="/api")
 
@@ -13,14 +14,85 @@ search_bp = Blueprint("search", __name__, url_prefix="/api")
 def semantic_search():
     """
     语义搜索
-    GET /api/search?q=...
+    GET /api/search?q=...&top_k=5&mode=vector&nprobe=16&ef_search=64&tags=a,b&path_prefix=projects/&status=publish
+    mode 可选 vector（默认）/ keyword（BM25）/ hybrid（两路倒数排名融合）；
+    nprobe / ef_search 可选，覆盖 IVF / HNSW 索引的检索参数；
+    tags / path_prefix 可重复或逗号分隔（同一字段内为“或”），与 status 之间为“且”
     """
     query = request.args.get("q")
     top_k = request.args.get("top_k", default=5, type=int)
+    nprobe = request.args.get("nprobe", type=int)
+    ef_search = request.args.get("ef_search", type=int)
+    mode = request.args.get("mode", SEARCH_VECTOR)
     if not query:
         return jsonify({"error": "查询参数 q 不能为空"}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode 必须是 {', '.join(SEARCH_MODES)} 之一"}), 400
+    filters = SearchFilters.parse(
+        tags=request.args.getlist("tags"),
+        path_prefix=request.args.getlist("path_prefix"),
+        status=request.args.get("status"),
+    )
 
-    results = note_indexer.search(query=query, top_k=top_k)
+    results = get_note_indexer().search(
+        query=query, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filters=filters, mode=mode
+    )
     return jsonify({"result": results}), 200
 
 
+@search_bp.route("/search", methods=["POST"])
+def semantic_search_many():
+    """
+    批量语义搜索（查询一次性嵌入，并在单次 FAISS 检索中完成）
+    POST /api/search
+    {"queries": ["...", "..."], "top_k": 5, "mode": "vector", "nprobe": 16, "ef_search": 64,
+     "filters": {"tags": ["..."], "path_prefix": "projects/", "status": "publish"}}
+    返回 {"result": [[...], [...]]}，与 queries 顺序一致；filters 对所有查询生效
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) for q in queries):
+        return jsonify({"error": "queries 必须是非空字符串列表"}), 400
+    try:
+        top_k = int(data.get("top_k", 5))
+        nprobe = int(data["nprobe"]) if data.get("nprobe") is not None else None
+        ef_search = int(data["ef_search"]) if data.get("ef_search") is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "top_k / nprobe / ef_search 必须是整数"}), 400
+    mode = data.get("mode", SEARCH_VECTOR)
+    if mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode 必须是 {', '.join(SEARCH_MODES)} 之一"}), 400
+    raw_filters = data.get("filters") or {}
+    if not isinstance(raw_filters, dict):
+        return jsonify({"error": "filters 必须是对象"}), 400
+    try:
+        filters = SearchFilters.parse(
+            tags=raw_filters.get("tags"),
+            path_prefix=raw_filters.get("path_prefix"),
+            status=raw_filters.get("status"),
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    results = get_note_indexer().search_many(
+        queries, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filters=filters, mode=mode
+    )
+    return jsonify({"result": results}), 200
+
+
+@search_bp.route("/search/stats", methods=["GET"])
+def search_stats():
+    """
+    检索缓存统计
+    GET /api/search/stats
+    返回查询向量缓存与嵌入缓存的条目数、命中次数与命中率，BM25 索引规模（尚未构建时为 null），chunk 存储与向量的占用、量化方式
+    """
+    return jsonify(
+        {
+            "query_cache": get_note_indexer().query_cache_stats(),
+            "embedding_cache": get_note_indexer().embedding_cache_stats(),
+            "keyword_index": get_note_indexer().keyword_index_stats(),
+            "vectors": get_note_indexer().vector_stats(),
+            "chunks": get_note_indexer().chunk_stats(),
+        }
+    ), 200
@@ -2,11 +2,19 @@
 AI 提供商统一封装：聊天与嵌入
 """
 
-from typing import Any, Callable, Dict, List, Optional
+import logging
+import math
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 import httpx
-from openai import OpenAI
+
+if TYPE_CHECKING:
+    # openai SDK 导入约 0.5 秒，运行时在创建客户端时才导入
+    from openai import OpenAI
 
 from app.config.settings import settings
+from app.utils.retry import is_retryable_error, retry_with_backoff
+
+logger = logging.getLogger(__name__)
 
 
 def resolve_provider_config(provider: str, base_url: Optional[str], api_key: Optional[str]):
@@ -17,27 +25,52 @@ def resolve_provider_config(provider: str, base_url: Optional[str], api_key: Opt
     return final_base, final_key, cfg.get("model")
 
 
-def get_chat_client(provider: str, base_url: Optional[str] = None, api_key: Optional[str] = None) -> OpenAI:
+def get_chat_client(provider: str, base_url: Optional[str] = None, api_key: Optional[str] = None) -> "OpenAI":
+    from openai import OpenAI
+
     base_url, api_key, _ = resolve_provider_config(provider, base_url, api_key)
     if not api_key:
         raise ValueError(f"未配置 {provider} 的 API Key")
     return OpenAI(base_url=base_url, api_key=api_key)
 
 
+def fit_dimensions(embedding: Optional[List[float]], dimensions: int) -> Optional[List[float]]:
+    """
+    Matryoshka 截断：向量长于 dimensions 时取前 dimensions 维并重新单位化
+    （接口不支持 dimensions 参数或忽略该参数时的本地回退）。
+    """
+    if embedding is None or dimensions <= 0 or len(embedding) <= dimensions:
+        return embedding
+    head = embedding[:dimensions]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+
+def _rejects_dimensions(status_code: Optional[int], detail: str) -> bool:
+    """接口是否因不支持 dimensions 参数而拒绝请求（如 text-embedding-ada-002、embedding-2）。"""
+    return status_code == 400 and "dimension" in detail.lower()
+
+
 def get_embedding_callable(
     provider: Optional[str] = None,
     model: Optional[str] = None,
     base_url: Optional[str] = None,
     api_key: Optional[str] = None,
-) -> Callable[[List[str]], List[List[float]]]:
+    dimensions: Optional[int] = None,
+) -> Callable[[List[str]], List[Optional[List[float]]]]:
     """
-    返回一个可调用对象，输入文本列表，输出 embedding 列表。
+    返回一个可调用对象，输入文本列表，输出与输入一一对应的 embedding 列表。
+    空白文本或无法嵌入的文本对应位置为 None，调用方应跳过这些条目。
     支持 OpenAI 兼容接口；对 bigmodel 走专门 HTTP 调用。
+    :param dimensions: 输出维度（0 为模型默认）。随请求发送 dimensions 参数，接口拒绝该参数时改为本地截断
     """
     provider = provider or settings.EMBEDDING_PROVIDER
     model = model or settings.EMBEDDING_MODEL
     base_url = base_url or settings.EMBEDDING_BASE_URL
     api_key = api_key or settings.EMBEDDING_API_KEY
+    dimensions = settings.EMBEDDING_DIMENSIONS if dimensions is None else dimensions
+    # 首次被拒绝后不再发送 dimensions 参数（各批次共享）
+    send_dimensions = {"enabled": dimensions > 0}
 
     # bigmodel 专用适配（OpenAI embeddings 不兼容时走 HTTP 手调）
     if provider == "bigmodel":
@@ -47,47 +80,73 @@ def get_embedding_callable(
         client = httpx.Client(timeout=30)
         endpoint = f"{final_base.rstrip('/')}/embeddings"
 
-        def embed_bigmodel(texts: List[str]) -> List[List[float]]:
-            sanitized: List[str] = [str(t)[:2000] for t in texts if str(t).strip()]
-            if not sanitized:
-                return []
-
-            def _post(batch: List[str]) -> List[List[float]]:
-                payload: Dict[str, Any] = {"model": model, "input": batch}
-                resp = client.post(
-                    endpoint,
-                    headers={"Authorization": f"Bearer {final_key}"},
-                    json=payload,
+        def _post(batch: List[str]) -> List[Optional[List[float]]]:
+            payload: Dict[str, Any] = {"model": model, "input": batch}
+            if send_dimensions["enabled"]:
+                payload["dimensions"] = dimensions
+            resp = client.post(
+                endpoint,
+                headers={"Authorization": f"Bearer {final_key}"},
+                json=payload,
+            )
+            if "dimensions" in payload and _rejects_dimensions(resp.status_code, resp.text):
+                logger.warning("bigmodel %s rejected dimensions=%d, truncating locally: %s", model, dimensions, resp.text)
+                send_dimensions["enabled"] = False
+                return _post(batch)
+            if resp.status_code >= 400:
+                detail = resp.text
+                raise httpx.HTTPStatusError(
+                    f"bigmodel embeddings error {resp.status_code}: {detail}",
+                    request=resp.request,
+                    response=resp,
                 )
-                if resp.status_code >= 400:
-                    detail = resp.text
-                    raise httpx.HTTPStatusError(
-                        f"bigmodel embeddings error {resp.status_code}: {detail}",
-                        request=resp.request,
-                        response=resp,
-                    )
-                try:
-                    data = resp.json()
-                except ValueError as exc:  # JSON decode error
-                    raise httpx.HTTPStatusError(
-                        f"bigmodel embeddings invalid json: {resp.text}",
-                        request=resp.request,
-                        response=resp,
-                    ) from exc
-                items = data.get("data") or []
-                return [item.get("embedding") for item in items if item.get("embedding") is not None]
-
             try:
-                return _post(sanitized)
+                data = resp.json()
+            except ValueError as exc:  # JSON decode error
+                raise httpx.HTTPStatusError(
+                    f"bigmodel embeddings invalid json: {resp.text}",
+                    request=resp.request,
+                    response=resp,
+                ) from exc
+            items = data.get("data") or []
+            # 按返回的 index 对齐输入，缺失 embedding 的位置保留 None
+            embeddings: List[Optional[List[float]]] = [None] * len(batch)
+            for pos, item in enumerate(items):
+                idx = item.get("index", pos)
+                if isinstance(idx, int) and 0 <= idx < len(batch):
+                    embeddings[idx] = fit_dimensions(item.get("embedding"), dimensions)
+            return embeddings
+
+        def _embed_bisect(items: List[Tuple[int, str]], results: List[Optional[List[float]]], top_level: bool) -> None:
+            """
+            嵌入 items 并写入 results；非瞬时错误时二分定位失败条目，单个坏条目只多出 O(log n) 次请求。
+            顶层请求的瞬时错误直接抛出由调用方退避重试，二分过程中的子请求在此处抖动退避重试。
+            """
+            batch = [text for _, text in items]
+            try:
+                if top_level:
+                    embeddings = _post(batch)
+                else:
+                    embeddings = retry_with_backoff(lambda: _post(batch), max_attempts=settings.EMBEDDING_MAX_ATTEMPTS)
             except httpx.HTTPStatusError as exc:
-                # 若批量失败，尝试单条回退以定位问题
-                if len(sanitized) > 1:
-                    embeddings: List[List[float]] = []
-                    for item in sanitized:
-                        embeddings.extend(_post([item]))
-                    return embeddings
-                raise exc
-            return _post(sanitized) or []
+                if is_retryable_error(exc):
+                    raise
+                if len(items) == 1:
+                    logger.warning("bigmodel embedding skipped input #%d: %s", items[0][0], exc)
+                    return
+                mid = len(items) // 2
+                _embed_bisect(items[:mid], results, top_level=False)
+                _embed_bisect(items[mid:], results, top_level=False)
+                return
+            for (orig_idx, _), emb in zip(items, embeddings):
+                results[orig_idx] = emb
+
+        def embed_bigmodel(texts: List[str]) -> List[Optional[List[float]]]:
+            results: List[Optional[List[float]]] = [None] * len(texts)
+            items = [(i, str(t)) for i, t in enumerate(texts) if str(t).strip()]
+            if items:
+                _embed_bisect(items, results, top_level=True)
+            return results
 
         return embed_bigmodel
 
@@ -96,11 +155,30 @@ def get_embedding_callable(
     if not api_key:
         raise ValueError(f"未配置嵌入模型的 API Key ({provider})")
 
+    from openai import OpenAI
+
     client = OpenAI(base_url=base_url, api_key=api_key, http_client=httpx.Client(timeout=30))
 
-    def embed(texts: List[str]) -> List[List[float]]:
-        resp = client.embeddings.create(model=model, input=texts)
-        return [item.embedding for item in resp.data]
+    def embed(texts: List[str]) -> List[Optional[List[float]]]:
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        positions = [i for i, t in enumerate(texts) if str(t).strip()]
+        if not positions:
+            return results
+        inputs = [texts[i] for i in positions]
+        if send_dimensions["enabled"]:
+            try:
+                resp = client.embeddings.create(model=model, input=inputs, dimensions=dimensions)
+            except Exception as exc:  # noqa: BLE001
+                if not _rejects_dimensions(getattr(exc, "status_code", None), str(exc)):
+                    raise
+                logger.warning("%s rejected dimensions=%d, truncating locally: %s", model, dimensions, exc)
+                send_dimensions["enabled"] = False
+                resp = client.embeddings.create(model=model, input=inputs)
+        else:
+            resp = client.embeddings.create(model=model, input=inputs)
+        for item in resp.data:
+            results[positions[item.index]] = fit_dimensions(item.embedding, dimensions)
+        return results
 
     return embed
 
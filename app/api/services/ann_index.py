@@ -0,0 +1,322 @@
+"""
+FAISS 索引类型选择、构建与检索
+"""
+
+import logging
+import math
+from typing import Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FLAT = "flat"
+INDEX_IVF_FLAT = "ivf_flat"
+INDEX_HNSW = "hnsw"
+INDEX_IVF_PQ = "ivf_pq"
+INDEX_TYPES = (INDEX_FLAT, INDEX_IVF_FLAT, INDEX_HNSW, INDEX_IVF_PQ)
+
+# 向量标量量化：FAISS 中存储 float16 或 8 bit 编码（每维 2 / 1 字节），代替 float32
+QUANT_NONE = "none"
+QUANT_FP16 = "fp16"
+QUANT_INT8 = "int8"
+QUANTIZATIONS = (QUANT_NONE, QUANT_FP16, QUANT_INT8)
+_SQ_TYPES = {QUANT_FP16: faiss.ScalarQuantizer.QT_fp16, QUANT_INT8: faiss.ScalarQuantizer.QT_8bit}
+
+# IVF 每个聚类中心建议的最少训练样本数（低于此值 faiss 会告警且聚类质量差）
+_MIN_POINTS_PER_CENTROID = 39
+# PQ 每个子量化器 2^8 个码字，至少需要同等数量的训练样本
+_PQ_NBITS = 8
+# MappedFlatIndex 每次参与内积的向量行数（限制 float16 转 float32 与分数矩阵的临时内存）
+_MAPPED_BLOCK_ROWS = 65536
+
+
+def resolve_index_type(configured: str, total: int, auto_threshold: int) -> str:
+    """
+    解析实际使用的索引类型。
+    auto：语料不超过阈值时使用精确的 Flat，超过后使用 IVF-Flat（支持按 id 删除，适合增量更新）。
+    """
+    if configured in INDEX_TYPES:
+        return configured
+    if configured != "auto":
+        logger.warning("unknown FAISS index type %r, falling back to auto", configured)
+    return INDEX_IVF_FLAT if total > auto_threshold else INDEX_FLAT
+
+
+def resolve_quantization(configured: str) -> str:
+    """解析标量量化配置，未知取值回退为不量化。"""
+    if configured in QUANTIZATIONS:
+        return configured
+    logger.warning("unknown vector quantization %r, falling back to none", configured)
+    return QUANT_NONE
+
+
+def vector_dtype(quantization: str) -> str:
+    """
+    索引外保存的向量（精确重排序、过滤后精确打分、快照）使用的精度：
+    量化时以 float16 保存，内积仍按 float32 计算，单位向量的内积误差约 1e-3 量级。
+    """
+    return "float32" if quantization == QUANT_NONE else "float16"
+
+
+def quantization_of(index: faiss.Index) -> str:
+    """根据索引对象反推标量量化类型（IVF-PQ 等其他编码视为不量化）。"""
+    if isinstance(index, MappedFlatIndex):
+        return index.quantization
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        for name, qtype in _SQ_TYPES.items():
+            if inner.sq.qtype == qtype:
+                return name
+    return QUANT_NONE
+
+
+def is_lossy(index: faiss.Index) -> bool:
+    """索引返回的分数是否经过有损编码（int8 标量量化或 PQ），需要用保存的向量重排序。"""
+    if isinstance(index, MappedFlatIndex):
+        return False
+    return quantization_of(index) == QUANT_INT8 or index_type_of(index) == INDEX_IVF_PQ
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """根据索引对象反推索引类型。"""
+    if isinstance(index, MappedFlatIndex):
+        return INDEX_FLAT
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return INDEX_HNSW
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return INDEX_IVF_PQ
+    if isinstance(inner, faiss.IndexIVF):
+        return INDEX_IVF_FLAT
+    return INDEX_FLAT
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    """HNSW 图不支持删除节点，需要从向量重建。"""
+    return index_type_of(index) != INDEX_HNSW
+
+
+def _auto_nlist(total: int) -> int:
+    return max(1, min(int(4 * math.sqrt(total)), total // _MIN_POINTS_PER_CENTROID))
+
+
+def _auto_pq_m(dim: int) -> int:
+    """选取能整除维度、且每个子向量约 16 维的子量化器数量。"""
+    target = max(1, dim // 16)
+    for m in range(target, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(
+    vectors: np.ndarray,
+    ids: Sequence[int],
+    index_type: str = INDEX_FLAT,
+    nlist: int = 0,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    pq_m: int = 0,
+    quantization: str = QUANT_NONE,
+) -> faiss.Index:
+    """
+    基于单位化向量与 chunk id 构建内积索引（IVF 类在此完成训练）。
+    Flat/HNSW 外包 IndexIDMap2，IVF 类直接使用自身的 id 存储（IndexIDMap 的删除不适用于 IVF）。
+    训练样本不足时回退到更简单的索引类型。
+    :param quantization: Flat / IVF-Flat / HNSW 的向量以 float16 或 int8 标量量化编码存储（IVF-PQ 不受影响）
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    ids_arr = np.asarray(ids, dtype="int64")
+    dim = int(vectors.shape[1])
+    total = len(ids_arr)
+
+    if index_type in (INDEX_IVF_FLAT, INDEX_IVF_PQ):
+        nlist = nlist or _auto_nlist(total)
+        if total < max(nlist * _MIN_POINTS_PER_CENTROID, 1) or total < 2 * _MIN_POINTS_PER_CENTROID:
+            logger.info("%d chunks too few to train %s, using flat index", total, index_type)
+            index_type = INDEX_FLAT
+        elif index_type == INDEX_IVF_PQ and total < (1 << _PQ_NBITS) * _MIN_POINTS_PER_CENTROID:
+            logger.info("%d chunks too few to train PQ codebooks, using ivf_flat index", total)
+            index_type = INDEX_IVF_FLAT
+
+    # int8 需要按各维取值范围训练，没有样本时只能使用未量化的 Flat
+    qtype = _SQ_TYPES.get(quantization) if total else None
+    if index_type == INDEX_IVF_FLAT:
+        if qtype is not None:
+            index = faiss.IndexIVFScalarQuantizer(
+                faiss.IndexFlatIP(dim), dim, nlist, qtype, faiss.METRIC_INNER_PRODUCT
+            )
+        else:
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.add_with_ids(vectors, ids_arr)
+        return index
+    if index_type == INDEX_IVF_PQ:
+        m = pq_m or _auto_pq_m(dim)
+        index = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, nlist, m, _PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.add_with_ids(vectors, ids_arr)
+        return index
+    if index_type == INDEX_HNSW:
+        if qtype is not None:
+            inner = faiss.IndexHNSWSQ(dim, qtype, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = ef_construction
+    elif qtype is not None:
+        inner = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+    else:
+        inner = faiss.IndexFlatIP(dim)
+    if qtype is not None:
+        inner.train(vectors)
+    index = faiss.IndexIDMap2(inner)
+    if total:
+        index.add_with_ids(vectors, ids_arr)
+    return index
+
+
+class MappedFlatIndex:
+    """
+    只读部署的 Flat 索引：直接与快照中内存映射的向量矩阵（faiss_vectors.npy）做内积，不再读入 faiss.index 的私有副本，
+    多个 worker 共用同一份页缓存中的向量（faiss 1.7.4 无法映射 Flat 索引本身）。
+    只实现检索需要的 d / ntotal / search，不支持增删，只在没有增量日志的只读加载中使用。
+    分数按保存的向量精确计算（float16 向量转为 float32 后做内积）。
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: Sequence[int], quantization: str = QUANT_NONE) -> None:
+        self.vectors = vectors
+        self.ids = np.array(ids, dtype="int64")
+        self.quantization = quantization
+        self.d = int(vectors.shape[1])
+        self.ntotal = len(self.ids)
+
+    def search(
+        self, queries: np.ndarray, top_k: int, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        分块计算内积并保留每个查询的前 top_k，返回 (scores, chunk ids)，不足 top_k 的位置为 (-inf, -1)。
+        :param allowed: 按行的布尔掩码，只返回为 True 的行
+        """
+        n_queries = len(queries)
+        best_scores = np.full((n_queries, top_k), -np.inf, dtype="float32")
+        best_rows = np.full((n_queries, top_k), -1, dtype="int64")
+        for start in range(0, self.ntotal, _MAPPED_BLOCK_ROWS):
+            # float32 的映射矩阵切片本身连续，不产生副本
+            block = np.ascontiguousarray(self.vectors[start:start + _MAPPED_BLOCK_ROWS], dtype="float32")
+            k = min(top_k, len(block))
+            if allowed is None:
+                # faiss 的暴力检索内核直接读取传入的内存（比 numpy 矩阵乘向量快约 30%）
+                block_scores, top = faiss.knn(queries, block, k, metric=faiss.METRIC_INNER_PRODUCT)
+            else:
+                sims = queries @ block.T
+                sims[:, ~allowed[start:start + len(block)]] = -np.inf
+                top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+                block_scores = np.take_along_axis(sims, top, axis=1)
+            scores = np.concatenate((best_scores, block_scores), axis=1)
+            rows = np.concatenate((best_rows, np.where(top >= 0, top + start, -1)), axis=1)
+            keep = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+            best_rows = np.take_along_axis(rows, keep, axis=1)
+        labels = np.where(np.isfinite(best_scores), self.ids[np.maximum(best_rows, 0)], -1)
+        return best_scores, labels
+
+
+class IdFilter:
+    """
+    将允许的 chunk id 集合转换为 FAISS 位图选择器，使过滤在 ANN 扫描内部完成。
+    IVF 类索引直接按 chunk id 建位图；IndexIDMap 在 faiss 1.7.4 不接受 SearchParameters，
+    改为按内层索引的内部序号建位图、检索内层索引后再经 id_map 映射回 chunk id。
+    位图数组由对象持有，检索期间不可被回收（selector 只保存指针）。
+    MappedFlatIndex 不经过 FAISS，只生成按行的布尔掩码（mask）。
+    """
+
+    def __init__(self, index: faiss.Index, allowed_ids: np.ndarray) -> None:
+        allowed_ids = np.asarray(allowed_ids, dtype="int64")
+        self.count = len(allowed_ids)
+        self.id_map: Optional[np.ndarray] = None
+        self.mask: Optional[np.ndarray] = None
+        if isinstance(index, MappedFlatIndex):
+            self.mask = np.isin(index.ids, allowed_ids)
+            self.selector = None
+            return
+        if isinstance(index, faiss.IndexIDMap):
+            self.id_map = faiss.vector_to_array(index.id_map)
+            max_id = int(max(self.id_map.max(initial=-1), allowed_ids.max(initial=-1)))
+            allowed = np.zeros(max_id + 1, dtype=bool)
+            allowed[allowed_ids] = True
+            mask = allowed[self.id_map]
+        else:
+            mask = np.zeros(int(allowed_ids.max(initial=-1)) + 1, dtype=bool)
+            mask[allowed_ids] = True
+        self._bitmap = np.packbits(mask, bitorder="little")
+        self.selector = faiss.IDSelectorBitmap(len(self._bitmap), faiss.swig_ptr(self._bitmap))
+
+
+def search(
+    index: faiss.Index,
+    queries: np.ndarray,
+    top_k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    id_filter: Optional[IdFilter] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    执行检索并返回 (scores, chunk ids)。
+    nprobe 通过 SearchParametersIVF 逐次传入，不修改共享索引对象；
+    faiss 1.7.4 的 IndexHNSW 会忽略 SearchParametersHNSW，efSearch 只能写到索引属性上，
+    并发请求使用不同取值时以最后写入者为准（只影响召回/延迟的取舍，不影响正确性）。
+    :param id_filter: 只返回位图中允许的 chunk id；须基于同一个 index 构建
+    """
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    if isinstance(index, MappedFlatIndex):
+        return index.search(queries, top_k, allowed=id_filter.mask if id_filter is not None else None)
+    if isinstance(index, faiss.IndexIVF):
+        if id_filter is not None:
+            params = faiss.SearchParametersIVF(sel=id_filter.selector, nprobe=nprobe or index.nprobe)
+        else:
+            params = faiss.SearchParametersIVF(nprobe=nprobe) if nprobe else None
+        return index.search(queries, top_k, params=params)
+    if isinstance(index, faiss.IndexIDMap):
+        inner = faiss.downcast_index(index.index)
+        if ef_search and isinstance(inner, faiss.IndexHNSW) and inner.hnsw.efSearch != ef_search:
+            inner.hnsw.efSearch = ef_search
+        if id_filter is not None:
+            if isinstance(inner, faiss.IndexHNSW):
+                params = faiss.SearchParametersHNSW(sel=id_filter.selector, efSearch=inner.hnsw.efSearch)
+            else:
+                params = faiss.SearchParameters(sel=id_filter.selector)
+            scores, positions = inner.search(queries, top_k, params=params)
+            labels = np.where(positions >= 0, id_filter.id_map[np.maximum(positions, 0)], -1)
+            return scores, labels
+    return index.search(queries, top_k)
+
+
+def rerank(
+    queries: np.ndarray,
+    ids: np.ndarray,
+    rows: np.ndarray,
+    vectors: np.ndarray,
+    top_k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    用保存的向量对 ANN 候选重新计算内积（float32）并排序，返回 (scores, chunk ids)。
+    :param ids: 每个查询的候选 chunk id，形状 (查询数, 候选数)，-1 为空位
+    :param rows: ids 对应的向量行号，空位为 -1
+    """
+    n_queries, n_candidates = ids.shape
+    if not n_candidates:
+        return np.empty((n_queries, 0), dtype="float32"), ids
+    candidates = np.asarray(vectors[np.maximum(rows, 0).ravel()], dtype="float32")
+    candidates = candidates.reshape(n_queries, n_candidates, -1)
+    scores = np.einsum("qcd,qd->qc", candidates, np.asarray(queries, dtype="float32"))
+    scores[rows < 0] = -np.inf
+    k = min(top_k, n_candidates)
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    top_scores = np.take_along_axis(scores, order, axis=1)
+    top_ids = np.where(np.isfinite(top_scores), np.take_along_axis(ids, order, axis=1), -1)
+    return top_scores, top_ids
+
@@ -0,0 +1,275 @@
+"""
+BM25 关键词检索：面向索引 chunk 的增量倒排索引（中文按字二元组切分），以及与向量检索的倒数排名融合
+"""
+
+import math
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 英文、数字与代码标识符：保留内部的 . - : / # 连接（如 faiss.IndexIVF、user-015、a/b.md）
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+(?:[.\-:/#][A-Za-z0-9_]+)*")
+_WORD_PART_RE = re.compile(r"[A-Za-z0-9]+")
+# 中日韩文字（不含全角标点）的码位区间：连续片段切分为相邻二字组
+_CJK_RANGES = ((0x3040, 0x30FF), (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xAC00, 0xD7AF), (0xF900, 0xFAFF))
+
+# 词项编码为 int64，高位区分类别：中文二字组 / 单字直接由码位拼出，英文词与标识符取字符串哈希。
+# 索引只存在于进程内存中（每个进程由 entries 构建），因此可以使用带随机盐的内置 hash
+_KIND_SHIFT = 60
+_CJK_BIGRAM = 1 << _KIND_SHIFT
+_CJK_SINGLE = 2 << _KIND_SHIFT
+_WORD = 3 << _KIND_SHIFT
+_WORD_MASK = (1 << _KIND_SHIFT) - 1
+
+# BM25 参数：词频饱和度与文档长度归一化强度
+_K1 = 1.2
+_B = 0.75
+# 失效槽位或增量倒排条目超过该比例（且不少于下限）时合并为新的基线倒排表
+_COMPACT_RATIO = 0.3
+_COMPACT_MIN = 1000
+
+
+def _cjk_mask(codes: np.ndarray) -> np.ndarray:
+    mask = np.zeros(len(codes), dtype=bool)
+    for low, high in _CJK_RANGES:
+        mask |= (codes >= low) & (codes <= high)
+    return mask
+
+
+def term_keys(text: str) -> np.ndarray:
+    """
+    切分词项并编码为 int64 数组（保留重复，用于统计词频）：
+    - 标识符整体作为一个词项，同时拆出 _ . - 等分隔的各部分（查询 indexer 也能命中 get_note_indexer），不区分大小写
+    - 中文等连续片段切为二字组，单字片段保留单字；按码位向量化计算，不逐个生成子串
+    """
+    words = _WORD_RE.findall(text.lower())
+    for word in [word for word in words if not word.isalnum()]:
+        words.extend(_WORD_PART_RE.findall(word))
+    word_keys = np.fromiter(map(hash, words), dtype="int64", count=len(words)) & _WORD_MASK | _WORD
+
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype="uint32").astype("int64")
+    cjk = _cjk_mask(codes)
+    if not cjk.any():
+        return word_keys
+    pair = cjk[:-1] & cjk[1:]
+    bigrams = (codes[:-1][pair] << 21) | codes[1:][pair] | _CJK_BIGRAM
+    isolated = cjk.copy()
+    isolated[1:] &= ~cjk[:-1]
+    isolated[:-1] &= ~cjk[1:]
+    singles = codes[isolated] | _CJK_SINGLE
+    return np.concatenate((word_keys, bigrams, singles))
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[int, float]]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    倒数排名融合：score(d) = Σ 1 / (k + rank_i(d))，rank 从 1 开始。
+    只依赖名次，向量内积与 BM25 分数量纲不同也可直接合并。
+    :param rankings: 各路检索结果 [(chunk_id, 原始分数)]，按分数降序
+    :return: 按融合分数降序的 [(chunk_id, 融合分数)]
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _) in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    chunk 级 BM25 倒排索引，支持按 chunk id 增删。
+    - 基线倒排表为 CSR 结构：有序词项键、各词项的起始偏移、槽位、词频，批量构建与合并都是一次向量化排序
+    - 之后新增的 chunk 写入按词项分组的增量倒排表（紧凑 array），检索时与基线一并打分
+    - 删除只标记槽位失效；失效槽位或增量条目过多时合并为新的基线
+    线程安全由调用方（NoteIndexer 的读写锁）保证。
+    """
+
+    def __init__(self) -> None:
+        self._keys = np.zeros(0, dtype="int64")
+        self._indptr = np.zeros(1, dtype="int64")
+        self._slots = np.zeros(0, dtype="int32")
+        self._tfs = np.zeros(0, dtype="int32")
+        self._delta: Dict[int, Tuple[array, array]] = {}
+        self._delta_postings = 0
+        self._id_to_slot: Dict[int, int] = {}
+        self._slot_ids = np.zeros(0, dtype="int64")
+        self._doc_len = np.zeros(0, dtype="float32")
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._alive_count = 0
+        self._total_len = 0.0
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict]) -> "BM25Index":
+        """批量构建：逐条切分出 (词项键, 词频)，最后一次排序生成 CSR 倒排表。"""
+        index = cls()
+        chunk_ids: List[int] = []
+        doc_lens: List[int] = []
+        term_parts: List[np.ndarray] = []
+        tf_parts: List[np.ndarray] = []
+        for entry in entries:
+            keys = term_keys(entry.get("text") or "")
+            uniq, tfs = np.unique(keys, return_counts=True)
+            chunk_ids.append(entry["id"])
+            doc_lens.append(len(keys))
+            term_parts.append(uniq)
+            tf_parts.append(tfs)
+
+        size = len(chunk_ids)
+        index._size = index._alive_count = size
+        index._slot_ids = np.array(chunk_ids, dtype="int64")
+        index._doc_len = np.array(doc_lens, dtype="float32")
+        index._alive = np.ones(size, dtype=bool)
+        index._total_len = float(sum(doc_lens))
+        index._id_to_slot = {chunk_id: slot for slot, chunk_id in enumerate(chunk_ids)}
+        if size:
+            index._set_base(
+                np.concatenate(term_parts),
+                np.repeat(np.arange(size, dtype="int32"), [len(part) for part in term_parts]),
+                np.concatenate(tf_parts).astype("int32"),
+            )
+        return index
+
+    def _set_base(self, keys: np.ndarray, slots: np.ndarray, tfs: np.ndarray) -> None:
+        """由 (词项键, 槽位, 词频) 三元组生成 CSR 基线倒排表。"""
+        order = np.lexsort((slots, keys))
+        keys = keys[order]
+        self._slots, self._tfs = slots[order], tfs[order]
+        starts = np.flatnonzero(np.diff(keys, prepend=-1)) if len(keys) else np.zeros(0, dtype="int64")
+        self._keys = keys[starts]
+        self._indptr = np.append(starts, len(keys)).astype("int64")
+
+    def __len__(self) -> int:
+        return self._alive_count
+
+    def _grow(self) -> None:
+        capacity = max(64, int(len(self._alive) * 1.5))
+        for name in ("_slot_ids", "_doc_len", "_alive"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: self._size] = old[: self._size]
+            setattr(self, name, new)
+
+    def add(self, chunk_id: int, text: str) -> None:
+        if chunk_id in self._id_to_slot:
+            self.remove(chunk_id)
+        keys = term_keys(text)
+        uniq, tfs = np.unique(keys, return_counts=True)
+        if self._size == len(self._alive):
+            self._grow()
+        slot = self._size
+        self._size += 1
+        self._slot_ids[slot] = chunk_id
+        self._doc_len[slot] = len(keys)
+        self._alive[slot] = True
+        self._id_to_slot[chunk_id] = slot
+        self._alive_count += 1
+        self._total_len += float(len(keys))
+        for key, tf in zip(uniq.tolist(), tfs.tolist()):
+            postings = self._delta.get(key)
+            if postings is None:
+                postings = self._delta[key] = (array("i"), array("i"))
+            postings[0].append(slot)
+            postings[1].append(tf)
+        self._delta_postings += len(uniq)
+        if self._delta_postings >= _COMPACT_MIN and self._delta_postings > len(self._slots) * _COMPACT_RATIO:
+            self._compact()
+
+    def remove(self, chunk_id: int) -> None:
+        slot = self._id_to_slot.pop(chunk_id, None)
+        if slot is None:
+            return
+        self._alive[slot] = False
+        self._alive_count -= 1
+        self._total_len -= float(self._doc_len[slot])
+        dead = self._size - self._alive_count
+        if dead >= _COMPACT_MIN and dead > self._size * _COMPACT_RATIO:
+            self._compact()
+
+    def _compact(self) -> None:
+        """把增量倒排表并入基线，丢弃失效槽位并重新编号。"""
+        keys = [np.repeat(self._keys, np.diff(self._indptr))]
+        slots = [self._slots]
+        tfs = [self._tfs]
+        for key, (delta_slots, delta_tfs) in self._delta.items():
+            keys.append(np.full(len(delta_slots), key, dtype="int64"))
+            slots.append(np.frombuffer(delta_slots, dtype="int32"))
+            tfs.append(np.frombuffer(delta_tfs, dtype="int32"))
+        all_keys, all_slots, all_tfs = np.concatenate(keys), np.concatenate(slots), np.concatenate(tfs)
+        del keys, slots, tfs
+
+        alive_slots = np.flatnonzero(self._alive[: self._size])
+        remap = np.full(self._size, -1, dtype="int32")
+        remap[alive_slots] = np.arange(len(alive_slots), dtype="int32")
+        keep = self._alive[all_slots]
+        self._set_base(all_keys[keep], remap[all_slots[keep]], all_tfs[keep])
+        self._delta = {}
+        self._delta_postings = 0
+
+        self._slot_ids = self._slot_ids[alive_slots].copy()
+        self._doc_len = self._doc_len[alive_slots].copy()
+        self._alive = np.ones(len(alive_slots), dtype=bool)
+        self._size = len(alive_slots)
+        self._id_to_slot = {chunk_id: slot for slot, chunk_id in enumerate(self._slot_ids.tolist())}
+
+    def _postings(self, key: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回词项在基线与增量倒排表中的 (槽位, 词频)。"""
+        slots: List[np.ndarray] = []
+        tfs: List[np.ndarray] = []
+        i = int(np.searchsorted(self._keys, key))
+        if i < len(self._keys) and self._keys[i] == key:
+            start, end = self._indptr[i], self._indptr[i + 1]
+            slots.append(self._slots[start:end])
+            tfs.append(self._tfs[start:end])
+        delta = self._delta.get(key)
+        if delta is not None:
+            # 拷贝一份：检索期间增量 array 若被追加会重新分配缓冲区
+            slots.append(np.array(delta[0], dtype="int32"))
+            tfs.append(np.array(delta[1], dtype="int32"))
+        if not slots:
+            return np.zeros(0, dtype="int32"), np.zeros(0, dtype="int32")
+        return np.concatenate(slots), np.concatenate(tfs)
+
+    def search(self, query: str, top_k: int, allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        BM25 检索，返回按分数降序的 [(chunk_id, score)]，只包含至少命中一个查询词项的 chunk。
+        :param allowed_ids: 升序的 chunk id 数组，给定时只返回其中的 chunk（元数据过滤）
+        """
+        if not self._alive_count or top_k <= 0:
+            return []
+        n = self._size
+        alive = self._alive[:n]
+        avgdl = self._total_len / self._alive_count or 1.0
+        norm = _K1 * (1 - _B + _B * self._doc_len[:n] / avgdl)
+        scores = np.zeros(n, dtype="float32")
+        for key in np.unique(term_keys(query)).tolist():
+            slots, tfs = self._postings(key)
+            live = alive[slots]
+            slots, tfs = slots[live], tfs[live].astype("float32")
+            if not len(slots):
+                continue
+            df = len(slots)
+            idf = math.log(1 + (self._alive_count - df + 0.5) / (df + 0.5))
+            # 同一词项的倒排表中槽位不重复，可以直接按下标累加
+            scores[slots] += idf * tfs * (_K1 + 1) / (tfs + norm[slots])
+
+        hits = np.flatnonzero(scores > 0)
+        if allowed_ids is not None and len(hits):
+            if not len(allowed_ids):
+                return []
+            ids = self._slot_ids[hits]
+            idx = np.minimum(np.searchsorted(allowed_ids, ids), len(allowed_ids) - 1)
+            hits = hits[allowed_ids[idx] == ids]
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(int(self._slot_ids[slot]), float(scores[slot])) for slot in hits]
+
+    def stats(self) -> Dict[str, int]:
+        terms = len(self._keys) + sum(1 for key in self._delta if not self._in_base(key))
+        return {"chunks": self._alive_count, "terms": terms, "postings": len(self._slots) + self._delta_postings}
+
+    def _in_base(self, key: int) -> bool:
+        i = int(np.searchsorted(self._keys, key))
+        return i < len(self._keys) and int(self._keys[i]) == key
@@ -11,7 +11,7 @@ from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 
 from app.api.services.ai_providers import get_chat_client
-from app.api.services.indexer import note_indexer
+from app.api.services.indexer import get_note_indexer
 from app.api.services.prompt_engine import STORE_PATH, _fetch_random_wiki, refine_topic
 from app.config.settings import settings
 
@@ -123,64 +123,53 @@ def _truncate(text: str, max_len: int = MAX_SNIPPET_LEN) -> str:
 
 def _ensure_notes_available(min_count: int) -> None:
     """确保索引中存在足够的条目。"""
-    if len(note_indexer.entries) < min_count:
+    if len(get_note_indexer().chunks) < min_count:
         raise ValueError("笔记数量不足，无法碰撞")
 
 
 def _pick_file_level_indices() -> List[int]:
     """
-    基于文件粒度抽样：每个文件只取一个索引，避免同文件多 chunk 被反复抽中。
+    基于文件粒度抽样：每个文件只取一个索引（该文件最先出现的 chunk），避免同文件多 chunk 被反复抽中。
     """
-    buckets: Dict[str, int] = {}
-    for idx, entry in enumerate(note_indexer.entries):
-        metadata: Dict[str, Any] = entry.get("metadata", {}) or {}
-        file_key = str(
-            metadata.get("rel_path")
-            or metadata.get("file_path")
-            or metadata.get("title")
-            or f"entry_{idx}"
-        )
-        if file_key not in buckets:
-            buckets[file_key] = idx
-    return list(buckets.values())
+    _, first = np.unique(get_note_indexer().chunks.file_ids, return_index=True)
+    return sorted(first.tolist())
 
 
 def _pick_shorter_indices(max_candidates: int = 50) -> List[int]:
     """
     优先选择较短文本的索引集合，增加随机性同时避免总是长文。
     """
-    lengths: List[int] = [len(str(entry.get("text", ""))) for entry in note_indexer.entries]
-    if not lengths:
+    lengths = get_note_indexer().chunks.lengths
+    if not len(lengths):
         return []
     median_len = float(np.median(lengths))
     threshold = median_len * 1.2 or 1.0
-    candidates = [idx for idx, length in enumerate(lengths) if length <= threshold]
+    candidates: List[int] = np.flatnonzero(lengths <= threshold).tolist()
     if len(candidates) < 2:
         # 回退：取最短的前若干条再随机
-        sorted_indices = [idx for idx, _ in sorted(enumerate(lengths), key=lambda item: item[1])]
-        candidates = sorted_indices[: max_candidates or 2]
+        candidates = np.argsort(lengths, kind="stable")[: max_candidates or 2].tolist()
     return candidates
 
 
-def _entry_to_note(entry: Dict[str, Any]) -> Dict[str, str]:
-    """将索引条目转换为笔记字典。"""
-    metadata: Dict[str, Any] = entry.get("metadata", {}) or {}
+def _chunk_to_note(pos: int) -> Dict[str, str]:
+    """将索引中指定位置的 chunk 转换为笔记字典。"""
+    chunks = get_note_indexer().chunks
+    rel_path = chunks.rel_path(pos) or chunks.file_path(pos)
     return {
-        "content": _truncate(entry.get("text", "")),
-        "title": str(metadata.get("title") or metadata.get("rel_path") or metadata.get("file_path") or "未命名笔记"),
-        "rel_path": str(metadata.get("rel_path") or metadata.get("file_path") or ""),
+        "content": _truncate(chunks.text(pos)),
+        "title": str(chunks.title(pos) or rel_path or "未命名笔记"),
+        "rel_path": str(rel_path or ""),
     }
 
 
 def _pick_least_similar(base_idx: int) -> int:
     """基于余弦相似度选出与基向量最不相似的索引。"""
-    embeddings: List[List[float]] = [entry.get("embedding", []) for entry in note_indexer.entries]
-    if not embeddings or len(embeddings) <= 1:
+    emb_matrix = get_note_indexer().embeddings
+    if emb_matrix is None or len(emb_matrix) <= 1:
         return base_idx
 
     try:
-        emb_matrix = np.array(embeddings, dtype="float32")
-        base_emb = emb_matrix[base_idx]
+        base_emb = np.asarray(emb_matrix[base_idx], dtype="float32")
         base_norm = np.linalg.norm(base_emb) + 1e-12
         norms = np.linalg.norm(emb_matrix, axis=1) + 1e-12
         sims = (emb_matrix @ base_emb) / (norms * base_norm)
@@ -198,31 +187,34 @@ def pick_notes(mode: str = "random") -> List[Dict[str, str]]:
     :param mode: 选择模式，支持 "random" 或 "mmr"（基于最不相似）。
     :return: 包含两条笔记内容与元数据的列表。
     """
-    _ensure_notes_available(2)
-    total = len(note_indexer.entries)
-
-    if mode == "mmr":
-        idx_a = random.randrange(total)
-        idx_b = _pick_least_similar(idx_a)
-        if idx_b == idx_a:
-            indices = random.sample(range(total), 2)
-        else:
-            indices = [idx_a, idx_b]
-    else:
-        file_pool = _pick_file_level_indices()
-        pool = _pick_shorter_indices()
-        # 先按文件去重，再按长度过滤；若不足则回退。
-        primary_pool = [idx for idx in pool if idx in file_pool]
-        if len(primary_pool) >= 2:
-            indices = random.sample(primary_pool, 2)
-        elif len(file_pool) >= 2:
-            indices = random.sample(file_pool, 2)
-        elif len(pool) >= 2:
-            indices = random.sample(pool, 2)
+    # 抽样期间多次读取 chunks / embeddings，持有读锁避免中途被重建替换
+    with get_note_indexer().read_locked():
+        _ensure_notes_available(2)
+        total = len(get_note_indexer().chunks)
+
+        if mode == "mmr":
+            idx_a = random.randrange(total)
+            idx_b = _pick_least_similar(idx_a)
+            if idx_b == idx_a:
+                indices = random.sample(range(total), 2)
+            else:
+                indices = [idx_a, idx_b]
         else:
-            indices = random.sample(range(total), 2)
-
-    return [_entry_to_note(note_indexer.entries[i]) for i in indices]
+            file_pool = _pick_file_level_indices()
+            pool = _pick_shorter_indices()
+            # 先按文件去重，再按长度过滤；若不足则回退。
+            file_set = set(file_pool)
+            primary_pool = [idx for idx in pool if idx in file_set]
+            if len(primary_pool) >= 2:
+                indices = random.sample(primary_pool, 2)
+            elif len(file_pool) >= 2:
+                indices = random.sample(file_pool, 2)
+            elif len(pool) >= 2:
+                indices = random.sample(pool, 2)
+            else:
+                indices = random.sample(range(total), 2)
+
+        return [_chunk_to_note(i) for i in indices]
 
 
 def _build_messages(
@@ -0,0 +1,381 @@
+"""
+列式 chunk 存储：索引中全部 chunk 的文本与元数据按列保存，按整数位置 / chunk id 读取；
+快照中的文本以内存映射方式读取
+"""
+
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 文本编码：纯 ASCII 与西文为主的文本存 UTF-8；中日韩文字为主的文本 UTF-8 每字 3 字节，改存 UTF-16（每字 2 字节）
+_UTF8 = 0
+_UTF16 = 1
+_CODECS = ("utf-8", "utf-16-le")
+
+# 内存中的文本（快照之后新增的 chunk）被删除的字节超过存活字节数（且不少于下限）时整理
+_TEXT_COMPACT_MIN = 1 << 20
+
+# 确定性 chunk 标识（chunking.chunk_key）的字节数
+_KEY_BYTES = 32
+
+# 每个 chunk 一行的结构化数组：各字段即各列，位置与向量矩阵的行号一致
+_ROW = np.dtype([
+    ("id", "<i8"),
+    ("text_offset", "<i8"),
+    ("text_bytes", "<i4"),
+    ("length", "<i4"),  # 文本字符数
+    ("file", "<i4"),  # (file_path, rel_path) 驻留表编号
+    ("title", "<i4"),
+    ("tags", "<i4"),  # 标签组合驻留表编号
+    ("status", "<i4"),
+    ("order", "<i4"),
+    ("chunk_count", "<i4"),
+    ("text_codec", "i1"),
+    ("chunk_key", f"S{_KEY_BYTES}"),  # 确定性 chunk 标识（32 位十六进制），旧索引没有时为空
+])
+
+
+def _row_dtype(key_bytes: int) -> np.dtype:
+    """chunk_key 列宽为 key_bytes 的行类型（容纳旧索引中更长的标识，如 36 字符的 uuid4）。"""
+    return np.dtype([(name, _ROW.fields[name][0]) for name in _ROW.names[:-1]] + [("chunk_key", f"S{key_bytes}")])
+
+
+class _Interner:
+    """值 -> 编号的驻留表：同一文件的各 chunk 共用一份标题、路径与标签组合。None 编为 -1。"""
+
+    __slots__ = ("values", "_index")
+
+    def __init__(self) -> None:
+        self.values: List[Any] = []
+        self._index: Dict[Any, int] = {}
+
+    def add(self, value: Optional[Hashable]) -> int:
+        if value is None:
+            return -1
+        idx = self._index.get(value)
+        if idx is None:
+            idx = self._index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+    def get(self, idx: int) -> Any:
+        return None if idx < 0 else self.values[idx]
+
+
+def _freeze_tags(tags: Any) -> Tuple[Any, ...]:
+    """frontmatter 标签转为可驻留的元组（含不可哈希的值时全部转为字符串）。"""
+    if not tags:
+        return ()
+    frozen = tuple(tags) if isinstance(tags, (list, tuple)) else (tags,)
+    try:
+        hash(frozen)
+    except TypeError:
+        frozen = tuple(str(tag) for tag in frozen)
+    return frozen
+
+
+def _encode(text: str) -> Tuple[bytes, int]:
+    raw = text.encode("utf-8")
+    if len(raw) > 2 * len(text):
+        return text.encode("utf-16-le"), _UTF16
+    return raw, _UTF8
+
+
+# 快照中保存的一行：(chunk id, 文本在文本文件中的偏移, 字节数, 编码, 字符数, 元数据)
+StoredRow = Tuple[int, int, int, int, int, Dict[str, Any]]
+
+
+class ChunkStore:
+    """
+    按列保存的 chunk 集合，替代每个 chunk 一个嵌套 dict（文本 + 元数据 dict + 标签列表）的列表：
+    - 定长字段（chunk id、序号、文本偏移与长度等）存在按容量倍增的结构化 NumPy 数组中，每个 chunk 一行
+    - 标题、路径、状态与标签组合驻留为编号，行中只存编号
+    - 文本按 (偏移, 字节数) 寻址，读取时才解码为 str。偏移落在两段连续的地址上：
+      前段是快照的文本文件（只读内存映射，只有被读取的页进入内存，多个进程打开同一快照时共享页缓存），
+      后段是快照之后新增 chunk 的内存缓冲区，写入下一份快照后改为映射新文件（attach_text）
+    删除用末尾行填补空位（与索引器的向量缓冲区同步）；文本文件只追加不修改，被删文本留到下一份快照时丢弃，
+    内存缓冲区中被删的字节累积过多时整理回收。驻留表不随删除收缩，全量重建时随新的 ChunkStore 一并重建。
+    metadata() / entry() 按需组装与旧版相同结构的 dict，供检索结果、增量对比与增量日志使用。
+    非线程安全：读取方持有索引器的读锁，修改在写锁内进行。
+    """
+
+    __slots__ = (
+        "_rows", "_size", "_pos", "_mapped", "_mapped_len", "_text", "_dead_bytes", "_dead_mapped",
+        "_files", "_titles", "_statuses", "_tags",
+    )
+
+    def __init__(self, entries: Iterable[Dict[str, Any]] = ()) -> None:
+        self._rows = np.empty(0, dtype=_ROW)
+        self._size = 0
+        # chunk id -> 位置
+        self._pos: Dict[int, int] = {}
+        # 快照文本文件的内存映射（空文件或尚未保存时为 None）及其长度
+        self._mapped: Optional[mmap.mmap] = None
+        self._mapped_len = 0
+        # 映射之后新增的文本，偏移从 _mapped_len 开始
+        self._text = bytearray()
+        self._dead_bytes = 0
+        self._dead_mapped = 0
+        self._files = _Interner()
+        self._titles = _Interner()
+        self._statuses = _Interner()
+        self._tags = _Interner()
+        self.extend(entries)
+
+    @classmethod
+    def from_snapshot(cls, text_file: Path, rows: Iterable[StoredRow]) -> "ChunkStore":
+        """由快照的文本文件与行记录构建，文本留在磁盘上按需读取。"""
+        store = cls()
+        store._map(text_file)
+        store._append_rows(
+            store._row(chunk_id, meta, offset, size, chars, codec) for chunk_id, offset, size, codec, chars, meta in rows
+        )
+        return store
+
+    def _map(self, text_file: Path) -> None:
+        with open(text_file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if self._mapped is not None and hasattr(mmap, "MADV_RANDOM"):
+            # 检索只读取零散的 top_k 文本，关闭预读，常驻的页只有实际读到的那些
+            self._mapped.madvise(mmap.MADV_RANDOM)
+        self._mapped_len = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return chunk_id in self._pos
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """按位置逐个组装 {"id", "text", "metadata"}。"""
+        for pos in range(self._size):
+            yield self.entry(pos)
+
+    def iter_texts(self) -> Iterator[Dict[str, Any]]:
+        """按位置逐个产出 {"id", "text"}（构建 BM25 索引用，不组装元数据）。"""
+        for pos in range(self._size):
+            yield {"id": self.id_at(pos), "text": self.text(pos)}
+
+    def iter_metadata(self) -> Iterator[Dict[str, Any]]:
+        """按位置逐个产出 {"id", "metadata"}（构建元数据倒排表用，不读取文本）。"""
+        for pos in range(self._size):
+            yield {"id": self.id_at(pos), "metadata": self.metadata(pos)}
+
+    @property
+    def ids(self) -> np.ndarray:
+        """按位置排列的 chunk id（视图，下次修改前有效）。"""
+        return self._rows["id"][: self._size]
+
+    @property
+    def file_ids(self) -> np.ndarray:
+        """按位置排列的文件编号，同一文件的 chunk 编号相同。"""
+        return self._rows["file"][: self._size]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """按位置排列的文本字符数。"""
+        return self._rows["length"][: self._size]
+
+    def position(self, chunk_id: int) -> Optional[int]:
+        """chunk id 对应的位置，不存在时返回 None。"""
+        return self._pos.get(chunk_id)
+
+    def positions(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """批量将 chunk id 映射为位置（形状不变），不存在或为 -1 的 id 映射为 -1。"""
+        chunk_ids = np.asarray(chunk_ids, dtype="int64")
+        get = self._pos.get
+        flat = np.fromiter((get(i, -1) for i in chunk_ids.ravel().tolist()), dtype="int64", count=chunk_ids.size)
+        return flat.reshape(chunk_ids.shape)
+
+    def id_at(self, pos: int) -> int:
+        return int(self._rows["id"][pos])
+
+    def _raw(self, offset: int, size: int) -> bytes:
+        if offset < self._mapped_len:
+            return self._mapped[offset:offset + size]
+        offset -= self._mapped_len
+        return self._text[offset:offset + size]
+
+    def text(self, pos: int) -> str:
+        _, offset, size, *_, codec, _ = self._rows[pos].item()
+        return self._raw(offset, size).decode(_CODECS[codec])
+
+    def file_path(self, pos: int) -> Optional[str]:
+        return self._files.get(int(self._rows["file"][pos]))[0]
+
+    def rel_path(self, pos: int) -> Optional[str]:
+        return self._files.get(int(self._rows["file"][pos]))[1]
+
+    def title(self, pos: int) -> Optional[str]:
+        return self._titles.get(int(self._rows["title"][pos]))
+
+    def metadata(self, pos: int) -> Dict[str, Any]:
+        """组装与分块时相同结构的元数据 dict（每次返回新对象）。"""
+        _, _, _, _, file_no, title, tags, status, order, chunk_count, _, key = self._rows[pos].item()
+        file_path, rel_path = self._files.values[file_no]
+        return {
+            "file_path": file_path,
+            "rel_path": rel_path,
+            "title": self._titles.get(title),
+            "chunk_id": key.decode("ascii") if key else None,
+            "order": order if order >= 0 else None,
+            "chunk_count": chunk_count if chunk_count >= 0 else None,
+            "tags": list(self._tags.values[tags]),
+            "status": self._statuses.get(status),
+        }
+
+    def entry(self, pos: int) -> Dict[str, Any]:
+        return {"id": self.id_at(pos), "text": self.text(pos), "metadata": self.metadata(pos)}
+
+    def positions_for_files(self, paths: Iterable[str], key: str = "file_path") -> np.ndarray:
+        """
+        属于给定文件的 chunk 位置（升序）。
+        :param key: paths 为绝对路径（"file_path"）还是相对 note_root 的路径（"rel_path"）
+        """
+        field = 0 if key == "file_path" else 1
+        targets = set(paths)
+        file_ids = [idx for idx, pair in enumerate(self._files.values) if pair[field] in targets]
+        if not file_ids:
+            return np.empty(0, dtype="int64")
+        return np.flatnonzero(np.isin(self.file_ids, file_ids))
+
+    def _row(self, chunk_id: int, meta: Dict[str, Any], offset: int, size: int, chars: int, codec: int) -> Tuple[Any, ...]:
+        order = meta.get("order")
+        chunk_count = meta.get("chunk_count")
+        return (
+            chunk_id,
+            offset,
+            size,
+            chars,
+            self._files.add((meta.get("file_path"), meta.get("rel_path"))),
+            self._titles.add(meta.get("title")),
+            self._tags.add(_freeze_tags(meta.get("tags"))),
+            self._statuses.add(meta.get("status")),
+            -1 if order is None else order,
+            -1 if chunk_count is None else chunk_count,
+            codec,
+            (meta.get("chunk_id") or "").encode("ascii"),
+        )
+
+    def _append_rows(self, rows: Iterable[Tuple[Any, ...]]) -> None:
+        """将行元组整段写入结构化数组（容量不足时按 1.5 倍扩容）。"""
+        rows = list(rows)
+        if not rows:
+            return
+        key_bytes = max(len(row[-1]) for row in rows)
+        if key_bytes > self._rows.dtype["chunk_key"].itemsize:
+            self._widen_keys(key_bytes)
+        start, end = self._size, self._size + len(rows)
+        if end > len(self._rows):
+            grown = np.empty(max(end, int(end * 1.5), 64), dtype=self._rows.dtype)
+            grown[:start] = self._rows[:start]
+            self._rows = grown
+        self._rows[start:end] = rows
+        for pos, row in enumerate(rows, start=start):
+            self._pos[row[0]] = pos
+        self._size = end
+
+    def _widen_keys(self, key_bytes: int) -> None:
+        """
+        加宽 chunk_key 列：定长字节串赋值时会静默截断，旧版本索引的 uuid4 标识（36 字符）原样保存时需要更宽的列。
+        这类标识与新的确定性标识不会相同，所在文件下次更新时全部重新嵌入；全量重建后行类型恢复为 32 字节。
+        """
+        logger.info("chunk ids longer than %d bytes (legacy index), widening chunk_key to %d bytes", _KEY_BYTES, key_bytes)
+        self._rows = self._rows.astype(_row_dtype(key_bytes))
+
+    def extend(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """追加 {"id", "text", "metadata"}，文本写入内存缓冲区。"""
+        rows: List[Tuple[Any, ...]] = []
+        text_buf = self._text
+        for entry in entries:
+            text = entry.get("text") or ""
+            raw, codec = _encode(text)
+            offset = self._mapped_len + len(text_buf)
+            rows.append(self._row(entry["id"], entry.get("metadata") or {}, offset, len(raw), len(text), codec))
+            text_buf += raw
+        self._append_rows(rows)
+
+    def remove(self, chunk_id: int) -> Optional[int]:
+        """
+        删除 chunk：末尾行移入空出的位置。
+        :return: 空出的位置（调用方据此移动向量矩阵的末尾行），id 不存在时返回 None
+        """
+        pos = self._pos.pop(chunk_id, None)
+        if pos is None:
+            return None
+        last = self._size - 1
+        size = int(self._rows["text_bytes"][pos])
+        if int(self._rows["text_offset"][pos]) < self._mapped_len:
+            self._dead_mapped += size
+        else:
+            self._dead_bytes += size
+        if pos != last:
+            self._rows[pos] = self._rows[last]
+            self._pos[int(self._rows["id"][pos])] = pos
+        self._size = last
+        if self._dead_bytes > max(_TEXT_COMPACT_MIN, len(self._text) - self._dead_bytes):
+            self._compact_text()
+        return pos
+
+    def _compact_text(self) -> None:
+        """按位置顺序重写内存缓冲区，丢弃已删除 chunk 的字节（映射部分不变）。"""
+        rows = self._rows[: self._size]
+        in_memory = np.flatnonzero(rows["text_offset"] >= self._mapped_len)
+        text = bytearray()
+        view = memoryview(self._text)
+        offsets: List[int] = []
+        for offset, size in zip(rows["text_offset"][in_memory].tolist(), rows["text_bytes"][in_memory].tolist()):
+            offsets.append(self._mapped_len + len(text))
+            offset -= self._mapped_len
+            text += view[offset:offset + size]
+        view.release()
+        rows["text_offset"][in_memory] = offsets
+        self._text = text
+        self._dead_bytes = 0
+
+    def write_texts(self, f: BinaryIO) -> None:
+        """按位置顺序把全部文本紧密写入文件（写快照用），第 i 个文本的偏移为前 i 个文本的字节数之和。"""
+        rows = self._rows[: self._size]
+        for offset, size in zip(rows["text_offset"].tolist(), rows["text_bytes"].tolist()):
+            f.write(self._raw(offset, size))
+
+    def iter_stored(self) -> Iterator[StoredRow]:
+        """按位置产出写入快照的行记录，偏移与 write_texts 写出的文件一致。"""
+        offset = 0
+        for pos in range(self._size):
+            chunk_id, _, size, chars, *_, codec, _ = self._rows[pos].item()
+            yield chunk_id, offset, size, codec, chars, self.metadata(pos)
+            offset += size
+
+    def attach_text(self, text_file: Path) -> None:
+        """
+        保存快照后改为映射其中的文本文件（由 write_texts 写出），释放内存缓冲区。
+        调用方需保证保存之后 chunk 集合没有变化。
+        """
+        sizes = self._rows["text_bytes"][: self._size].astype("int64")
+        offsets = np.cumsum(sizes) - sizes
+        if int(sizes.sum()) != os.path.getsize(text_file):
+            raise ValueError(f"chunk text file {text_file} does not match the chunk store")
+        self._map(text_file)
+        self._rows["text_offset"][: self._size] = offsets
+        self._text = bytearray()
+        self._dead_bytes = 0
+        self._dead_mapped = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回 chunk 数、文件数、映射 / 内存中的文本字节数与行数组占用的字节数。"""
+        return {
+            "chunks": self._size,
+            "files": len(self._files.values),
+            "mapped_text_bytes": self._mapped_len - self._dead_mapped,
+            "memory_text_bytes": len(self._text) - self._dead_bytes,
+            "dead_text_bytes": self._dead_mapped + self._dead_bytes,
+            "row_bytes": self._size * self._rows.dtype.itemsize,
+        }
@@ -0,0 +1,148 @@
+"""
+Markdown 分块：按标题与长度切分笔记，生成带确定性标识的 chunk；全量重建时在进程池中并行分块
+"""
+
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from app.api.services.markdown_io import parse_frontmatter
+from app.utils.tokens import split_by_tokens
+
+_HEADERS_TO_SPLIT_ON = [
+    ("#", "h1"),
+    ("##", "h2"),
+    ("###", "h3"),
+    ("####", "h4"),
+]
+
+# (已完成文件数, 非空 chunk 文本, 对应元数据)
+ChunkBatch = Tuple[int, List[str], List[Dict[str, Any]]]
+
+
+def chunk_key(rel_path: str, header_path: str, text: str, occurrence: int = 0) -> str:
+    """
+    确定性的 chunk 标识：由文件路径、所在标题路径与内容哈希派生，文件重新分块后内容未变的 chunk 得到相同的标识。
+    :param occurrence: 同一标题下完全相同的内容出现多次时的序号，用于区分重复段落
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    seed = f"{rel_path}\x00{header_path}\x00{content_hash}\x00{occurrence}"
+    return hashlib.sha256(seed.encode("utf-8")).hexdigest()[:32]
+
+
+@lru_cache(maxsize=1)
+def _splitters() -> Tuple[Any, Any]:
+    """
+    每个进程复用一组切分器（两者都不保存跨调用的状态，可在线程间共享）。
+    langchain 导入较慢（约 0.8 秒），推迟到第一次分块。
+    """
+    from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+
+    header_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=_HEADERS_TO_SPLIT_ON, strip_headers=False)
+    # 再次按长度分割，保证 chunk 不过长
+    recursive_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=800,
+        chunk_overlap=100,
+        separators=["\n## ", "\n### ", "\n", " "],
+    )
+    return header_splitter, recursive_splitter
+
+
+def chunk_markdown(file_path: str, content: str, note_root: Path, max_item_tokens: int) -> List[Dict[str, Any]]:
+    """将 markdown 内容分块，并携带层级标题信息与元数据。"""
+    header_splitter, recursive_splitter = _splitters()
+    md_docs = header_splitter.split_text(content)
+
+    frontmatter, _ = parse_frontmatter(content)
+    raw_tags = frontmatter.get("tags", []) if isinstance(frontmatter, dict) else []
+    tags = raw_tags if isinstance(raw_tags, list) else [raw_tags]
+
+    abs_path = Path(file_path).resolve()
+    try:
+        rel_path = abs_path.relative_to(note_root).as_posix()
+    except ValueError:
+        rel_path = abs_path.name
+
+    title = frontmatter.get("title") if isinstance(frontmatter, dict) else None
+    display_title = str(title or abs_path.stem)
+    status = str(frontmatter.get("status") or "").lower() if isinstance(frontmatter, dict) else ""
+
+    chunks: List[Dict[str, Any]] = []
+    occurrences: Dict[Tuple[str, str], int] = {}
+    for doc in md_docs:
+        header_path = " > ".join(str(doc.metadata[key]) for _, key in _HEADERS_TO_SPLIT_ON if key in doc.metadata)
+        # 仍超过嵌入单条上限的片段（如无分隔符的长段落）继续切分，而不是在嵌入时截断
+        sub_docs = [
+            piece
+            for sub in recursive_splitter.split_text(doc.page_content)
+            for piece in split_by_tokens(sub, max_item_tokens)
+        ]
+        for idx, sub in enumerate(sub_docs):
+            occurrence = occurrences.get((header_path, sub), 0)
+            occurrences[(header_path, sub)] = occurrence + 1
+            meta = {
+                "file_path": file_path,
+                "rel_path": rel_path,
+                "title": display_title,
+                "chunk_id": chunk_key(rel_path, header_path, sub, occurrence),
+                "order": idx,
+                "chunk_count": len(sub_docs),
+                "tags": tags,
+                "status": status or None,
+            }
+            chunks.append(
+                {
+                    "text": sub,
+                    "metadata": meta,
+                }
+            )
+    return chunks
+
+
+def chunk_files(
+    files: Sequence[Dict[str, Any]], note_root: Path, max_item_tokens: int
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """对一组文件分块，返回非空 chunk 的文本与元数据（进程池的任务单元）。"""
+    texts: List[str] = []
+    metas: List[Dict[str, Any]] = []
+    for f in files:
+        for chunk in chunk_markdown(f.get("path"), f.get("content", ""), note_root, max_item_tokens):
+            text = chunk.get("text", "")
+            if not text or not text.strip():
+                continue
+            texts.append(text)
+            metas.append(chunk["metadata"])
+    return texts, metas
+
+
+def iter_chunk_batches(
+    files: Sequence[Dict[str, Any]],
+    note_root: Path,
+    max_item_tokens: int,
+    workers: int = 1,
+    files_per_task: int = 16,
+) -> Iterator[ChunkBatch]:
+    """
+    按输入顺序逐批产出分块结果，调用方可以边接收边嵌入。
+    workers > 1 时在进程池中分块（每个任务 files_per_task 个文件，减少进程间传输次数），否则在当前线程逐个文件分块。
+    进程池使用 spawn 启动：调用方所在进程通常还有其他线程（后台任务、嵌入并发），fork 可能复制到被持有的锁。
+    """
+    if workers <= 1:
+        for done, f in enumerate(files, start=1):
+            texts, metas = chunk_files([f], note_root, max_item_tokens)
+            yield done, texts, metas
+        return
+
+    tasks = [files[i:i + files_per_task] for i in range(0, len(files), files_per_task)]
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context("spawn"))
+    try:
+        done = 0
+        results = executor.map(chunk_files, tasks, [note_root] * len(tasks), [max_item_tokens] * len(tasks))
+        for task, (texts, metas) in zip(tasks, results):
+            done += len(task)
+            yield done, texts, metas
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,151 @@
+"""
+嵌入向量的持久化缓存（内容寻址 + LRU 淘汰）
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# SQLite 单条语句的参数上限（旧版本为 999）
+_SQL_VARS_LIMIT = 500
+
+
+class EmbeddingCache:
+    """
+    以 hash(provider, model, text) 为键缓存 embedding，存储于 SQLite。
+    - 命中时刷新 last_used，超过 max_items 时按 last_used 淘汰最久未使用的条目
+    - provider/model 与库中记录不一致时自动清空，避免混用不同模型的向量
+    """
+
+    def __init__(self, db_path: Path, provider: str, model: str, max_items: int = 200000) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.db_path = Path(db_path)
+        self.provider = provider
+        self.model = model
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self._tick = self._conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._check_model()
+
+    def _check_model(self) -> None:
+        """嵌入模型变更时清空缓存。"""
+        rows = dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+        if rows.get("provider") == self.provider and rows.get("model") == self.model:
+            return
+        if self._size:
+            self.logger.info(
+                "embedding model changed (%s/%s -> %s/%s), invalidating cache",
+                rows.get("provider"), rows.get("model"), self.provider, self.model,
+            )
+        self.invalidate()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                [("provider", self.provider), ("model", self.model)],
+            )
+
+    def make_key(self, text: str) -> str:
+        """计算缓存键。"""
+        raw = f"{self.provider}\0{self.model}\0{text}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        批量查询缓存，未命中的位置返回 None（与输入一一对应）。
+        """
+        keys = [self.make_key(t) for t in texts]
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), _SQL_VARS_LIMIT):
+                part = unique_keys[start:start + _SQL_VARS_LIMIT]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                found.update(rows)
+            if found:
+                self._tick += 1
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(self._tick, k) for k in found],
+                    )
+
+        results: List[Optional[List[float]]] = []
+        for key in keys:
+            blob = found.get(key)
+            if blob is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                results.append(np.frombuffer(blob, dtype="float32").tolist())
+        return results
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]]) -> None:
+        """写入缓存，并在超出容量时淘汰最久未使用的条目。"""
+        rows = [
+            (self.make_key(t), np.asarray(emb, dtype="float32").tobytes())
+            for t, emb in zip(texts, embeddings)
+            if emb is not None
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._tick += 1
+            with self._conn:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, blob, self._tick) for key, blob in rows],
+                )
+                self._size += self._conn.total_changes - before
+                if self.max_items and self._size > self.max_items:
+                    overflow = self._size - self.max_items
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                        (overflow,),
+                    )
+                    self._size -= overflow
+
+    def invalidate(self) -> None:
+        """清空缓存与计数。"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM embeddings")
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息。"""
+        lookups = self.hits + self.misses
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "size": self._size,
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,89 @@
+"""
+嵌入请求调度：并发批次、限流与瞬时错误重试
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, List, Sequence, Tuple
+
+from app.utils.rate_limit import TokenBucket
+from app.utils.retry import retry_with_backoff
+from app.utils.tokens import estimate_tokens
+
+EmbeddingFn = Callable[[List[str]], List[List[float]]]
+
+
+def iter_batches(texts: Iterable[str], max_items: int, max_tokens: int) -> Iterator[List[str]]:
+    """
+    按顺序将文本装入批次：每批不超过 max_items 条、估算 token 总数不超过 max_tokens。
+    单条超过 max_tokens 的文本独占一个批次（由分块阶段保证不超过单条上限）。
+    逐批产出，输入可以是边分块边生成的流。
+    """
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            yield current
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        yield current
+
+
+def pack_batches(texts: Sequence[str], max_items: int, max_tokens: int) -> List[List[str]]:
+    """一次性装箱，见 iter_batches。"""
+    return list(iter_batches(texts, max_items, max_tokens))
+
+
+class EmbeddingDispatcher:
+    """
+    以最多 concurrency 个批次并发调用 embedding_fn。
+    - 每次请求（含重试）前从令牌桶取令牌，requests_per_second <= 0 表示不限流
+    - 429 / 5xx / 连接错误按指数退避重试
+    - 结果严格按输入批次顺序产出，与并发度无关
+    """
+
+    def __init__(
+        self,
+        embedding_fn: EmbeddingFn,
+        concurrency: int = 4,
+        requests_per_second: float = 0.0,
+        max_attempts: int = 4,
+    ) -> None:
+        self.embedding_fn = embedding_fn
+        self.concurrency = max(1, concurrency)
+        self.limiter = TokenBucket(requests_per_second)
+        self.max_attempts = max_attempts
+
+    def _call(self, batch: List[str]) -> List[List[float]]:
+        def attempt() -> List[List[float]]:
+            self.limiter.acquire()
+            return self.embedding_fn(batch)
+
+        return retry_with_backoff(attempt, max_attempts=self.max_attempts)
+
+    def run(self, batches: Iterable[List[str]]) -> Iterator[Tuple[List[str], List[List[float]]]]:
+        """
+        依次产出 (batch, embeddings)。batches 可以是惰性生成的流：边取批次边提交，
+        在途批次不超过 2 * concurrency，队首完成即产出。任一批次最终失败时取消尚未开始的批次并抛出异常。
+        """
+        if self.concurrency == 1:
+            for batch in batches:
+                yield batch, self._call(batch)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+        in_flight: Deque[Tuple[List[str], Future]] = deque()
+        try:
+            for batch in batches:
+                in_flight.append((batch, executor.submit(self._call, batch)))
+                while in_flight and (len(in_flight) >= 2 * self.concurrency or in_flight[0][1].done()):
+                    done_batch, future = in_flight.popleft()
+                    yield done_batch, future.result()
+            while in_flight:
+                done_batch, future = in_flight.popleft()
+                yield done_batch, future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
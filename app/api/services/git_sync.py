@@ -3,8 +3,9 @@ Git 仓库同步工具
 """
 
 import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from git import Repo, GitCommandError, InvalidGitRepositoryError
 
@@ -55,13 +56,15 @@ class GitSync:
             print(f"GitSync Clone Error: {e}")
             return None
 
-    def pull(self) -> bool:
-        """执行 pull，失败返回 False"""
+    def pull(self) -> Optional[Tuple[str, str]]:
+        """
+        执行 pull，成功返回 (pull 前 HEAD, pull 后 HEAD)，失败返回 None
+        """
         try:
             repo = self.ensure_repo()
             if not repo:
                 print(f"GitSync Error: Repo not found or invalid. URL: {self.repo_url}, Path: {self.local_path}")
-                return False
+                return None
             
             # 记录当前 HEAD
             old_commit = repo.head.commit.hexsha
@@ -75,10 +78,43 @@ class GitSync:
             else:
                 print("GitSync: Already up to date.")
                 
-            return True
+            return old_commit, new_commit
         except Exception as e:
             print(f"GitSync Exception during pull: {e}")
-            return False
+            return None
+
+    def diff_changes(self, old_commit: str, new_commit: str) -> Optional[Dict[str, List[Any]]]:
+        """
+        对比两个提交之间的文件变更（路径相对仓库根目录）
+        返回: {"added": [str], "modified": [str], "deleted": [str], "renamed": [{"from": str, "to": str}]}
+        失败返回 None，调用方应回退到全量重建
+        """
+        changes: Dict[str, List[Any]] = {"added": [], "modified": [], "deleted": [], "renamed": []}
+        if old_commit == new_commit:
+            return changes
+
+        repo = self._open_repo()
+        if not repo:
+            return None
+        try:
+            # GitPython 默认带 -M，重命名会以 change_type == "R" 返回
+            diff_index = repo.commit(old_commit).diff(new_commit)
+        except Exception as e:
+            print(f"GitSync Exception during diff: {e}")
+            return None
+
+        for item in diff_index:
+            change_type = item.change_type
+            if change_type == "A":
+                changes["added"].append(item.b_path)
+            elif change_type == "D":
+                changes["deleted"].append(item.a_path)
+            elif change_type == "R":
+                changes["renamed"].append({"from": item.a_path, "to": item.b_path})
+            else:
+                # M / T 等均视为内容修改
+                changes["modified"].append(item.b_path or item.a_path)
+        return changes
 
     def commit_and_push(self, message: str = "auto sync") -> bool:
         """
@@ -99,11 +135,29 @@ class GitSync:
             return False
 
 
-# 全局实例，供路由调用
-git_sync = GitSync(
-    repo_url=settings.NOTE_REPO_URL,
-    local_path=settings.NOTE_LOCAL_PATH,
-    branch=settings.NOTE_REPO_BRANCH,
-)
+# 全局实例：首次调用 get_git_sync() 时才创建（会创建本地仓库目录）
+_git_sync: Optional[GitSync] = None
+_git_sync_lock = threading.Lock()
+
+
+def get_git_sync() -> GitSync:
+    """返回全局 GitSync，首次调用时按 settings 创建（线程安全）。"""
+    global _git_sync
+    if _git_sync is None:
+        with _git_sync_lock:
+            if _git_sync is None:
+                _git_sync = GitSync(
+                    repo_url=settings.NOTE_REPO_URL,
+                    local_path=settings.NOTE_LOCAL_PATH,
+                    branch=settings.NOTE_REPO_BRANCH,
+                )
+    return _git_sync
+
+
+def __getattr__(name: str) -> Any:
+    # 兼容旧的 `from app.api.services.git_sync import git_sync` 写法
+    if name == "git_sync":
+        return get_git_sync()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
@@ -3,22 +3,62 @@
 """
 
 import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-import uuid
-import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
 
 import faiss
 import numpy as np
-from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
 
 from app.config.settings import settings
-from app.api.services.markdown_io import parse_frontmatter
+from app.api.services import ann_index
+from app.api.services.bm25 import BM25Index, reciprocal_rank_fusion
+from app.api.services.chunk_store import ChunkStore
+from app.api.services.chunking import iter_chunk_batches
 from app.api.services.ai_providers import get_embedding_callable
+from app.api.services.embedding_cache import EmbeddingCache
+from app.api.services.embedding_pool import EmbeddingDispatcher, iter_batches, pack_batches
+from app.api.services.jobs import JobCancelled
+from app.api.services.query_cache import QueryEmbeddingCache
+from app.api.services.search_filters import MetadataPostings, SearchFilters
+from app.api.services.vector_store import VectorStore
+from app.utils.rwlock import ReadWriteLock
+
+
+# 进度回调：(阶段, 已完成数, 总数)，"scan" 为已分块的文件数，"embed" 为已得到向量的 chunk 数；
+# 回调抛出 JobCancelled 时中止本次写操作，索引保持不变
+ProgressFn = Callable[[str, int, int], None]
+
+# 按过滤条件缓存的候选集 / 位图个数
+_FILTER_CACHE_SIZE = 64
+# 构建 BM25 时每次持有读锁读取的 chunk 文本条数
+_BM25_READ_BATCH = 2048
+
+# 检索模式：向量（FAISS）、关键词（BM25）、两路倒数排名融合
+SEARCH_VECTOR = "vector"
+SEARCH_KEYWORD = "keyword"
+SEARCH_HYBRID = "hybrid"
+SEARCH_MODES = (SEARCH_VECTOR, SEARCH_KEYWORD, SEARCH_HYBRID)
+
+
+def _no_progress(stage: str, done: int, total: int) -> None:
+    return None
 
 
 class NoteIndexer:
-    """负责构建 FAISS 向量索引并执行搜索"""
+    """
+    负责构建 FAISS 向量索引并执行搜索。
+    并发模型：写操作（重建 / upsert / 删除）由 _write_mutex 串行化，嵌入与索引训练在锁外进行；
+    只有替换或修改内存中的 (index, chunks, 向量) 时才短暂持有读写锁的写端，检索持有读端。
+    多进程部署：写操作另外持有索引目录的文件锁，开始前先追上其他进程发布的版本；后台线程轮询 VERSION 文件，
+    发现其他进程发布了新快照或增量后重新加载并原子替换，无需重启。
+    只读模式不接受写操作，以内存映射方式加载快照。
+    """
 
     def __init__(
         self,
@@ -28,46 +68,423 @@ class NoteIndexer:
         embedding_base_url: Optional[str] = None,
         embedding_api_key: Optional[str] = None,
         note_root: Optional[str] = None,
+        enable_embedding_cache: bool = True,
+        embedding_cache_max_items: int = 200000,
+        index_type: str = "auto",
+        ann_auto_threshold: int = 20000,
+        ann_build_params: Optional[Dict[str, int]] = None,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        embedding_concurrency: int = 4,
+        embedding_rate_limit: float = 0.0,
+        embedding_max_attempts: int = 4,
+        embedding_limits: Optional[Dict[str, int]] = None,
+        query_cache_max_items: int = 1024,
+        query_cache_ttl: float = 0.0,
+        keep_snapshots: int = 3,
+        verify_snapshots: bool = True,
+        filter_exact_max: int = 4096,
+        hybrid_candidates: int = 50,
+        rrf_k: int = 60,
+        chunk_workers: int = 1,
+        chunk_pool_min_files: int = 200,
+        quantization: str = "none",
+        rerank_factor: int = 4,
+        embedding_dimensions: int = 0,
+        read_only: bool = False,
+        reload_interval: float = 2.0,
+        keyword_index: bool = True,
+        retry_limit: int = 3,
     ) -> None:
         self.logger = logging.getLogger(__name__)
         self.persist_dir = Path(persist_dir).resolve()
         self.persist_dir.mkdir(parents=True, exist_ok=True)
-        self.index_file = self.persist_dir / "faiss.index"
-        self.meta_file = self.persist_dir / "faiss_meta.json"
+        self.store = VectorStore(
+            self.persist_dir, keep_snapshots=keep_snapshots, verify_checksums=verify_snapshots, read_only=read_only
+        )
+        # 只读模式不接受写操作；检查 VERSION 文件的间隔秒数（<= 0 不自动重新加载）、已加载状态对应的发布计数、
+        # 轮询线程所在的进程（fork 出的 worker 不继承线程，首次使用时在本进程启动）
+        self.read_only = read_only
+        self.reload_interval = reload_interval
+        self._loaded_version = ""
+        self._watcher_pid: Optional[int] = None
+        self._watcher_lock = threading.Lock()
+        self.embedding_provider = embedding_provider
+        self.embedding_model = embedding_model
+        # 嵌入输出维度（0 为模型默认）；维度不同的向量不能混用，缓存按 "模型@维度" 区分
+        self.embedding_dimensions = embedding_dimensions
+        cache_model = f"{embedding_model}@{embedding_dimensions}d" if embedding_dimensions > 0 else embedding_model
+        self.index_type = index_type
+        self.ann_auto_threshold = ann_auto_threshold
+        self.ann_build_params: Dict[str, int] = ann_build_params or {}
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # 标量量化：FAISS 存 float16 / int8 编码，索引外的向量以 float16 保存；
+        # 索引分数有损（int8、IVF-PQ）时取 top_k * rerank_factor 个候选，用保存的向量重排序
+        self.quantization = ann_index.resolve_quantization(quantization)
+        self.vector_dtype = ann_index.vector_dtype(self.quantization)
+        self.rerank_factor = rerank_factor
+        # 过滤后候选 chunk 数不超过该值时直接对候选向量精确打分，否则在 ANN 扫描中按位图过滤
+        self.filter_exact_max = filter_exact_max
+        # 混合检索：每路取的候选数、倒数排名融合的平滑常数 k
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        # 全量重建时分块的进程数，文件数少于 chunk_pool_min_files 时不启动进程池
+        self.chunk_workers = chunk_workers
+        self.chunk_pool_min_files = chunk_pool_min_files
+        # 有 chunk 被嵌入接口跳过的文件在之后的同步中最多重试的次数，超过后不再重试（文件内容变化时照常重新嵌入）
+        self.retry_limit = retry_limit
         self.note_root = Path(note_root or settings.NOTE_LOCAL_PATH).resolve()
+        # 嵌入请求上限：每批条数、每批估算 token 数、单条 token 数
+        limits = embedding_limits or settings.get_embedding_limits(embedding_provider)
+        self.batch_max_items = limits["max_batch_items"]
+        self.batch_max_tokens = limits["max_batch_tokens"]
+        self.max_item_tokens = limits["max_item_tokens"]
 
         self.embedding_fn = get_embedding_callable(
             provider=embedding_provider,
             model=embedding_model,
             base_url=embedding_base_url,
             api_key=embedding_api_key,
+            dimensions=embedding_dimensions,
         )
-        self.entries: List[Dict[str, Any]] = []
-        self.index: Optional[faiss.IndexFlatIP] = None
+        # 经由 self.embedding_fn 间接调用，便于替换嵌入实现
+        self.embedding_dispatcher = EmbeddingDispatcher(
+            lambda batch: self.embedding_fn(batch),
+            concurrency=embedding_concurrency,
+            requests_per_second=embedding_rate_limit,
+            max_attempts=embedding_max_attempts,
+        )
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if enable_embedding_cache:
+            self.embedding_cache = EmbeddingCache(
+                self.persist_dir / "embedding_cache.sqlite",
+                provider=embedding_provider,
+                model=cache_model,
+                max_items=embedding_cache_max_items,
+            )
+        # 查询向量缓存：重复查询（如聊天工具循环）跳过嵌入往返
+        self.query_cache = QueryEmbeddingCache(
+            provider=embedding_provider,
+            model=cache_model,
+            max_items=query_cache_max_items,
+            ttl_seconds=query_cache_ttl,
+        )
+        # 列式 chunk 存储（文本与元数据），位置与向量缓冲区的行号一致，按 chunk id 或位置读取
+        self.chunks = ChunkStore()
+        # 单位化向量缓冲区（按倍增预留容量），前 len(chunks) 行与 chunks 对齐；从磁盘加载时为只读 memmap
+        self._vectors: Optional[np.ndarray] = None
+        self._next_id = 0
+        self.index: Optional[faiss.Index] = None
+        # HNSW 不支持删除：已删除但仍留在图中的 chunk 数（墓碑），检索时跳过，写操作结束前在读写锁外重建图
+        self._tombstones = 0
+        # 标签 / 路径 / 状态倒排表，与 chunks 同步维护
+        self.postings = MetadataPostings()
+        # 内存状态每次修改后递增，用于失效按过滤条件缓存的候选集与位图
+        self._state_version = 0
+        self._filter_cache: "OrderedDict[Tuple[Any, ...], Tuple[int, np.ndarray, np.ndarray, Optional[ann_index.IdFilter]]]" = OrderedDict()
+        self._filter_cache_lock = threading.Lock()
+        # BM25 倒排索引：keyword_index 为 True 时随索引加载 / 重新加载 / 重建一并构建（在读写锁外），
+        # 否则在第一次关键词 / 混合检索时构建；之后随 chunks 增量维护
+        self.keyword_index = keyword_index
+        self._bm25: Optional[BM25Index] = None
+        # 按需构建 BM25 期间的变更日志：("add", chunk_id, text) / ("remove", chunk_id, "")，构建完成后重放再替换；
+        # _set_state 整体替换 chunks 时置为 None，构建者据此放弃这次快照
+        self._bm25_journal: Optional[List[Tuple[str, int, str]]] = None
+        # 串行化按需构建（与写操作的 _write_mutex 相互独立，构建期间同步照常进行）
+        self._bm25_build_lock = threading.Lock()
+        # 检索（读）与内存状态修改（写）之间的读写锁
+        self._lock = ReadWriteLock()
+        # 串行化写操作，保证 stale id 计算、嵌入与提交之间状态不被其他写者改动
+        self._write_mutex = threading.Lock()
         self._load_index()
 
+    @contextmanager
+    def read_locked(self) -> Iterator[None]:
+        """
+        以读者身份持有索引状态，期间 chunks / embeddings / index 不会被替换或修改。
+        需要多次读取 chunks 并保持一致的调用方（如灵感合成抽样）使用。
+        """
+        self._ensure_watcher()
+        with self._lock.read_locked():
+            yield
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        """与 chunks 对齐的单位化向量矩阵。"""
+        if self._vectors is None:
+            return None
+        return self._vectors[: len(self.chunks)]
+
     def _load_index(self) -> None:
-        """加载已保存的索引和元数据。"""
-        if self.index_file.exists() and self.meta_file.exists():
+        """
+        加载已保存的索引和元数据（当前快照损坏时由存储层回退到上一份快照）。
+        主进程已用 preload_index() 读取同一目录、且之后没有新的发布时直接接管，不再重复读取。
+        """
+        preloaded = _take_preloaded(self.persist_dir, self.read_only)
+        bm25: Optional[BM25Index] = None
+        try:
+            if preloaded is not None and preloaded.version == self.store.read_version():
+                self.store = preloaded.store
+                self._loaded_version = preloaded.version
+                state = self._prepare_state(preloaded.loaded)
+                bm25 = preloaded.bm25
+            else:
+                self._loaded_version, loaded = _load_published(self.store)
+                state = self._prepare_state(loaded)
+        except Exception as exc:  # noqa: BLE001
+            self.logger.error(
+                "failed to load any index snapshot from %s, starting empty (full rebuild required): %s",
+                self.persist_dir, exc, exc_info=True,
+            )
+            state = (None, ChunkStore(), None)
+        index = state[0]
+        if index is not None and self.embedding_dimensions > 0 and index.d != self.embedding_dimensions:
+            self.logger.warning(
+                "index dimension %d differs from EMBEDDING_DIMENSIONS=%d, full rebuild required before updates",
+                index.d, self.embedding_dimensions,
+            )
+        if bm25 is None:
+            bm25 = self._stage_keyword_index(state[1])
+        self._set_state(*state, bm25=bm25)
+
+    def _read_store(self) -> Tuple[Optional[faiss.Index], ChunkStore, Optional[np.ndarray]]:
+        """从当前快照读取 (index, chunks, 向量)，可执行修复性写入。调用方需持有存储层写锁。"""
+        return self._prepare_state(self.store.load())
+
+    def _prepare_state(
+        self, loaded: Optional[Tuple[Optional[faiss.Index], ChunkStore, np.ndarray]]
+    ) -> Tuple[Optional[faiss.Index], ChunkStore, Optional[np.ndarray]]:
+        """按当前配置整理 store.load() 的结果，索引需要重建（HNSW 重放删除、量化方式变化）时在此完成。"""
+        if loaded is None:
+            return None, ChunkStore(), None
+        index, chunks, vectors = loaded
+        if vectors.dtype != self.vector_dtype:
+            vectors = np.asarray(vectors, dtype=self.vector_dtype)
+        if index is not None and len(chunks) and self._quantization_mismatch(index):
+            self.logger.info(
+                "index quantization %s differs from configured %s, rebuilding from stored vectors",
+                ann_index.quantization_of(index), self.quantization,
+            )
+            index = None
+        if index is None and len(chunks):
+            index = self._build_ann(vectors, chunks.ids)
+        return index, chunks, vectors
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """
+        写操作的准备阶段：进程内由 _write_mutex 串行化，进入时（不持有文件锁）先追上其他进程已发布的版本。
+        分块、嵌入等耗时步骤在此阶段完成，只在发布时（_publishing）持有多个 worker 之间的文件锁，
+        其他 worker 的加载与嵌入不会等待本进程的嵌入请求。
+        """
+        if self.read_only:
+            raise RuntimeError("index is read-only in this process (INDEX_READ_ONLY=true), update it from the writer")
+        with self._write_mutex:
+            self._reload()
+            yield
+
+    @contextmanager
+    def _publishing(self) -> Iterator[bool]:
+        """
+        写操作的发布阶段：持有存储层文件锁，重新读取 VERSION，准备阶段之后其他进程发布过新版本时先在锁内重新加载，
+        产出是否重新加载过，调用方据此基于新状态重新计算增量（只有新出现的文本需要在锁内补嵌入）。
+        退出时记下本进程发布的版本，轮询线程不会把自己的写入当作变化重新加载。调用方需持有 _write_mutex。
+        """
+        with self.store.write_locked():
+            changed = self._reload(locked=True)
             try:
-                self.index = faiss.read_index(str(self.index_file))
-                with self.meta_file.open("r", encoding="utf-8") as f:
-                    self.entries = json.load(f)
-            except Exception:
-                self.index = None
-                self.entries = []
+                yield changed
+            finally:
+                self._loaded_version = self.store.read_version()
+
+    def reload_if_changed(self) -> bool:
+        """
+        其他进程发布了新版本（VERSION 变化）时重新加载当前快照（含增量），在写锁内原子替换内存状态。
+        加载不持有存储层文件锁、在读写锁外完成，期间检索继续使用旧状态；已构建 BM25 时一并在锁外重建。
+        :return: 是否重新加载
+        """
+        if self.store.read_version() == self._loaded_version and not self.store.needs_repair:
+            return False
+        with self._write_mutex:
+            return self._reload()
+
+    def _reload(self, locked: bool = False) -> bool:
+        """
+        reload_if_changed 的主体，调用方需持有 _write_mutex。
+        :param locked: 调用方已持有存储层文件锁（发布阶段），直接读取并可执行修复性写入；否则不持锁读取
+        """
+        version = self.store.read_version()
+        if version == self._loaded_version and not self.store.needs_repair:
+            return False
+        started = time.perf_counter()
+        if locked:
+            loaded = self.store.load()
         else:
-            self.index = None
-            self.entries = []
+            version, loaded = _load_published(self.store)
+        index, chunks, vectors = self._prepare_state(loaded)
+        postings = MetadataPostings.from_entries(chunks.iter_metadata())
+        bm25 = self._stage_keyword_index(chunks)
+        with self._lock.write_locked():
+            self._set_state(index, chunks, vectors, postings, bm25)
+        self._loaded_version = version
+        self.logger.info(
+            "reloaded index version %s (%d chunks, mmap=%s) in %.2fs",
+            version, len(chunks), self.store.index_mmapped, time.perf_counter() - started,
+        )
+        return True
 
-    def _save_index(self) -> None:
-        """持久化索引与元数据。"""
-        if self.index is None:
+    def _ensure_watcher(self) -> None:
+        """在当前进程启动（一次）轮询 VERSION 的后台线程，reload_interval <= 0 时不启动。"""
+        if self.reload_interval <= 0 or self._watcher_pid == os.getpid():
             return
-        self.persist_dir.mkdir(parents=True, exist_ok=True)
-        faiss.write_index(self.index, str(self.index_file))
-        with self.meta_file.open("w", encoding="utf-8") as f:
-            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        with self._watcher_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(
+            target=_watch_version, args=(weakref.ref(self), self.reload_interval), name="index-reloader", daemon=True
+        ).start()
+
+    def _quantization_mismatch(self, index: faiss.Index) -> bool:
+        """快照中的索引与当前配置的量化方式不同（IVF-PQ 自带编码、MappedFlatIndex 直接使用保存的向量，不参与比较）。"""
+        if isinstance(index, ann_index.MappedFlatIndex) or ann_index.index_type_of(index) == ann_index.INDEX_IVF_PQ:
+            return False
+        return ann_index.quantization_of(index) != self.quantization
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """返回已保存的索引快照（从新到旧）。"""
+        return self.store.list_snapshots()
+
+    def rollback(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        回滚到指定（默认上一份）索引快照：切换指针后加载并原子替换内存状态，无需重新嵌入。
+        :return: {"version": 切换后的版本号, "chunks": chunk 数}
+        """
+        with self._writing(), self._publishing():
+            previous = self.store.current.name if self.store.current else None
+            target = self.store.rollback(version)
+            try:
+                index, chunks, vectors = self._read_store()
+            except Exception:
+                # 目标快照不可用时恢复原指针
+                if previous is not None:
+                    self.store.rollback(previous)
+                    self.store.load()
+                raise
+            postings = MetadataPostings.from_entries(chunks.iter_metadata())
+            bm25 = self._stage_keyword_index(chunks)
+            with self._lock.write_locked():
+                self._set_state(index, chunks, vectors, postings, bm25)
+            self.query_cache.clear()
+            return {"version": self.store.current.name if self.store.current else target, "chunks": len(chunks)}
+
+    def _set_state(
+        self,
+        index: Optional[faiss.Index],
+        chunks: ChunkStore,
+        vectors: Optional[np.ndarray],
+        postings: Optional[MetadataPostings] = None,
+        bm25: Optional[BM25Index] = None,
+    ) -> None:
+        """
+        整体替换索引、chunks 与向量，并重建元数据倒排表。
+        :param postings: 预先构建好的倒排表，在写锁内调用时避免 O(n) 的重建
+        :param bm25: 预先构建好的 BM25 索引（_stage_keyword_index），为 None 表示不维护
+        """
+        self.index = index
+        self.chunks = chunks
+        self._vectors = vectors
+        self.postings = postings if postings is not None else MetadataPostings.from_entries(chunks.iter_metadata())
+        self._bm25 = bm25
+        self._bm25_journal = None
+        self._tombstones = 0
+        self._state_version += 1
+        # id 单调递增，不复用已删除 chunk 的 id
+        self._next_id = max(self._next_id, int(chunks.ids.max(initial=-1)) + 1)
+
+    def _save_index(self, source_head: Optional[str], retry_paths: Optional[Dict[str, int]] = None) -> None:
+        """
+        将当前状态写为新的索引快照，之后 chunk 文本改为从快照的文本文件映射读取（释放内存中的文本）。
+        调用方需持有 _write_mutex、不持有读写锁。
+        :param source_head: 写入 manifest 的笔记仓库提交（索引内容对应的版本），未知时为 None
+        :param retry_paths: 写入 manifest 的待重试文件，None 表示沿用当前记录
+        """
+        if self.index is None or not len(self.chunks):
+            self.store.clear()
+            return
+        self.store.save(
+            self.index,
+            self.chunks,
+            self.embeddings,
+            metadata={
+                "embedding_provider": self.embedding_provider,
+                "embedding_model": self.embedding_model,
+                "embedding_dimensions": self.embedding_dimensions or None,
+                "quantization": ann_index.quantization_of(self.index),
+                "source_head": source_head,
+                "retry_paths": self.store.retry_paths if retry_paths is None else retry_paths,
+            },
+        )
+        with self._lock.write_locked():
+            self.chunks.attach_text(self.store.text_file)
+
+    def _persist_delta(
+        self,
+        added: List[Dict[str, Any]],
+        vectors: Optional[np.ndarray],
+        removed_ids: List[int],
+        source_head: Optional[str] = None,
+        retry_paths: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """
+        增量持久化：追加到增量日志；尚无基线或日志超过阈值时写完整基线（合并）。
+        :param source_head: 写入后索引内容对应的笔记仓库提交，与增量记录一同落盘；None 表示不变
+        :param retry_paths: 写入后待重试的文件（_next_retry_paths），None 表示不变
+        """
+        head_changed = source_head is not None and source_head != self.store.source_head
+        retry_changed = retry_paths is not None and retry_paths != self.store.retry_paths
+        if not added and not removed_ids and not head_changed and not retry_changed:
+            return
+        if not self.store.exists() or not len(self.chunks):
+            self._save_index(source_head if head_changed else self.store.source_head, retry_paths)
+            return
+        self.store.append_delta(
+            list(zip(added, vectors if vectors is not None else [])),
+            removed_ids,
+            source_head=source_head,
+            retry_paths=retry_paths,
+        )
+        if self.store.needs_compaction(len(self.chunks)):
+            self.logger.info("compacting index delta log (%d records)", self.store.delta_records)
+            wanted = ann_index.resolve_index_type(self.index_type, len(self.chunks), self.ann_auto_threshold)
+            if wanted != ann_index.index_type_of(self.index):
+                # 语料规模跨过阈值时在合并时切换索引类型并重新训练（训练在锁外，只在替换时持有写锁）
+                new_index = self._build_ann(self.embeddings, self.chunks.ids)
+                with self._lock.write_locked():
+                    self.index = new_index
+                    self._state_version += 1
+            self._save_index(self.store.source_head)
+
+    def _compact_graph(self) -> None:
+        """
+        图中有墓碑时从当前向量重建 HNSW：构建在读写锁外（持有 _write_mutex，向量与 chunks 不变），
+        只在替换时短暂持有写锁，重建期间检索照常进行并跳过墓碑。调用方需持有 _write_mutex、不持有读写锁。
+        """
+        if not self._tombstones:
+            return
+        started = time.perf_counter()
+        new_index = self._build_ann(self.embeddings, self.chunks.ids)
+        with self._lock.write_locked():
+            self.index = new_index
+            self._tombstones = 0
+            self._state_version += 1
+        self.logger.info("rebuilt HNSW graph over %d chunks in %.2fs", len(self.chunks), time.perf_counter() - started)
+
+    def _build_ann(self, vectors: np.ndarray, ids: Sequence[int]) -> faiss.Index:
+        """按配置（或语料规模）选择索引类型并构建、训练索引。"""
+        index_type = ann_index.resolve_index_type(self.index_type, len(ids), self.ann_auto_threshold)
+        return ann_index.build_index(vectors, ids, index_type, quantization=self.quantization, **self.ann_build_params)
 
     @staticmethod
     def _normalize(vecs: List[List[float]]) -> np.ndarray:
@@ -76,172 +493,892 @@ class NoteIndexer:
         norms = np.linalg.norm(arr, axis=1, keepdims=True) + 1e-12
         return arr / norms
 
-    def _rebuild_faiss(self) -> None:
-        """根据 entries 重建 FAISS 索引。"""
-        if not self.entries:
-            self.index = None
+    def _reserve(self, extra: int, dim: int) -> None:
+        """保证向量缓冲区可写且能再容纳 extra 行。"""
+        n = len(self.chunks)
+        buf = self._vectors
+        if buf is not None and buf.flags.writeable and buf.dtype == self.vector_dtype and buf.shape[0] >= n + extra:
             return
-        embeddings = [e["embedding"] for e in self.entries]
-        emb_arr = self._normalize(embeddings)
-        dim = emb_arr.shape[1]
-        self.index = faiss.IndexFlatIP(dim)
-        self.index.add(emb_arr)
-        self._save_index()
-
-    def _chunk_markdown(self, file_path: str, content: str) -> List[Dict[str, Any]]:
-        """将 markdown 内容分块，并携带层级标题信息与元数据。"""
-        headers_to_split_on = [
-            ("#", "h1"),
-            ("##", "h2"),
-            ("###", "h3"),
-            ("####", "h4"),
-        ]
-        splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on, strip_headers=False)
-        md_docs = splitter.split_text(content)
-
-        # 再次按长度分割，保证 chunk 不过长
-        recursive_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,
-            chunk_overlap=100,
-            separators=["\n## ", "\n### ", "\n", " "],
-        )
+        capacity = max(n + extra, int((n + extra) * 1.5), 64)
+        new_buf = np.empty((capacity, dim), dtype=self.vector_dtype)
+        if n and buf is not None:
+            new_buf[:n] = buf[:n]
+        self._vectors = new_buf
 
-        frontmatter, _ = parse_frontmatter(content)
-        raw_tags = frontmatter.get("tags", []) if isinstance(frontmatter, dict) else []
-        tags = raw_tags if isinstance(raw_tags, list) else [raw_tags]
+    def _add_entries(self, entries: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        """追加 entries 与对应的单位化向量，并按 chunk id 加入 FAISS。"""
+        if not entries:
+            return
+        n = len(self.chunks)
+        self._reserve(len(entries), vectors.shape[1])
+        self._vectors[n:n + len(entries)] = vectors
+        for entry in entries:
+            self.postings.add(entry["id"], entry.get("metadata") or {})
+            if self._bm25 is not None:
+                self._bm25.add(entry["id"], entry.get("text") or "")
+            elif self._bm25_journal is not None:
+                self._bm25_journal.append(("add", entry["id"], entry.get("text") or ""))
+        self.chunks.extend(entries)
+        self._state_version += 1
+        ids = np.array([e["id"] for e in entries], dtype="int64")
+        if self.index is None:
+            self.index = self._build_ann(vectors, list(ids))
+        else:
+            self.index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), ids)
 
-        abs_path = Path(file_path).resolve()
-        try:
-            rel_path = abs_path.relative_to(self.note_root).as_posix()
-        except ValueError:
-            rel_path = abs_path.name
-
-        title = frontmatter.get("title") if isinstance(frontmatter, dict) else None
-        display_title = str(title or abs_path.stem)
-
-        chunks: List[Dict[str, Any]] = []
-        for doc in md_docs:
-            sub_docs = recursive_splitter.split_text(doc.page_content)
-            for idx, sub in enumerate(sub_docs):
-                meta = {
-                    "file_path": file_path,
-                    "rel_path": rel_path,
-                    "title": display_title,
-                    "chunk_id": str(uuid.uuid4()),
-                    "order": idx,
-                    "chunk_count": len(sub_docs),
-                    "tags": tags,
-                }
-                chunks.append(
-                    {
-                        "text": sub,
-                        "metadata": meta,
-                    }
-                )
-        return chunks
+    def _remove_ids(self, ids: List[int]) -> None:
+        """
+        按 chunk id 删除：FAISS 中按 id 移除，chunks 与向量缓冲区用末尾行填补空位，
+        代价与删除条数成正比而非与语料规模成正比。
+        """
+        chunks = self.chunks
+        removed = [i for i in ids if i in chunks]
+        if not removed:
+            return
+        self._reserve(0, self._vectors.shape[1])
+        self._state_version += 1
+        for chunk_id in removed:
+            pos = chunks.position(chunk_id)
+            self.postings.remove(chunk_id, chunks.metadata(pos))
+            if self._bm25 is not None:
+                self._bm25.remove(chunk_id)
+            elif self._bm25_journal is not None:
+                self._bm25_journal.append(("remove", chunk_id, ""))
+            last = len(chunks) - 1
+            chunks.remove(chunk_id)
+            if pos != last:
+                self._vectors[pos] = self._vectors[last]
+        if not len(chunks):
+            self._set_state(None, ChunkStore(), None, bm25=self._stage_keyword_index(ChunkStore()))
+        elif self.index is not None and not ann_index.supports_remove(self.index):
+            # HNSW 不支持删除：在写锁内重建整张图会让检索停顿，被删 id 先作为墓碑留在图中，由 _compact_graph 重建
+            self._tombstones += len(removed)
+        elif self.index is not None:
+            self.index.remove_ids(np.array(ids, dtype="int64"))
 
-    def rebuild_index(self, files: List[Dict[str, Any]]) -> int:
+    def rebuild_index(
+        self, files: List[Dict[str, Any]], progress: ProgressFn = _no_progress, source_head: Optional[str] = None
+    ) -> int:
         """
-        全量重建索引。
+        全量重建索引：在旁路的暂存结构中完成嵌入与索引训练，再在写锁内一次性替换，
+        重建期间检索继续使用旧的 (index, chunks)。嵌入失败或被取消时抛出异常，索引保持不变。
         :param files: [{"path": str, "content": str}]
+        :param progress: 进度回调
+        :param source_head: files 对应的笔记仓库提交，记入快照 manifest；有 chunk 被嵌入接口跳过时照常记录，
+            这些文件记入重试列表（retry_paths），由之后的增量同步重新嵌入
         :return: 索引的 chunk 数
         """
-        self.entries = []
-        return self._upsert_chunks(files)
+        with self._writing():
+            try:
+                texts, metas, results = self._chunk_and_embed(files, progress)
+            except JobCancelled:
+                raise
+            except Exception as exc:
+                self.logger.error("embedding/rebuild failed: %s", exc, exc_info=True)
+                raise
+            texts, metas, embeddings, skipped = self._drop_unembedded(texts, metas, results)
 
-    def upsert_files(self, files: List[Dict[str, Any]]) -> int:
+            entries = [
+                {"id": self._next_id + i, "text": text, "metadata": meta}
+                for i, (text, meta) in enumerate(zip(texts, metas))
+            ]
+            staged_index: Optional[faiss.Index] = None
+            staged_vectors: Optional[np.ndarray] = None
+            if entries:
+                staged_vectors = self._normalize(embeddings)
+                staged_index = self._build_ann(staged_vectors, [e["id"] for e in entries])
+                staged_vectors = staged_vectors.astype(self.vector_dtype, copy=False)
+            postings = MetadataPostings.from_entries(entries)
+            # 维护关键词检索时一并暂存 BM25 索引，避免替换后的第一次查询承担构建耗时
+            bm25 = BM25Index.from_entries(entries) if self.keyword_index else None
+            chunks = ChunkStore(entries)
+            # 全量重建不依赖旧状态，发布前其他进程的写入直接被替换（重试列表按发布时的记录计算）
+            with self._publishing():
+                retry_paths = self._next_retry_paths(skipped)
+                with self._lock.write_locked():
+                    self._set_state(staged_index, chunks, staged_vectors, postings, bm25)
+                self._save_index(source_head, retry_paths)
+            return len(chunks)
+
+    def upsert_files(
+        self, files: List[Dict[str, Any]], progress: ProgressFn = _no_progress, source_head: Optional[str] = None
+    ) -> int:
         """
-        增量更新指定文件。
+        增量更新指定文件：按确定性的 chunk 标识与已索引的 chunk 对比，只嵌入新增或内容变化的 chunk，
+        内容未变的 chunk 保留原向量，不再存在的 chunk 移除。嵌入失败或被取消时抛出异常，索引保持不变。
+        :param source_head: 更新后索引内容对应的笔记仓库提交，与增量一同落盘；有 chunk 被嵌入接口跳过时照常记录，
+            这些文件记入重试列表，成功嵌入的文件移出重试列表
+        :return: 这些文件当前索引的 chunk 数
         """
-        target_paths = {f.get("path") for f in files}
-        self.entries = [e for e in self.entries if e.get("metadata", {}).get("file_path") not in target_paths]
-        return self._upsert_chunks(files)
+        with self._writing():
+            return self._upsert_chunks(files, progress, source_head)
+
+    @property
+    def source_head(self) -> Optional[str]:
+        """当前索引内容对应的笔记仓库提交（最近一次同步到的 HEAD），未知时为 None。"""
+        return self.store.source_head
+
+    @property
+    def retry_paths(self) -> Dict[str, int]:
+        """有 chunk 被嵌入接口跳过的文件（相对 note_root）-> 已失败次数，包括已超过重试上限、不再重试的文件。"""
+        return dict(self.store.retry_paths)
 
-    def _upsert_chunks(self, files: List[Dict[str, Any]]) -> int:
+    def pending_retries(self) -> List[str]:
+        """下一次同步需要重新嵌入的文件：已失败次数未超过 retry_limit 的重试列表项。"""
+        return sorted(path for path, attempts in self.store.retry_paths.items() if attempts <= self.retry_limit)
+
+    def _next_retry_paths(self, skipped: Iterable[str], processed: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        写入后的重试列表：本次处理的文件先移出，其中有 chunk 被跳过的文件失败次数加一后重新记入。
+        :param skipped: 本次有 chunk 被跳过的文件
+        :param processed: 本次重新分块的文件，None 表示全量重建（重试列表只保留本次被跳过的文件）
+        """
+        previous = self.store.retry_paths
+        retry = {} if processed is None else {p: n for p, n in previous.items() if p not in set(processed)}
+        for path in sorted(set(skipped)):
+            retry[path] = previous.get(path, 0) + 1
+            if retry[path] == self.retry_limit + 1:
+                self.logger.error(
+                    "giving up on %s after %d attempts, its skipped chunks stay out of the index until the file changes",
+                    path, retry[path],
+                )
+        return retry
+
+    def _rel_path(self, path: str) -> str:
+        """文件相对 note_root 的路径，与 chunk 元数据中的 rel_path 一致。"""
+        abs_path = Path(path).resolve()
+        try:
+            return abs_path.relative_to(self.note_root).as_posix()
+        except ValueError:
+            return abs_path.name
+
+    def set_source_head(self, source_head: str) -> None:
+        """记录索引内容已对应到指定提交（同步中没有需要重新嵌入的文件时使用）。"""
+        with self._writing(), self._publishing():
+            self._persist_delta([], None, [], source_head)
+
+    def remove_files(self, rel_paths: List[str]) -> int:
+        """
+        移除指定文件（相对 note_root 的路径）的全部 chunk。
+        :return: 移除的 chunk 数
+        """
+        targets = set(rel_paths)
+        if not targets:
+            return 0
+        with self._writing(), self._publishing():
+            stale_ids = self.chunks.ids[self.chunks.positions_for_files(targets, key="rel_path")].tolist()
+            if stale_ids:
+                with self._lock.write_locked():
+                    self._remove_ids(stale_ids)
+                self._compact_graph()
+            retry_paths = {p: n for p, n in self.store.retry_paths.items() if p not in targets}
+            self._persist_delta([], None, stale_ids, retry_paths=retry_paths)
+            return len(stale_ids)
+
+    def _collect_chunks(
+        self, files: List[Dict[str, Any]], progress: ProgressFn = _no_progress
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """对文件分块，返回非空 chunk 的文本与元数据。"""
         texts: List[str] = []
         metas: List[Dict[str, Any]] = []
-        for f in files:
-            path = f.get("path")
-            content = f.get("content", "")
-            chunks = self._chunk_markdown(path, content)
-            for chunk in chunks:
-                text = chunk.get("text", "")
-                if not text or not text.strip():
-                    continue
-                texts.append(text)
-                metas.append(chunk["metadata"])
-
-        if not texts:
-            self._rebuild_faiss()
-            return 0
+        for done, batch_texts, batch_metas in iter_chunk_batches(files, self.note_root, self.max_item_tokens):
+            texts.extend(batch_texts)
+            metas.extend(batch_metas)
+            progress("scan", done, len(files))
+        return texts, metas
 
-        try:
-            batch_size = 64  # bigmodel input 数组上限 64
-            total = 0
-            for start in range(0, len(texts), batch_size):
-                end = start + batch_size
-                batch_texts = texts[start:end]
-                batch_metas = metas[start:end]
-                embeddings = self.embedding_fn(batch_texts)
-                if embeddings is None:
-                    raise ValueError("embedding_fn returned None")
-                if len(embeddings) != len(batch_texts):
-                    raise ValueError(f"embedding size mismatch: got {len(embeddings)} for {len(batch_texts)} inputs")
-                for text, meta, emb in zip(batch_texts, batch_metas, embeddings):
-                    self.entries.append(
-                        {
-                            "text": text,
-                            "metadata": meta,
-                            "embedding": emb,
-                        }
+    def _chunk_and_embed(
+        self, files: List[Dict[str, Any]], progress: ProgressFn = _no_progress
+    ) -> Tuple[List[str], List[Dict[str, Any]], List[Optional[List[float]]]]:
+        """
+        全量重建的分块 + 嵌入流水线：分块结果逐批送入嵌入调度器，分块（CPU）与嵌入请求（网络）重叠进行。
+        文件数达到 chunk_pool_min_files 时在进程池中分块。缓存与重复文本的处理同 _embed_texts。
+        :return: (texts, metas, embeddings)，无法嵌入的位置为 None
+        """
+        workers = self.chunk_workers if len(files) >= self.chunk_pool_min_files else 1
+        texts: List[str] = []
+        metas: List[Dict[str, Any]] = []
+        results: List[Optional[List[float]]] = []
+        # 已提交嵌入、尚未返回的文本 -> 下标；已返回的文本 -> 向量（后续文件中的重复文本直接复用）
+        pending: Dict[str, List[int]] = {}
+        resolved: Dict[str, List[float]] = {}
+        counts = {"done": 0, "cached": 0, "requests": 0}
+
+        def misses() -> Iterator[str]:
+            for files_done, batch_texts, batch_metas in iter_chunk_batches(
+                files, self.note_root, self.max_item_tokens, workers
+            ):
+                start = len(texts)
+                texts.extend(batch_texts)
+                metas.extend(batch_metas)
+                if self.embedding_cache is not None:
+                    cached: List[Optional[List[float]]] = self.embedding_cache.get_many(batch_texts)
+                else:
+                    cached = [None] * len(batch_texts)
+                results.extend(cached)
+                for i, (text, emb) in enumerate(zip(batch_texts, cached), start=start):
+                    if emb is not None:
+                        counts["done"] += 1
+                        counts["cached"] += 1
+                    elif text in resolved:
+                        results[i] = resolved[text]
+                        counts["done"] += 1
+                    elif text in pending:
+                        pending[text].append(i)
+                    else:
+                        pending[text] = [i]
+                        yield text
+                progress("scan", files_done, len(files))
+
+        batches = iter_batches(misses(), self.batch_max_items, self.batch_max_tokens)
+        for batch_texts, embeddings in self.embedding_dispatcher.run(batches):
+            if embeddings is None:
+                raise ValueError("embedding_fn returned None")
+            if len(embeddings) != len(batch_texts):
+                raise ValueError(f"embedding size mismatch: got {len(embeddings)} for {len(batch_texts)} inputs")
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(batch_texts, embeddings)
+            for text, emb in zip(batch_texts, embeddings):
+                resolved[text] = emb
+                for i in pending.pop(text):
+                    results[i] = emb
+                    counts["done"] += 1
+            counts["requests"] += 1
+            progress("embed", counts["done"], len(texts))
+
+        progress("embed", counts["done"], len(texts))
+        if resolved:
+            self.logger.info(
+                "chunked %d files into %d chunks (%d workers), embedded %d texts in %d requests, %d served from cache",
+                len(files), len(texts), workers, len(resolved), counts["requests"], counts["cached"],
+            )
+        return texts, metas, results
+
+    def _upsert_chunks(
+        self,
+        files: List[Dict[str, Any]],
+        progress: ProgressFn = _no_progress,
+        source_head: Optional[str] = None,
+    ) -> int:
+        """
+        对比新旧 chunk 后增量替换，嵌入失败或被取消时抛出异常、索引保持不变。调用方需持有 _write_mutex、不持有文件锁。
+        - 标识、文本与元数据都相同：保持不动
+        - 标识与文本相同但元数据变化（如 frontmatter 的 tags、chunk 序号）：复用旧向量重新入库，不调用嵌入
+        - 其余新 chunk 嵌入后加入，旧 chunk 中未被保留的移除
+        嵌入在文件锁外完成；发布时发现其他进程已更新索引，则基于新状态重新对比，只为新出现的文本补嵌入。
+        """
+        texts, metas = self._collect_chunks(files, progress)
+        kept_ids, reused, fresh_texts, fresh_metas, stale_ids = self._diff_chunks(files, texts, metas)
+        embedded: Dict[str, Optional[List[float]]] = {}
+        self._embed_missing(embedded, fresh_texts, progress)
+
+        with self._publishing() as changed:
+            if changed:
+                kept_ids, reused, fresh_texts, fresh_metas, stale_ids = self._diff_chunks(files, texts, metas)
+                self._embed_missing(embedded, fresh_texts, progress)
+            fresh_texts, fresh_metas, embeddings, skipped = self._drop_unembedded(
+                fresh_texts, fresh_metas, [embedded[text] for text in fresh_texts]
+            )
+            fresh_vectors: Optional[np.ndarray] = None
+            if fresh_texts:
+                fresh_vectors = self._normalize(embeddings)
+                if self.index is not None and fresh_vectors.shape[1] != self.index.d:
+                    raise ValueError(
+                        f"embedding dimension changed ({self.index.d} -> {fresh_vectors.shape[1]}), full rebuild required"
                     )
-                total += len(batch_texts)
-            self._rebuild_faiss()
-            return total
-        except Exception as exc:  # noqa: BLE001
+
+            # 持有 _write_mutex 期间没有其他写者，直接从缓冲区拷贝旧向量
+            vector_parts: List[np.ndarray] = []
+            if reused:
+                vector_parts.append(self._vectors[[self.chunks.position(old_id) for _, _, old_id in reused]].copy())
+            if fresh_vectors is not None:
+                vector_parts.append(fresh_vectors)
+            added = [(text, meta) for text, meta, _ in reused] + list(zip(fresh_texts, fresh_metas))
+            new_entries = [
+                {"id": self._next_id + i, "text": text, "metadata": meta} for i, (text, meta) in enumerate(added)
+            ]
+            vectors = np.concatenate(vector_parts) if vector_parts else None
+            with self._lock.write_locked():
+                self._remove_ids(stale_ids)
+                self._next_id += len(new_entries)
+                if vectors is not None:
+                    self._add_entries(new_entries, vectors)
+            self._compact_graph()
+            retry_paths = self._next_retry_paths(skipped, [self._rel_path(f["path"]) for f in files])
+            self._persist_delta(new_entries, vectors, stale_ids, source_head, retry_paths)
+        self.logger.info(
+            "upsert %d files: %d chunks unchanged, %d metadata-only, %d embedded, %d removed",
+            len(files), len(kept_ids), len(reused), len(fresh_texts), len(stale_ids) - len(reused),
+        )
+        return len(kept_ids) + len(new_entries)
+
+    def _diff_chunks(
+        self, files: List[Dict[str, Any]], texts: List[str], metas: List[Dict[str, Any]]
+    ) -> Tuple[Set[int], List[Tuple[str, Dict[str, Any], int]], List[str], List[Dict[str, Any]], List[int]]:
+        """
+        按确定性的 chunk 标识将文件新分出的 chunk 与当前已索引的 chunk 对比。调用方需持有 _write_mutex。
+        :return: (保持不动的 chunk id, 复用旧向量的 [(text, meta, 旧 chunk id)], 需要嵌入的文本, 对应元数据, 要移除的旧 chunk id)
+        """
+        positions = self.chunks.positions_for_files(f.get("path") for f in files)
+        old_entries = [self.chunks.entry(pos) for pos in positions.tolist()]
+        old_by_key = {e["metadata"].get("chunk_id"): e for e in old_entries}
+        kept_ids: Set[int] = set()
+        reused: List[Tuple[str, Dict[str, Any], int]] = []
+        fresh_texts: List[str] = []
+        fresh_metas: List[Dict[str, Any]] = []
+        for text, meta in zip(texts, metas):
+            old = old_by_key.get(meta["chunk_id"])
+            if old is not None and old["text"] == text and old["id"] not in kept_ids:
+                if old["metadata"] == meta:
+                    kept_ids.add(old["id"])
+                else:
+                    reused.append((text, meta, old["id"]))
+                continue
+            fresh_texts.append(text)
+            fresh_metas.append(meta)
+        stale_ids = [e["id"] for e in old_entries if e["id"] not in kept_ids]
+        return kept_ids, reused, fresh_texts, fresh_metas, stale_ids
+
+    def _embed_missing(
+        self, embedded: Dict[str, Optional[List[float]]], texts: List[str], progress: ProgressFn = _no_progress
+    ) -> None:
+        """为 embedded 中还没有的文本计算 embedding 并写入 embedded（无法嵌入的为 None）。"""
+        missing = [text for text in dict.fromkeys(texts) if text not in embedded]
+        if not missing:
+            return
+        try:
+            embedded.update(zip(missing, self._embed_texts(missing, progress)))
+        except JobCancelled:
+            raise
+        except Exception as exc:
             self.logger.error("embedding/upsert failed: %s", exc, exc_info=True)
-            return 0
+            raise
+
+    def _drop_unembedded(
+        self,
+        texts: List[str],
+        metas: List[Dict[str, Any]],
+        embeddings: List[Optional[List[float]]],
+    ) -> Tuple[List[str], List[Dict[str, Any]], List[List[float]], List[str]]:
+        """
+        剔除嵌入接口跳过（返回 None）的 chunk，其余 chunk 照常入库。
+        :return: (texts, metas, embeddings, 有 chunk 被跳过的文件)
+        """
+        kept = [i for i, emb in enumerate(embeddings) if emb is not None]
+        skipped = sorted({metas[i].get("rel_path") for i in range(len(texts)) if embeddings[i] is None})
+        if skipped:
+            self.logger.warning("skipped %d chunks without embedding in: %s", len(texts) - len(kept), skipped)
+        return [texts[i] for i in kept], [metas[i] for i in kept], [embeddings[i] for i in kept], skipped
+
+    def _embed_texts(self, texts: List[str], progress: ProgressFn = _no_progress) -> List[Optional[List[float]]]:
+        """
+        计算文本 embedding：先查缓存，仅对未命中的文本（去重后）调用嵌入接口，并回写缓存。
+        无法嵌入的文本对应位置为 None。每个批次完成后上报 "embed" 进度（缓存命中计为已完成）。
+        """
+        if self.embedding_cache is not None:
+            results: List[Optional[List[float]]] = self.embedding_cache.get_many(texts)
+        else:
+            results = [None] * len(texts)
+
+        pending: Dict[str, List[int]] = {}
+        for i, (text, emb) in enumerate(zip(texts, results)):
+            if emb is None:
+                pending.setdefault(text, []).append(i)
+        miss_texts = list(pending)
+        done = len(texts) - sum(len(idxs) for idxs in pending.values())
+        progress("embed", done, len(texts))
+
+        batches = pack_batches(miss_texts, self.batch_max_items, self.batch_max_tokens)
+        for batch_texts, embeddings in self.embedding_dispatcher.run(batches):
+            if embeddings is None:
+                raise ValueError("embedding_fn returned None")
+            if len(embeddings) != len(batch_texts):
+                raise ValueError(f"embedding size mismatch: got {len(embeddings)} for {len(batch_texts)} inputs")
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(batch_texts, embeddings)
+            for text, emb in zip(batch_texts, embeddings):
+                for i in pending[text]:
+                    results[i] = emb
+                done += len(pending[text])
+            progress("embed", done, len(texts))
+
+        if miss_texts:
+            cached = len(texts) - sum(len(idxs) for idxs in pending.values())
+            self.logger.info(
+                "embedded %d texts in %d requests, %d served from cache", len(miss_texts), len(batches), cached
+            )
+        return results
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def embedding_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """返回嵌入缓存的命中统计，未启用缓存时返回 None。"""
+        return self.embedding_cache.stats() if self.embedding_cache is not None else None
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        mode: str = SEARCH_VECTOR,
+    ) -> List[Dict[str, Any]]:
+        """
+        语义检索。
+        :param nprobe: IVF 类索引探测的聚类数，默认使用配置值
+        :param ef_search: HNSW 搜索宽度，默认使用配置值
+        :param filters: 按标签 / 路径前缀 / 状态限定检索范围，返回满足条件的 top_k
+        :param mode: "vector"（FAISS）、"keyword"（BM25）或 "hybrid"（两路结果按倒数排名融合）
+        """
         if not query:
             return []
-        if self.index is None or not self.entries:
-            return []
+        return self.search_many(
+            [query], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filters=filters, mode=mode
+        )[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        mode: str = SEARCH_VECTOR,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量语义检索：所有查询按嵌入请求上限装批后一次性嵌入，再对查询矩阵执行单次 FAISS 检索
+        （由 FAISS 内部的 OpenMP 线程并行）。返回与 queries 一一对应的结果列表，
+        空查询或无法嵌入的查询对应空列表。
+        filters 对所有查询生效：候选集由倒排表求出，较小时精确打分，否则作为位图选择器在 ANN 扫描内过滤。
+        hybrid 模式下两路各取 hybrid_candidates 个候选再融合，score 为融合分数；查询嵌入失败时只用 BM25 结果。
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        self._ensure_watcher()
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if not len(self.chunks):
+            return results
+        positions = [i for i, q in enumerate(queries) if q and str(q).strip()]
+        if not positions:
+            return results
+        texts = [str(queries[i]) for i in positions]
+
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        if mode != SEARCH_KEYWORD:
+            try:
+                vectors = self._embed_queries(texts)
+            except Exception as exc:  # noqa: BLE001
+                if mode == SEARCH_VECTOR:
+                    self.logger.error("search failed: %s", exc)
+                    return results
+                self.logger.warning("query embedding failed, using keyword results only: %s", exc)
+        depth = top_k if mode == SEARCH_VECTOR else max(top_k, self.hybrid_candidates)
+        if mode != SEARCH_VECTOR:
+            self._ensure_keyword_index()
 
         try:
-            query_emb = self._normalize(self.embedding_fn([query]))
-            scores, idxs = self.index.search(query_emb, top_k)
-        except Exception:
-            return []
+            # 嵌入在锁外完成；检索与 id -> chunk 映射在同一读锁内，保证看到同一份快照
+            with self._lock.read_locked():
+                if not len(self.chunks):
+                    return results
+                if mode == SEARCH_VECTOR:
+                    hits = self._vector_hits(vectors, depth, nprobe, ef_search, filters)
+                elif mode == SEARCH_KEYWORD:
+                    hits = self._keyword_hits(texts, depth, filters)
+                else:
+                    vector_hits = self._vector_hits(vectors, depth, nprobe, ef_search, filters)
+                    keyword_hits = self._keyword_hits(texts, depth, filters)
+                    hits = [
+                        reciprocal_rank_fusion([vec, kw], self.rrf_k) for vec, kw in zip(vector_hits, keyword_hits)
+                    ]
+                for row, pos in enumerate(positions):
+                    results[pos] = self._hits_to_docs(hits[row][:top_k])
+        except Exception as exc:  # noqa: BLE001
+            self.logger.error("search failed: %s", exc)
+            return [[] for _ in queries]
+        return results
+
+    def _vector_hits(
+        self,
+        vectors: List[Optional[np.ndarray]],
+        top_k: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        filters: Optional[SearchFilters],
+    ) -> List[List[Tuple[int, float]]]:
+        """对已嵌入的查询执行单次 FAISS 检索，返回每个查询的 [(chunk_id, score)]。调用方需持有读锁。"""
+        hits: List[List[Tuple[int, float]]] = [[] for _ in vectors]
+        rows = [i for i, vec in enumerate(vectors) if vec is not None]
+        if not rows or self.index is None:
+            return hits
+        query_embs = np.stack([vectors[i] for i in rows])
+        rerank = self.rerank_factor > 1 and ann_index.is_lossy(self.index)
+        depth = top_k * self.rerank_factor if rerank else top_k
+        # 墓碑（HNSW 中已删除、尚未重建的 chunk）占用候选位，多取同样数量再剔除
+        tombstones = self._tombstones
+        depth += tombstones
+        if filters is not None and not filters.is_empty():
+            scores, idxs = self._search_filtered(query_embs, depth, filters, nprobe, ef_search)
+        else:
+            scores, idxs = ann_index.search(
+                self.index,
+                query_embs,
+                depth,
+                nprobe=nprobe or self.nprobe,
+                ef_search=ef_search or self.ef_search,
+            )
+        if rerank:
+            scores, idxs = ann_index.rerank(query_embs, idxs, self.chunks.positions(idxs), self._vectors, top_k)
+        chunks = self.chunks
+        for row, i in enumerate(rows):
+            hits[i] = [
+                (int(chunk_id), float(score))
+                for score, chunk_id in zip(scores[row], idxs[row])
+                if chunk_id >= 0 and (not tombstones or int(chunk_id) in chunks)
+            ][:top_k]
+        return hits
+
+    def _keyword_hits(
+        self, texts: List[str], top_k: int, filters: Optional[SearchFilters]
+    ) -> List[List[Tuple[int, float]]]:
+        """BM25 检索，返回每个查询的 [(chunk_id, score)]。调用方需持有读锁，并已在锁外调用 _ensure_keyword_index。"""
+        bm25 = self._bm25
+        if bm25 is None:
+            return [[] for _ in texts]
+        allowed = self._filter_candidates(filters)[0] if filters is not None and not filters.is_empty() else None
+        return [bm25.search(text, top_k, allowed) for text in texts]
+
+    def _stage_keyword_index(self, chunks: ChunkStore) -> Optional[BM25Index]:
+        """维护关键词检索时为 chunks 构建 BM25 索引（10 万 chunk 约 20 秒），否则返回 None。在读写锁外调用。"""
+        if not self.keyword_index:
+            return None
+        started = time.perf_counter()
+        bm25 = BM25Index.from_entries(chunks.iter_texts())
+        if len(chunks):
+            self.logger.info("built BM25 index over %d chunks in %.2fs", len(chunks), time.perf_counter() - started)
+        return bm25
 
+    def _ensure_keyword_index(self) -> None:
+        """
+        keyword_index 为 False 时第一次关键词 / 混合检索在这里开始维护 BM25 索引。在读写锁外调用，不持有 _write_mutex：
+        短暂持有写锁记下 chunk id 快照并开启变更日志，之后分批在读锁内读取文本（已被删除的 id 跳过），
+        在锁外构建，最后在写锁内重放期间的增删并替换。构建期间检索与同步都照常进行；
+        若期间 chunks 被整体替换（重新加载 / 重建），丢弃这次结果重新构建。
+        """
+        if self._bm25 is not None:
+            return
+        with self._bm25_build_lock:
+            while self._bm25 is None:
+                with self._lock.write_locked():
+                    if self._bm25 is not None:
+                        return
+                    self.keyword_index = True
+                    journal: List[Tuple[str, int, str]] = []
+                    self._bm25_journal = journal
+                    ids = self.chunks.ids.tolist()
+                started = time.perf_counter()
+                entries: List[Dict[str, Any]] = []
+                for start in range(0, len(ids), _BM25_READ_BATCH):
+                    with self._lock.read_locked():
+                        if self._bm25_journal is not journal:
+                            break
+                        chunks = self.chunks
+                        for chunk_id in ids[start:start + _BM25_READ_BATCH]:
+                            pos = chunks.position(chunk_id)
+                            if pos is not None:
+                                entries.append({"id": chunk_id, "text": chunks.text(pos)})
+                bm25 = BM25Index.from_entries(entries)
+                with self._lock.write_locked():
+                    if self._bm25_journal is not journal:
+                        continue
+                    for op, chunk_id, text in journal:
+                        if op == "add":
+                            bm25.add(chunk_id, text)
+                        else:
+                            bm25.remove(chunk_id)
+                    self._bm25 = bm25
+                    self._bm25_journal = None
+                self.logger.info(
+                    "built BM25 index over %d chunks in %.2fs (%d changes replayed)",
+                    len(bm25), time.perf_counter() - started, len(journal),
+                )
+
+    def warm_up(self) -> None:
+        """
+        维护关键词检索时（keyword_index 为 True，即 RAG_SEARCH_MODE 不是 vector）预先构建 BM25 索引，
+        避免第一次关键词 / 混合检索承担构建耗时；纯向量检索的部署不占用这部分内存与启动时间。
+        """
+        if self.keyword_index:
+            self._ensure_keyword_index()
+
+    def vector_stats(self) -> Dict[str, Any]:
+        """返回向量存储的量化方式、索引外向量的精度与占用字节数，以及只读模式下索引是否内存映射。"""
+        vectors = self.embeddings
+        return {
+            "read_only": self.read_only,
+            "version": self._loaded_version or None,
+            "index_mmap": self.store.index_mmapped,
+            "quantization": ann_index.quantization_of(self.index) if self.index is not None else self.quantization,
+            "vector_dtype": self.vector_dtype,
+            "vector_bytes": int(vectors.nbytes) if vectors is not None else 0,
+            "rerank": self.index is not None and self.rerank_factor > 1 and ann_index.is_lossy(self.index),
+        }
+
+    def chunk_stats(self) -> Dict[str, int]:
+        """返回 chunk 存储的 chunk 数、文件数与文本 / 行数组占用的字节数。"""
+        return self.chunks.stats()
+
+    def keyword_index_stats(self) -> Optional[Dict[str, int]]:
+        """返回 BM25 索引的 chunk / 词项 / 倒排条目数，尚未构建时返回 None。"""
+        bm25 = self._bm25
+        return bm25.stats() if bm25 is not None else None
+
+    def _search_filtered(
+        self,
+        query_embs: np.ndarray,
+        top_k: int,
+        filters: SearchFilters,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """在满足过滤条件的 chunk 中检索，返回 (scores, chunk ids)。调用方需持有读锁。"""
+        ids, positions, id_filter = self._filter_candidates(filters)
+        if not len(ids):
+            return np.empty((len(query_embs), 0), dtype="float32"), np.empty((len(query_embs), 0), dtype="int64")
+        if id_filter is not None:
+            return ann_index.search(
+                self.index,
+                query_embs,
+                top_k,
+                nprobe=nprobe or self.nprobe,
+                ef_search=ef_search or self.ef_search,
+                id_filter=id_filter,
+            )
+        # 候选集较小：直接与候选向量做内积，结果精确且不受 IVF 探测范围影响
+        sims = query_embs @ self._vectors[positions].T
+        k = min(top_k, len(ids))
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), ids[np.take_along_axis(top, order, axis=1)]
+
+    def _filter_candidates(
+        self, filters: SearchFilters
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[ann_index.IdFilter]]:
+        """
+        返回 (满足条件的 chunk id, 对应的向量行号, 位图选择器或 None)，按过滤条件缓存至下一次状态修改。
+        调用方需持有读锁，期间状态版本不变。
+        """
+        key = filters.key()
+        with self._filter_cache_lock:
+            cached = self._filter_cache.get(key)
+            if cached is not None and cached[0] == self._state_version:
+                self._filter_cache.move_to_end(key)
+                return cached[1], cached[2], cached[3]
+        ids = self.postings.select(filters)
+        positions = self.chunks.positions(ids)
+        id_filter = ann_index.IdFilter(self.index, ids) if len(ids) > self.filter_exact_max else None
+        with self._filter_cache_lock:
+            self._filter_cache[key] = (self._state_version, ids, positions, id_filter)
+            self._filter_cache.move_to_end(key)
+            while len(self._filter_cache) > _FILTER_CACHE_SIZE:
+                self._filter_cache.popitem(last=False)
+        return ids, positions, id_filter
+
+    def _embed_queries(self, queries: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        返回单位化后的查询向量：先查进程内缓存，未命中的查询（去重后）按批次上限嵌入并回写缓存。
+        无法嵌入的查询对应位置为 None。
+        """
+        vectors = self.query_cache.get_many(queries)
+        pending: Dict[str, List[int]] = {}
+        for i, (query, vec) in enumerate(zip(queries, vectors)):
+            if vec is None:
+                pending.setdefault(query, []).append(i)
+        if not pending:
+            return vectors
+
+        batches = pack_batches(list(pending), self.batch_max_items, self.batch_max_tokens)
+        for batch, embeddings in self.embedding_dispatcher.run(batches):
+            kept = [(query, emb) for query, emb in zip(batch, embeddings) if emb is not None]
+            if not kept:
+                continue
+            normalized = self._normalize([emb for _, emb in kept])
+            self.query_cache.put_many([query for query, _ in kept], normalized)
+            for (query, _), vec in zip(kept, normalized):
+                for i in pending[query]:
+                    vectors[i] = vec
+        return vectors
+
+    def query_cache_stats(self) -> Dict[str, Any]:
+        """返回查询向量缓存的命中统计。"""
+        return self.query_cache.stats()
+
+    def _hits_to_docs(self, hits: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """将一个查询的 [(chunk_id, score)] 转换为返回给调用方的文档列表。"""
         docs: List[Dict[str, Any]] = []
-        for score, idx in zip(scores[0], idxs[0]):
-            if idx < 0 or idx >= len(self.entries):
+        for chunk_id, score in hits:
+            pos = self.chunks.position(chunk_id)
+            if pos is None:
                 continue
-            entry = self.entries[idx]
-            meta = entry.get("metadata", {})
+            meta = self.chunks.metadata(pos)
             docs.append(
                 {
-                    "content": entry.get("text"),
-                    "file_path": meta.get("file_path"),
-                    "rel_path": meta.get("rel_path") or meta.get("file_path"),
-                    "title": meta.get("title"),
-                    "tags": meta.get("tags", []),
-                    "order": meta.get("order"),
-                    "chunk_count": meta.get("chunk_count"),
-                    "score": float(score),
+                    "content": self.chunks.text(pos),
+                    "file_path": meta["file_path"],
+                    "rel_path": meta["rel_path"] or meta["file_path"],
+                    "title": meta["title"],
+                    "tags": meta["tags"],
+                    "status": meta["status"],
+                    "order": meta["order"],
+                    "chunk_count": meta["chunk_count"],
+                    "score": score,
                 }
             )
         return docs
 
 
-# 全局索引器
-note_indexer = NoteIndexer(
-    persist_dir=settings.CHROMA_PERSIST_DIR,
-    embedding_provider=settings.EMBEDDING_PROVIDER,
-    embedding_model=settings.EMBEDDING_MODEL,
-    embedding_base_url=settings.EMBEDDING_BASE_URL,
-    embedding_api_key=settings.EMBEDDING_API_KEY,
-    note_root=settings.NOTE_LOCAL_PATH,
-)
+def _watch_version(ref: "weakref.ref[NoteIndexer]", interval: float) -> None:
+    """轮询线程：每隔 interval 秒检查一次发布计数；只持有弱引用，索引器被回收后退出。"""
+    while True:
+        time.sleep(interval)
+        indexer = ref()
+        if indexer is None:
+            return
+        try:
+            indexer.reload_if_changed()
+        except Exception as exc:  # noqa: BLE001
+            # 加载失败（如快照被写进程轮转删除）时保留旧状态，下一轮重试
+            indexer.logger.error("index reload failed, keeping previous state: %s", exc)
+        del indexer
+
+
+def _load_published(
+    store: VectorStore,
+) -> Tuple[str, Optional[Tuple[Optional[faiss.Index], ChunkStore, np.ndarray]]]:
+    """
+    读取当前发布的快照，返回 (读取前的发布计数, store.load() 的结果)。
+    先不持有文件锁读取（不改写任何文件，不等待正在发布的写进程）；需要修复（旧布局迁移、指针回退、增量尾部不完整）
+    或读取失败（如快照恰好被写进程轮转删除）时，再持有文件锁重新读取。
+    先读发布计数再加载，加载期间发布的新版本会在下一次轮询时被发现。
+    """
+    version = store.read_version()
+    try:
+        loaded = store.load(repair=False)
+        if not store.needs_repair:
+            return version, loaded
+    except ValueError as exc:
+        store.logger.info("index load without the writer lock failed, retrying under the lock: %s", exc)
+    with store.write_locked():
+        return store.read_version(), store.load()
+
+
+class _Preloaded(NamedTuple):
+    persist_dir: Path
+    read_only: bool
+    version: str
+    store: VectorStore
+    loaded: Optional[Tuple[Optional[faiss.Index], ChunkStore, np.ndarray]]
+    bm25: Optional[BM25Index]
+
+
+# fork worker 之前由主进程读取的快照，worker 中创建索引器时接管（只接管一次）
+_preloaded: Optional[_Preloaded] = None
+
+
+def preload_index(build_keyword_index: Optional[bool] = None) -> None:
+    """
+    在 fork worker 之前于主进程读取当前快照（可选构建 BM25），worker 创建全局索引器时直接接管，
+    索引、向量与倒排数组由写时复制在 worker 之间共享，不再各自加载。
+    只读取数据，不创建线程、数据库连接或 HTTP 客户端；期间把 OpenMP 线程数设为 1，
+    避免主进程启动 OpenMP 线程池后 fork 出的 worker 在第一次并行计算时死锁。
+    主进程可重复调用（如平滑重启前），之后 fork 的 worker 接管最新的一份。
+    :param build_keyword_index: 是否构建 BM25，默认与全局索引器一致（RAG_SEARCH_MODE 不是 vector 时构建）
+    """
+    global _preloaded
+    if build_keyword_index is None:
+        build_keyword_index = settings.RAG_SEARCH_MODE != SEARCH_VECTOR
+    persist_dir = Path(settings.CHROMA_PERSIST_DIR).resolve()
+    store = VectorStore(
+        persist_dir,
+        keep_snapshots=settings.INDEX_KEEP_SNAPSHOTS,
+        verify_checksums=settings.INDEX_VERIFY_CHECKSUMS,
+        read_only=settings.INDEX_READ_ONLY,
+    )
+    threads = faiss.omp_get_max_threads()
+    faiss.omp_set_num_threads(1)
+    try:
+        version, loaded = _load_published(store)
+    finally:
+        faiss.omp_set_num_threads(threads)
+    bm25 = BM25Index.from_entries(loaded[1].iter_texts()) if loaded is not None and build_keyword_index else None
+    _preloaded = _Preloaded(persist_dir, settings.INDEX_READ_ONLY, version, store, loaded, bm25)
+
+
+def _take_preloaded(persist_dir: Path, read_only: bool) -> Optional[_Preloaded]:
+    """取出主进程预加载的快照（目录与模式一致时），取出后清空。"""
+    global _preloaded
+    preloaded, _preloaded = _preloaded, None
+    if preloaded is None or preloaded.persist_dir != persist_dir or preloaded.read_only != read_only:
+        return None
+    return preloaded
+
+
+# 全局索引器：首次调用 get_note_indexer() 时才创建（加载快照、初始化嵌入客户端）
+_note_indexer: Optional[NoteIndexer] = None
+_note_indexer_lock = threading.Lock()
+
+
+def get_note_indexer() -> NoteIndexer:
+    """返回全局索引器，首次调用时按 settings 创建（线程安全）。"""
+    global _note_indexer
+    if _note_indexer is None:
+        with _note_indexer_lock:
+            if _note_indexer is None:
+                _note_indexer = NoteIndexer(
+                    persist_dir=settings.CHROMA_PERSIST_DIR,
+                    embedding_provider=settings.EMBEDDING_PROVIDER,
+                    embedding_model=settings.EMBEDDING_MODEL,
+                    embedding_base_url=settings.EMBEDDING_BASE_URL,
+                    embedding_api_key=settings.EMBEDDING_API_KEY,
+                    note_root=settings.NOTE_LOCAL_PATH,
+                    enable_embedding_cache=settings.EMBEDDING_CACHE_ENABLED,
+                    embedding_cache_max_items=settings.EMBEDDING_CACHE_MAX_ITEMS,
+                    index_type=settings.FAISS_INDEX_TYPE,
+                    ann_auto_threshold=settings.FAISS_AUTO_THRESHOLD,
+                    ann_build_params={
+                        "nlist": settings.FAISS_IVF_NLIST,
+                        "pq_m": settings.FAISS_PQ_M,
+                        "hnsw_m": settings.FAISS_HNSW_M,
+                    },
+                    nprobe=settings.FAISS_NPROBE,
+                    ef_search=settings.FAISS_EF_SEARCH,
+                    embedding_concurrency=settings.EMBEDDING_CONCURRENCY,
+                    embedding_rate_limit=settings.EMBEDDING_RATE_LIMIT,
+                    embedding_max_attempts=settings.EMBEDDING_MAX_ATTEMPTS,
+                    embedding_limits=settings.get_embedding_limits(settings.EMBEDDING_PROVIDER),
+                    query_cache_max_items=settings.QUERY_CACHE_MAX_ITEMS,
+                    query_cache_ttl=settings.QUERY_CACHE_TTL,
+                    keep_snapshots=settings.INDEX_KEEP_SNAPSHOTS,
+                    verify_snapshots=settings.INDEX_VERIFY_CHECKSUMS,
+                    filter_exact_max=settings.SEARCH_FILTER_EXACT_MAX,
+                    hybrid_candidates=settings.HYBRID_CANDIDATES,
+                    rrf_k=settings.RRF_K,
+                    chunk_workers=settings.CHUNK_WORKERS,
+                    chunk_pool_min_files=settings.CHUNK_POOL_MIN_FILES,
+                    quantization=settings.VECTOR_QUANTIZATION,
+                    rerank_factor=settings.RERANK_FACTOR,
+                    embedding_dimensions=settings.EMBEDDING_DIMENSIONS,
+                    read_only=settings.INDEX_READ_ONLY,
+                    reload_interval=settings.INDEX_RELOAD_INTERVAL,
+                    # 默认纯向量检索不随加载构建 BM25，第一次关键词 / 混合检索时再按需构建（不阻塞同步）
+                    keyword_index=settings.RAG_SEARCH_MODE != SEARCH_VECTOR,
+                    retry_limit=settings.SYNC_RETRY_LIMIT,
+                )
+    return _note_indexer
+
 
+def __getattr__(name: str) -> Any:
+    # 兼容旧的 `from app.api.services.indexer import note_indexer` 写法
+    if name == "note_indexer":
+        return get_note_indexer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
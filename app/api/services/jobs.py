@@ -0,0 +1,389 @@
+"""
+后台任务队列：同步 / 重建索引等耗时操作在后台线程执行，提供进度查询、取消与合并
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.file_lock import interprocess_lock
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+_FINISHED = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+# 多进程部署时运行中任务状态写入共享目录的最小间隔（秒）
+_PUBLISH_INTERVAL = 0.5
+# 只写入共享记录、不在接口中返回的字段
+_SHARED_ONLY = ("pid", "coalesce_key")
+
+
+class JobCancelled(Exception):
+    """任务被取消。由进度回调抛出，任务函数不应吞掉该异常。"""
+
+
+class Job:
+    """
+    单个后台任务。任务函数以 job 为参数，通过 job.report(stage, done, total) 上报进度；
+    report 同时是取消检查点，任务被取消后下一次调用会抛出 JobCancelled。
+    """
+
+    def __init__(self, kind: str, fn: Callable[["Job"], Any], coalesce_key: Optional[str] = None) -> None:
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.coalesce_key = coalesce_key
+        self.status = JOB_QUEUED
+        # 合并进该任务的触发次数（含首次）
+        self.triggers = 1
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stage = JOB_QUEUED
+        self.files_scanned = 0
+        self.files_total = 0
+        self.chunks_embedded = 0
+        self.chunks_total = 0
+        self._embed_started: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._cancel = threading.Event()
+        # 状态变化回调（JobManager 写入共享目录），force 为 True 时不节流
+        self.on_change: Optional[Callable[["Job", bool], None]] = None
+
+    def _changed(self, force: bool = False) -> None:
+        if self.on_change is not None:
+            self.on_change(self, force)
+
+    def report(self, stage: str, done: int = 0, total: int = 0) -> None:
+        """
+        上报进度并检查取消。
+        :param stage: "scan"（分块的文件数）、"embed"（已嵌入的 chunk 数）或其他阶段名
+        """
+        self.check_cancelled()
+        self.stage = stage
+        if stage == "scan":
+            self.files_scanned, self.files_total = done, total
+        elif stage == "embed":
+            if self._embed_started is None:
+                self._embed_started = time.monotonic()
+            self.chunks_embedded, self.chunks_total = done, total
+        self._changed()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def run(self) -> None:
+        if self._cancel.is_set():
+            self.status = JOB_CANCELLED
+            self.finished_at = time.time()
+            self.stage = self.status
+            self._changed(force=True)
+            return
+        self.status = JOB_RUNNING
+        self.started_at = time.time()
+        self._changed(force=True)
+        try:
+            self.result = self.fn(self)
+            self.status = JOB_SUCCEEDED
+        except JobCancelled:
+            self.status = JOB_CANCELLED
+        except Exception as exc:  # noqa: BLE001
+            logging.getLogger(__name__).error("job %s (%s) failed: %s", self.id, self.kind, exc, exc_info=True)
+            self.status = JOB_FAILED
+            self.error = str(exc)
+        finally:
+            self.finished_at = time.time()
+            self.stage = self.status
+            self._changed(force=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """返回任务状态；嵌入阶段按已完成速度估算吞吐（chunk/秒）与剩余时间（秒）。"""
+        throughput: Optional[float] = None
+        eta: Optional[float] = None
+        if self._embed_started is not None and self.chunks_embedded:
+            elapsed = max(time.monotonic() - self._embed_started, 1e-6)
+            throughput = self.chunks_embedded / elapsed
+            if self.status == JOB_RUNNING:
+                eta = max(self.chunks_total - self.chunks_embedded, 0) / throughput
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "triggers": self.triggers,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {
+                "stage": self.stage,
+                "files_scanned": self.files_scanned,
+                "files_total": self.files_total,
+                "chunks_embedded": self.chunks_embedded,
+                "chunks_total": self.chunks_total,
+                "throughput": throughput,
+                "eta_seconds": eta,
+            },
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class SharedJob:
+    """
+    其他 worker 进程中的任务：从共享目录读出的状态快照，接口与 Job 查询相关的部分一致。
+    共享记录比 Job.to_dict 多出 pid 与 coalesce_key（只用于协调，不在接口中返回）；
+    所属进程已退出而任务未结束时视为失败。
+    """
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self.data = data
+        self.id: str = data["id"]
+        self.created_at: float = data["created_at"]
+        self.status: str = data["status"]
+        if self.status not in _FINISHED and not _process_alive(int(data.get("pid") or 0)):
+            self.status = JOB_FAILED
+            data.update(status=JOB_FAILED, error="worker process exited before the job finished")
+            data["progress"]["stage"] = JOB_FAILED
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in self.data.items() if key not in _SHARED_ONLY}
+
+
+class JobManager:
+    """
+    以固定数量的后台线程按提交顺序执行任务。
+    - 相同 coalesce_key 的任务仍在排队时，新的提交合并进该任务（只累加 triggers），
+      因此连续触发多次同步最多只有一个在运行、一个在排队；多 worker 部署时也合并进其他 worker 排队中的任务
+      （提交时持有共享目录下的 submit.lock，查找与发布新任务之间不会插入其他 worker 的提交）
+    - 只保留最近 history 个已结束的任务
+    - 指定 shared_dir 时（多 worker 部署），任务状态写入该目录，任何 worker 都能查询、取消其他 worker 的任务；
+      取消请求以 <id>.cancel 标记文件传递，由所属 worker 在下一次上报进度时发现
+    """
+
+    def __init__(self, workers: int = 1, history: int = 100, shared_dir: Optional[Path] = None) -> None:
+        self.workers = max(1, workers)
+        self.history = history
+        self.shared_dir = Path(shared_dir) if shared_dir else None
+        if self.shared_dir is not None:
+            self.shared_dir.mkdir(parents=True, exist_ok=True)
+        self._published: Dict[str, float] = {}
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: "queue.Queue[Job]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, kind: str, fn: Callable[[Job], Any], coalesce_key: Optional[str] = None) -> Tuple[Any, bool]:
+        """
+        提交任务。
+        :return: (job, 是否合并进了已排队的任务)；合并进其他 worker 的任务时 job 为 SharedJob（triggers 不累加）
+        """
+        with self._submit_locked():
+            with self._lock:
+                if coalesce_key is not None:
+                    for job in self._jobs.values():
+                        if job.coalesce_key == coalesce_key and job.status == JOB_QUEUED and not job._cancel.is_set():
+                            job.triggers += 1
+                            return job, True
+            if coalesce_key is not None and self.shared_dir is not None:
+                shared = self._find_shared_queued(coalesce_key)
+                if shared is not None:
+                    return shared, True
+            with self._lock:
+                job = Job(kind, fn, coalesce_key)
+                if self.shared_dir is not None:
+                    job.on_change = self._publish
+                self._jobs[job.id] = job
+                self._prune()
+                self._ensure_workers()
+            # 持有 submit.lock 时发布，之后提交的 worker 一定能看到这个排队中的任务
+            job._changed(force=True)
+        self._queue.put(job)
+        return job, False
+
+    def _submit_locked(self) -> ContextManager[None]:
+        """多 worker 部署时串行化各进程的提交（共享目录下的 submit.lock），单进程时不加锁。"""
+        if self.shared_dir is None:
+            return nullcontext()
+        return interprocess_lock(self.shared_dir / "submit.lock")
+
+    def _find_shared_queued(self, coalesce_key: str) -> Optional[SharedJob]:
+        """在共享目录中查找其他 worker 排队中、未被取消且所属进程仍存活的同 key 任务。"""
+        with self._lock:
+            local = set(self._jobs)
+        for path in self.shared_dir.glob("*.json"):
+            if path.stem in local or (self.shared_dir / f"{path.stem}.cancel").exists():
+                continue
+            shared = self._read_shared(path)
+            if shared is not None and shared.status == JOB_QUEUED and shared.data.get("coalesce_key") == coalesce_key:
+                return shared
+        return None
+
+    def get(self, job_id: str) -> Optional[Any]:
+        """返回本进程的 Job，或共享目录中其他 worker 的 SharedJob，不存在时返回 None。"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self.shared_dir is None or not job_id.isalnum():
+            return job
+        return self._read_shared(self.shared_dir / f"{job_id}.json")
+
+    def list(self) -> List[Any]:
+        """最近的任务（多 worker 部署时包含其他 worker 的任务），从新到旧。"""
+        with self._lock:
+            jobs: List[Any] = list(reversed(self._jobs.values()))
+        if self.shared_dir is None:
+            return jobs
+        local = {job.id for job in jobs}
+        for path in self.shared_dir.glob("*.json"):
+            if path.stem not in local:
+                shared = self._read_shared(path)
+                if shared is not None:
+                    jobs.append(shared)
+        jobs.sort(key=lambda job: job.created_at, reverse=True)
+        return jobs[: self.history + self.workers * 2]
+
+    def cancel(self, job_id: str) -> Optional[Any]:
+        """
+        取消任务：排队中的任务不会再执行，运行中的任务在下一个进度检查点停止（已提交的索引变更不回滚，
+        同步任务只在全部写入后才记录新提交，下一次同步会补齐被取消的部分）。
+        其他 worker 的任务写入取消标记，由所属 worker 处理。
+        """
+        job = self.get(job_id)
+        if isinstance(job, Job):
+            if job.status not in _FINISHED:
+                job.cancel()
+                if self.shared_dir is not None:
+                    # 排队中的任务要等工作线程取出才变为 cancelled，标记让其他 worker 提交时不再合并进来
+                    (self.shared_dir / f"{job_id}.cancel").touch()
+        elif job is not None and job.status not in _FINISHED:
+            (self.shared_dir / f"{job_id}.cancel").touch()
+        return job
+
+    def shutdown(self, timeout: float) -> None:
+        """
+        进程退出前（如平滑重启）取消排队与运行中的任务，并最多等待 timeout 秒让运行中的任务在检查点停止；
+        任务的索引写入是原子的，停在任何位置索引都保持一致。
+        """
+        with self._lock:
+            pending = [job for job in self._jobs.values() if job.status not in _FINISHED]
+        for job in pending:
+            job.cancel()
+        deadline = time.monotonic() + timeout
+        while any(job.status == JOB_RUNNING for job in pending) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        for job in pending:
+            if job.status == JOB_QUEUED:
+                # 工作线程随进程退出，不会再取出这些任务
+                job.status = job.stage = JOB_CANCELLED
+                job.finished_at = time.time()
+                job._changed(force=True)
+
+    def _publish(self, job: Job, force: bool) -> None:
+        """将任务状态写入共享目录（运行中的进度按 _PUBLISH_INTERVAL 节流），并检查其他 worker 写入的取消标记。"""
+        now = time.monotonic()
+        if not force and now - self._published.get(job.id, 0.0) < _PUBLISH_INTERVAL:
+            return
+        self._published[job.id] = now
+        if job.status not in _FINISHED and (self.shared_dir / f"{job.id}.cancel").exists():
+            job.cancel()
+        path = self.shared_dir / f"{job.id}.json"
+        try:
+            record = dict(job.to_dict(), pid=os.getpid(), coalesce_key=job.coalesce_key)
+            data = json.dumps(record, ensure_ascii=False, default=str)
+        except (TypeError, ValueError) as exc:
+            logging.getLogger(__name__).warning("job %s state is not serializable: %s", job.id, exc)
+            return
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, path)
+        if job.status in _FINISHED:
+            self._published.pop(job.id, None)
+
+    @staticmethod
+    def _read_shared(path: Path) -> Optional[SharedJob]:
+        try:
+            return SharedJob(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in _FINISHED]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+            if self.shared_dir is not None:
+                for suffix in (".json", ".cancel"):
+                    (self.shared_dir / f"{job_id}{suffix}").unlink(missing_ok=True)
+
+    def _ensure_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                job.run()
+            finally:
+                self._queue.task_done()
+
+
+# 全局任务管理器：首次调用 get_job_manager() 时才创建；工作线程在首次提交任务时启动，
+# 因此在 fork 之前创建也不会把线程带进子进程
+_job_manager: Optional[JobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """返回全局任务管理器，首次调用时按 settings 创建（线程安全）。"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager(
+                    workers=settings.JOB_WORKERS,
+                    history=settings.JOB_HISTORY,
+                    shared_dir=Path(settings.JOB_STATE_DIR) if settings.JOB_STATE_DIR else None,
+                )
+    return _job_manager
+
+
+def shutdown_job_manager(timeout: float) -> None:
+    """进程退出前停止全局任务管理器中未结束的任务（未创建过则什么都不做）。"""
+    if _job_manager is not None:
+        _job_manager.shutdown(timeout)
+
+
+def _process_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 没有权限发送信号说明进程存在；Windows 上 os.kill 不支持 0 号信号，按存活处理
+        return True
+    return True
+
+
+def __getattr__(name: str) -> Any:
+    # 兼容旧的 `from app.api.services.jobs import job_manager` 写法
+    if name == "job_manager":
+        return get_job_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,8 +2,9 @@
 Markdown 读取与 Frontmatter 处理
 """
 
+from fnmatch import fnmatch
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import re
 import yaml
 
@@ -30,6 +31,50 @@ def read_markdown_files(root_dir: str, glob_pattern: str = "**/*.md") -> List[Di
     return files
 
 
+def match_note_glob(rel_path: str, glob_pattern: str = "**/*.md") -> bool:
+    """
+    判断相对路径是否命中笔记 glob，与 read_markdown_files 使用的 Path.glob 规则一致：
+    按路径分段匹配，"*"、"?" 等通配符不跨越 "/"，单独成段的 "**" 匹配零个或多个目录
+    """
+    parts = [p for p in rel_path.replace("\\", "/").split("/") if p and p != "."]
+    segments = [p for p in glob_pattern.replace("\\", "/").split("/") if p and p != "."]
+    return _match_segments(parts, segments)
+
+
+def _match_segments(parts: List[str], segments: List[str]) -> bool:
+    """逐段匹配路径与 glob；以 "**" 结尾的 glob 在 Path.glob 中只产出目录，不匹配文件。"""
+    if not segments:
+        return not parts
+    head, rest = segments[0], segments[1:]
+    if head == "**":
+        return bool(rest) and any(_match_segments(parts[i:], rest) for i in range(len(parts)))
+    return bool(parts) and fnmatch(parts[0], head) and _match_segments(parts[1:], rest)
+
+
+def read_markdown_files_by_paths(root_dir: str, rel_paths: Iterable[str]) -> List[Dict]:
+    """
+    按相对路径读取指定的 Markdown 文件，跳过不存在或越界的路径
+    返回: [{"path": str, "content": str}]，path 形式与 read_markdown_files 一致
+    """
+    root = Path(root_dir)
+    base = root.resolve()
+    files = []
+    for rel_path in rel_paths:
+        md_path = root / rel_path
+        try:
+            md_path.resolve().relative_to(base)
+        except ValueError:
+            continue
+        if not md_path.is_file():
+            continue
+        try:
+            text = md_path.read_text(encoding="utf-8")
+            files.append({"path": str(md_path), "content": text})
+        except Exception:
+            continue
+    return files
+
+
 def parse_frontmatter(content: str) -> Tuple[Dict, str]:
     """
     提取 frontmatter 与正文
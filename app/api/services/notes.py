@@ -5,6 +5,7 @@
 
 import json
 import os
+import threading
 import uuid
 from datetime import datetime
 from typing import List, Dict, Optional
@@ -217,5 +218,23 @@ class Notes:
         return results[:top_k]
 
 
-# 创建全局笔记实例
-note = Notes()
\ No newline at end of file
+# 全局笔记实例：首次调用 get_notes() 时才创建（创建存储目录并加载 notes.json）
+_note: Optional[Notes] = None
+_note_lock = threading.Lock()
+
+
+def get_notes() -> Notes:
+    """返回全局笔记实例，首次调用时创建（线程安全）。"""
+    global _note
+    if _note is None:
+        with _note_lock:
+            if _note is None:
+                _note = Notes()
+    return _note
+
+
+def __getattr__(name: str):
+    # 兼容旧的 `from app.api.services.notes import note` 写法
+    if name == "note":
+        return get_notes()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -19,7 +19,6 @@ from app.config.settings import settings
 WIKI_RANDOM_ENDPOINT = "https://{lang}.wikipedia.org/api/rest_v1/page/random/summary"
 
 DATA_DIR = Path(__file__).resolve().parents[2] / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 STORE_PATH = DATA_DIR / "prompts.json"
 
 SYSTEM_PROMPT = (
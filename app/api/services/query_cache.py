@@ -0,0 +1,91 @@
+"""
+查询向量的进程内缓存（LRU + 可选 TTL）
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class QueryEmbeddingCache:
+    """
+    以 (provider, model, query) 为键缓存单位化后的查询向量。
+    - 超过 max_items 时淘汰最久未使用的条目，max_items <= 0 表示禁用缓存
+    - ttl_seconds > 0 时条目过期后视为未命中
+    """
+
+    def __init__(self, provider: str, model: str, max_items: int = 1024, ttl_seconds: float = 0.0) -> None:
+        self.provider = provider
+        self.model = model
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._items: "OrderedDict[Tuple[str, str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, query: str) -> Tuple[str, str, str]:
+        return self.provider, self.model, query
+
+    def get_many(self, queries: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """批量查询，未命中（或已过期）的位置返回 None。"""
+        now = time.monotonic()
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for query in queries:
+                key = self._key(query)
+                item = self._items.get(key)
+                if item is not None and self.ttl_seconds > 0 and now - item[0] > self.ttl_seconds:
+                    del self._items[key]
+                    self.expired += 1
+                    item = None
+                if item is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self._items.move_to_end(key)
+                self.hits += 1
+                results.append(item[1])
+        return results
+
+    def put_many(self, queries: Sequence[str], vectors: Sequence[np.ndarray]) -> None:
+        """写入单位化后的查询向量（只读副本），超出容量时淘汰最久未使用的条目。"""
+        if self.max_items <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for query, vec in zip(queries, vectors):
+                stored = np.array(vec, dtype="float32")
+                stored.setflags(write=False)
+                key = self._key(query)
+                self._items[key] = (now, stored)
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空缓存与计数。"""
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+            self.expired = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息。"""
+        lookups = self.hits + self.misses
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "size": len(self._items),
+            "max_items": self.max_items,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
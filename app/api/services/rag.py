@@ -5,27 +5,38 @@ RAG 检索与生成服务。
 from typing import Any, Dict, List, Optional
 
 from app.api.services.ai_providers import get_chat_client
-from app.api.services.indexer import note_indexer
-from app.api.services.notes import note
+from app.api.services.indexer import get_note_indexer
+from app.api.services.notes import get_notes
+from app.api.services.search_filters import SearchFilters
 from app.config.settings import settings
 
 DEFAULT_SYSTEM_PROMPT = "你是一个知识库助手，请基于提供的笔记内容回答问题，优先使用中文，并在回答末尾注明引用编号，例如 [1][2]。"
 
 
-def search_contexts(question: str, top_k: int) -> List[Dict[str, Any]]:
-    """执行优先向量、次级关键词的检索，返回标准化片段列表。"""
+def search_contexts(question: str, top_k: int, filters: Optional[SearchFilters] = None) -> List[Dict[str, Any]]:
+    """
+    检索笔记 chunk（默认纯向量检索，RAG_SEARCH_MODE=hybrid 时 FAISS 与 BM25 两路融合），无结果时回退到 JSON 笔记的关键词检索，
+    返回标准化片段列表；filters 同时作用于两种检索。
+    """
     import logging
     logger = logging.getLogger(__name__)
     
-    # 优先使用向量搜索
-    vector_results = note_indexer.search(query=question, top_k=top_k)
+    # 优先检索索引中的笔记 chunk
+    vector_results = get_note_indexer().search(
+        query=question, top_k=top_k, filters=filters, mode=settings.RAG_SEARCH_MODE
+    )
     logger.info(f"向量搜索返回 {len(vector_results)} 条结果")
     if vector_results:
         return vector_results
 
     # 如果向量搜索没有结果，使用关键词搜索
     logger.info("向量搜索无结果，尝试关键词搜索")
-    keyword_results = note.search_notes(query=question, top_k=top_k)
+    keyword_results = get_notes().search_notes(query=question, top_k=top_k)
+    if filters is not None:
+        keyword_results = [
+            item for item in keyword_results
+            if filters.matches({"tags": item.get("tags", []), "rel_path": item.get("source", ""), "status": item.get("status")})
+        ]
     logger.info(f"关键词搜索返回 {len(keyword_results)} 条结果")
     
     normalized: List[Dict[str, Any]] = []
@@ -71,12 +82,13 @@ def run_rag_pipeline(
     temperature: float = 0.3,
     max_tokens: int = 800,
     persona: Optional[str] = None,
+    filters: Optional[SearchFilters] = None,
 ) -> Dict[str, Any]:
     """执行 RAG 流程：检索上下文并生成带引用的回答。"""
     import logging
     logger = logging.getLogger(__name__)
     
-    contexts = search_contexts(question, top_k=top_k)
+    contexts = search_contexts(question, top_k=top_k, filters=filters)
     logger.info(f"检索到 {len(contexts)} 条笔记上下文")
     
     # 确保 contexts 是列表，即使为空
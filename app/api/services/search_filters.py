@@ -0,0 +1,172 @@
+"""
+检索元数据过滤：过滤条件解析与按标签 / 路径 / 状态建立的倒排表
+"""
+
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+FilterValue = Union[None, str, Iterable[str]]
+
+
+def _split_values(value: FilterValue) -> List[str]:
+    """接受单个字符串（可逗号分隔）或字符串列表，返回去空白后的非空取值。"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    values: List[str] = []
+    for item in value:
+        if not isinstance(item, str):
+            raise ValueError("过滤条件必须是字符串或字符串列表")
+        values.extend(part.strip() for part in item.split(",") if part.strip())
+    return values
+
+
+def normalize_path(path: str) -> str:
+    """统一为相对 note_root 的 posix 路径（去掉开头的 ./ 与 /）。"""
+    path = path.replace("\\", "/").strip()
+    while path.startswith("./"):
+        path = path[2:]
+    return path.lstrip("/")
+
+
+class SearchFilters:
+    """
+    检索过滤条件：不同字段之间为“且”，同一字段的多个取值为“或”。
+    - tags: chunk 所在笔记的 frontmatter tags 含其中任一标签
+    - path_prefixes: rel_path 以其中任一前缀开头（按字符串前缀匹配，限定目录时以 / 结尾）
+    - status: frontmatter status（不区分大小写），如 publish
+    """
+
+    def __init__(
+        self,
+        tags: Optional[Iterable[str]] = None,
+        path_prefixes: Optional[Iterable[str]] = None,
+        status: Optional[str] = None,
+    ) -> None:
+        self.tags: Tuple[str, ...] = tuple(sorted(set(tags or [])))
+        self.path_prefixes: Tuple[str, ...] = tuple(sorted({normalize_path(p) for p in path_prefixes or []} - {""}))
+        self.status: Optional[str] = status.strip().lower() if status and status.strip() else None
+
+    @classmethod
+    def parse(cls, tags: FilterValue = None, path_prefix: FilterValue = None, status: Any = None) -> Optional["SearchFilters"]:
+        """
+        从请求参数构造过滤条件，没有任何条件时返回 None。
+        :raises ValueError: 参数类型不合法
+        """
+        if status is not None and not isinstance(status, str):
+            raise ValueError("status 必须是字符串")
+        filters = cls(_split_values(tags), _split_values(path_prefix), status)
+        return None if filters.is_empty() else filters
+
+    def is_empty(self) -> bool:
+        return not (self.tags or self.path_prefixes or self.status)
+
+    def key(self) -> Tuple[Any, ...]:
+        """可哈希的缓存键。"""
+        return self.tags, self.path_prefixes, self.status
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """逐条判断元数据是否满足条件（用于不经过倒排表的结果，如关键词检索回退）。"""
+        if self.tags:
+            raw_tags = metadata.get("tags") or []
+            tags = {str(t).strip() for t in (raw_tags if isinstance(raw_tags, list) else [raw_tags])}
+            if not tags.intersection(self.tags):
+                return False
+        if self.path_prefixes:
+            rel_path = normalize_path(str(metadata.get("rel_path") or ""))
+            if not rel_path.startswith(self.path_prefixes):
+                return False
+        if self.status and str(metadata.get("status") or "").lower() != self.status:
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"tags": list(self.tags), "path_prefix": list(self.path_prefixes), "status": self.status}
+
+
+class MetadataPostings:
+    """
+    标签、rel_path、状态到 chunk id 集合的倒排表，与索引的 entries 同步维护（调用方持有写锁）。
+    路径前缀查询在有序的 rel_path 列表上二分定位，只合并落在前缀区间内的文件。
+    """
+
+    def __init__(self) -> None:
+        self._tags: Dict[str, Set[int]] = {}
+        self._paths: Dict[str, Set[int]] = {}
+        self._status: Dict[str, Set[int]] = {}
+        self._sorted_paths: Optional[List[str]] = None
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "MetadataPostings":
+        postings = cls()
+        for entry in entries:
+            postings.add(entry["id"], entry.get("metadata") or {})
+        return postings
+
+    @staticmethod
+    def _keys(metadata: Dict[str, Any]) -> Tuple[List[str], str, str]:
+        raw_tags = metadata.get("tags") or []
+        tags = [str(t).strip() for t in (raw_tags if isinstance(raw_tags, list) else [raw_tags]) if str(t).strip()]
+        rel_path = normalize_path(str(metadata.get("rel_path") or ""))
+        status = str(metadata.get("status") or "").lower()
+        return tags, rel_path, status
+
+    def add(self, chunk_id: int, metadata: Dict[str, Any]) -> None:
+        tags, rel_path, status = self._keys(metadata)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(chunk_id)
+        if rel_path not in self._paths:
+            self._sorted_paths = None
+        self._paths.setdefault(rel_path, set()).add(chunk_id)
+        if status:
+            self._status.setdefault(status, set()).add(chunk_id)
+
+    def remove(self, chunk_id: int, metadata: Dict[str, Any]) -> None:
+        tags, rel_path, status = self._keys(metadata)
+        for tag in tags:
+            self._discard(self._tags, tag, chunk_id)
+        if self._discard(self._paths, rel_path, chunk_id):
+            self._sorted_paths = None
+        if status:
+            self._discard(self._status, status, chunk_id)
+
+    @staticmethod
+    def _discard(postings: Dict[str, Set[int]], key: str, chunk_id: int) -> bool:
+        """移除 id，集合变空时删除键；返回是否删除了键。"""
+        ids = postings.get(key)
+        if ids is None:
+            return False
+        ids.discard(chunk_id)
+        if not ids:
+            del postings[key]
+            return True
+        return False
+
+    def _ids_under_prefix(self, prefix: str) -> Set[int]:
+        if self._sorted_paths is None:
+            self._sorted_paths = sorted(self._paths)
+        ids: Set[int] = set()
+        paths = self._sorted_paths
+        for i in range(bisect_left(paths, prefix), len(paths)):
+            if not paths[i].startswith(prefix):
+                break
+            ids |= self._paths[paths[i]]
+        return ids
+
+    def select(self, filters: SearchFilters) -> np.ndarray:
+        """返回满足过滤条件的 chunk id（升序 int64 数组）。"""
+        groups: List[Set[int]] = []
+        if filters.tags:
+            groups.append(set().union(*(self._tags.get(tag, set()) for tag in filters.tags)))
+        if filters.path_prefixes:
+            groups.append(set().union(*(self._ids_under_prefix(p) for p in filters.path_prefixes)))
+        if filters.status:
+            groups.append(self._status.get(filters.status, set()))
+        if not groups:
+            return np.empty(0, dtype="int64")
+        groups.sort(key=len)
+        selected = set(groups[0]).intersection(*groups[1:])
+        return np.array(sorted(selected), dtype="int64")
@@ -1,8 +1,9 @@
 import json
 from typing import List, Dict, Any, Callable, Optional, Union
-from app.api.services.notes import note
-from app.api.services.indexer import note_indexer
+from app.api.services.notes import get_notes
+from app.api.services.indexer import get_note_indexer
 from app.api.services.brainstorm import brainstorm_idea
+from app.config.settings import settings
 
 class ToolRegistry:
     def __init__(self):
@@ -57,9 +58,9 @@ def search_notes(query: str, top_k: int = 5, context: Optional[Dict[str, Any]] =
     从本地笔记中搜索相关内容。
     """
     try:
-        # 优先使用向量搜索
-        vec_results = note_indexer.search(query=query, top_k=top_k)
-        results = vec_results if vec_results else note.search_notes(query=query, top_k=top_k)
+        # 优先检索索引（默认向量检索，见 RAG_SEARCH_MODE）
+        vec_results = get_note_indexer().search(query=query, top_k=top_k, mode=settings.RAG_SEARCH_MODE)
+        results = vec_results if vec_results else get_notes().search_notes(query=query, top_k=top_k)
         
         if not results:
             return "未找到相关笔记。"
@@ -0,0 +1,700 @@
+"""
+向量索引的持久化存储
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from app.api.services import ann_index
+from app.api.services.chunk_store import ChunkStore
+from app.utils.file_lock import interprocess_lock
+
+# 增量日志记录头：op(1B) + chunk id(int64) + payload 长度(uint32) + crc32(uint32)
+_DELTA_HEADER = struct.Struct("<cqII")
+_OP_ADD = b"A"
+_OP_DELETE = b"D"
+# 索引内容对应的笔记仓库提交（payload 为提交哈希，chunk id 不用）
+_OP_SOURCE = b"S"
+# 待重试的文件（payload 为 {rel_path: 已失败次数} 的 JSON，整体替换上一条，chunk id 不用）
+_OP_RETRY = b"R"
+
+_INDEX_NAME = "faiss.index"
+_VECTORS_NAME = "faiss_vectors.npy"
+_META_NAME = "faiss_meta.sqlite"
+_TEXT_NAME = "chunk_text.bin"
+_DELTA_NAME = "faiss_delta.log"
+_MANIFEST_NAME = "manifest.json"
+_VERSION_NAME = "VERSION"
+_LOCK_NAME = "LOCK"
+# 写入 manifest 校验和的快照文件（增量日志逐条带 crc32，不计入）
+_SNAPSHOT_FILES = (_INDEX_NAME, _VECTORS_NAME, _META_NAME, _TEXT_NAME)
+_TMP_PREFIX = ".tmp-"
+
+
+class VectorStore:
+    """
+    索引目录布局：
+    - snapshots/<版本号>/：一份完整快照
+      - faiss.index：FAISS 索引（Flat/HNSW/IVF 等，检索结果中的 id 即 chunk id）
+      - faiss_vectors.npy：float32 向量矩阵（单位化后），加载时内存映射
+      - faiss_meta.sqlite：chunk id、文本位置（偏移 / 字节数 / 编码）与元数据，pos 与向量矩阵行一一对应
+      - chunk_text.bin：全部 chunk 文本按 pos 顺序紧密拼接，加载时内存映射，检索组装结果时才读取
+      - manifest.json：条数、维度、索引类型、嵌入模型、对应的笔记仓库提交（source_head）、
+        待重试的文件（retry_paths）与各文件的 sha256
+      - faiss_delta.log：该快照之后的增量 add/delete 记录、提交标记与重试列表，加载时重放，超过阈值时合并为新快照
+    - CURRENT：指向当前快照的指针文件
+    - VERSION：发布计数，每次写入快照、追加增量、回滚或清空后递增，其他进程据此发现索引变化
+    - LOCK：多个可写进程之间的写锁（write_locked），只在发布（写快照、追加增量、回滚、清空）与修复性加载
+      （迁移旧布局、回退时改指针、截断损坏的增量尾部）时持有；普通加载不持锁、不改写文件（load(repair=False)）
+    快照先写入临时目录，经 rename 发布后再原子替换指针，崩溃时只会留下未发布的临时目录；
+    保留最近 keep_snapshots 份快照，当前快照损坏时加载自动回退到上一份可用快照。
+    旧版平铺布局（根目录下的 faiss.index 等）与 faiss_meta.json 在首次加载时自动迁移；
+    文本仍保存在 SQLite 中的旧快照照常加载（文本读入内存），下一次保存快照时转为新布局。
+    只读模式（read_only）供多进程检索使用：不迁移、不清理、不改写任何文件，
+    没有增量日志时以 FAISS 内存映射方式打开索引，多个进程共享同一份页缓存。
+    """
+
+    def __init__(
+        self,
+        persist_dir: Path,
+        compact_min_records: int = 1000,
+        compact_ratio: float = 0.25,
+        keep_snapshots: int = 3,
+        verify_checksums: bool = True,
+        read_only: bool = False,
+    ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.persist_dir = Path(persist_dir)
+        self.snapshots_dir = self.persist_dir / "snapshots"
+        self.pointer_file = self.persist_dir / "CURRENT"
+        self.version_file = self.persist_dir / _VERSION_NAME
+        self.legacy_meta_file = self.persist_dir / "faiss_meta.json"
+        self.compact_min_records = compact_min_records
+        self.compact_ratio = compact_ratio
+        self.keep_snapshots = max(1, keep_snapshots)
+        self.verify_checksums = verify_checksums
+        self.read_only = read_only
+        # 当前加载或最近写入的快照目录，增量日志追加到该目录
+        self.current: Optional[Path] = None
+        # 当前增量日志中的记录数
+        self.delta_records = 0
+        # 当前加载的索引是否为内存映射（倒排表直接读取快照文件）
+        self.index_mmapped = False
+        # 索引内容对应的笔记仓库提交：快照 manifest 的 source_head，被增量日志中最后一条提交标记覆盖
+        self.source_head: Optional[str] = None
+        # 有 chunk 被嵌入接口跳过、下一次同步需要重新嵌入的文件 -> 已失败次数，规则同 source_head
+        self.retry_paths: Dict[str, int] = {}
+        # 最近一次不持锁的加载（repair=False）遇到了需要改写文件才能处理的情况，调用方应持锁重新加载
+        self.needs_repair = False
+
+    @property
+    def index_file(self) -> Optional[Path]:
+        return self.current / _INDEX_NAME if self.current else None
+
+    @property
+    def vectors_file(self) -> Optional[Path]:
+        return self.current / _VECTORS_NAME if self.current else None
+
+    @property
+    def meta_file(self) -> Optional[Path]:
+        return self.current / _META_NAME if self.current else None
+
+    @property
+    def text_file(self) -> Optional[Path]:
+        return self.current / _TEXT_NAME if self.current else None
+
+    @property
+    def delta_file(self) -> Optional[Path]:
+        return self.current / _DELTA_NAME if self.current else None
+
+    def exists(self) -> bool:
+        """是否存在已发布的快照。"""
+        return self._read_pointer() is not None
+
+    def _read_pointer(self) -> Optional[Path]:
+        if not self.pointer_file.exists():
+            return None
+        name = self.pointer_file.read_text(encoding="utf-8").strip()
+        snapshot = self.snapshots_dir / name
+        return snapshot if name and snapshot.is_dir() else None
+
+    def _write_pointer(self, name: str) -> None:
+        tmp = self.pointer_file.with_name(self.pointer_file.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            f.write(name + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.pointer_file)
+        _fsync_dir(self.persist_dir)
+
+    @contextmanager
+    def write_locked(self) -> Iterator[None]:
+        """持有进程间写锁（只读模式不加锁）；不可重入，调用方在进程内另用线程锁串行化。"""
+        if self.read_only:
+            yield
+            return
+        with interprocess_lock(self.persist_dir / _LOCK_NAME):
+            yield
+
+    def read_version(self) -> str:
+        """返回当前的发布计数（没有 VERSION 文件时为空串），只读进程轮询它判断是否需要重新加载。"""
+        try:
+            return self.version_file.read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return ""
+
+    def _bump_version(self) -> None:
+        """发布计数加一；只用于通知其他进程，不 fsync，崩溃后最多让读者漏掉一次或多做一次重新加载。"""
+        current = self.read_version()
+        tmp = self.version_file.with_name(self.version_file.name + ".tmp")
+        tmp.write_text(f"{int(current) + 1 if current.isdigit() else 1}\n", encoding="utf-8")
+        os.replace(tmp, self.version_file)
+
+    def _snapshot_dirs(self) -> List[Path]:
+        """已发布的快照目录，按版本从新到旧排列。"""
+        if not self.snapshots_dir.exists():
+            return []
+        dirs = [
+            d for d in self.snapshots_dir.iterdir()
+            if d.is_dir() and not d.name.startswith(_TMP_PREFIX) and (d / _MANIFEST_NAME).exists()
+        ]
+        return sorted(dirs, key=lambda d: d.name, reverse=True)
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """返回各快照的 manifest（从新到旧），并标记当前快照与增量日志记录数。"""
+        current = self._read_pointer()
+        snapshots: List[Dict[str, Any]] = []
+        for snapshot in self._snapshot_dirs():
+            try:
+                manifest = self._read_manifest(snapshot)
+            except (OSError, ValueError):
+                continue
+            manifest.pop("files", None)
+            delta = snapshot / _DELTA_NAME
+            manifest["delta_bytes"] = delta.stat().st_size if delta.exists() else 0
+            manifest["current"] = snapshot == current
+            snapshots.append(manifest)
+        return snapshots
+
+    def load(
+        self, mmap: bool = True, repair: bool = True
+    ) -> Optional[Tuple[Optional[faiss.Index], ChunkStore, np.ndarray]]:
+        """
+        读取当前快照并重放其增量日志，返回 (index, chunks, embeddings)，没有快照时返回 None。
+        当前快照缺失文件、校验和不符或无法读取时依次尝试更早的快照，并把指针改指向可用的那一份
+        （只读模式不改指针）；全部不可用时抛出 ValueError。
+        chunks 中的 chunk id 稳定，与 index 中的 id 一致。
+        索引类型不支持删除（HNSW）且日志中有删除时 index 返回 None，由调用方按配置重建。
+        :param mmap: 是否以只读内存映射方式打开向量矩阵（无增量时生效）
+        :param repair: 是否执行修复性写入（迁移旧布局、清理临时目录、回退时改指针、截断损坏的增量尾部），
+            调用方需持有 write_locked()。为 False 时与只读模式一样不改写任何文件，不等待正在嵌入的写进程；
+            遇到需要修复的情况时置 needs_repair（旧布局时返回 None），由调用方持锁重新加载
+        """
+        writable = repair and not self.read_only
+        self.needs_repair = False
+        if writable:
+            self._migrate_flat_layout()
+            self._remove_stale_tmp()
+        target = self._read_pointer()
+        self.current = None
+        self.delta_records = 0
+        self.index_mmapped = False
+        self.source_head = None
+        self.retry_paths = {}
+        if target is None:
+            self.needs_repair = not self.read_only and self._has_flat_layout()
+            return None
+
+        candidates = [target] + [d for d in self._snapshot_dirs() if d != target]
+        for snapshot in candidates:
+            try:
+                loaded = self._load_snapshot(snapshot, mmap, writable)
+            except Exception as exc:  # noqa: BLE001
+                self.logger.error("index snapshot %s is unusable: %s", snapshot.name, exc)
+                continue
+            if snapshot != target:
+                self.logger.warning("rolled back index from snapshot %s to %s", target.name, snapshot.name)
+                if writable:
+                    self._write_pointer(snapshot.name)
+                    self._bump_version()
+                elif not self.read_only:
+                    self.needs_repair = True
+            return loaded
+        self.current = None
+        raise ValueError(f"no usable index snapshot in {self.snapshots_dir}")
+
+    def _load_snapshot(
+        self, snapshot: Path, mmap: bool, writable: bool
+    ) -> Tuple[Optional[faiss.Index], ChunkStore, np.ndarray]:
+        manifest = self._read_manifest(snapshot)
+        self._verify_files(snapshot, manifest)
+
+        embeddings = np.load(str(snapshot / _VECTORS_NAME), mmap_mode="r" if mmap else None)
+        chunks = self._read_chunks(snapshot)
+        self.current = snapshot
+        self.source_head = manifest.get("source_head")
+        self.retry_paths = dict(manifest.get("retry_paths") or {})
+        added, removed = self._read_delta(embeddings.shape[1], writable)
+        # 重放增量要修改索引，只读映射的索引不能写入，有增量时照常读入进程内存；
+        # faiss 1.7.4 只能映射 IVF 类索引的倒排表，Flat / HNSW 即使传入标志也会读入内存。
+        # Flat 改为直接在内存映射的向量矩阵上打分（MappedFlatIndex），不读取 faiss.index；HNSW 仍是每个进程一份私有副本
+        mmap_index = self.read_only and not added and not removed
+        self.index_mmapped = False
+        if mmap_index and isinstance(embeddings, np.memmap) and manifest.get("index_type") == ann_index.INDEX_FLAT:
+            if not (len(chunks) == embeddings.shape[0] == manifest["count"]):
+                raise ValueError(
+                    f"index files out of sync: {len(chunks)} chunks, {embeddings.shape[0]} vectors, "
+                    f"manifest count {manifest['count']}"
+                )
+            self.index_mmapped = True
+            quantization = manifest.get("quantization") or ann_index.QUANT_NONE
+            return ann_index.MappedFlatIndex(embeddings, chunks.ids, quantization), chunks, embeddings
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap_index else 0
+        index = faiss.read_index(str(snapshot / _INDEX_NAME), flags)
+        if mmap_index and isinstance(index, faiss.IndexIVF):
+            invlists = faiss.downcast_InvertedLists(index.invlists)
+            if isinstance(invlists, faiss.OnDiskInvertedLists):
+                # 默认每次检索启动 32 个线程预读倒排表，页已在页缓存中时只增加开销（单次检索约慢 4 倍）
+                invlists.prefetch_nthread = 0
+                self.index_mmapped = True
+        if not (len(chunks) == embeddings.shape[0] == index.ntotal == manifest["count"]):
+            raise ValueError(
+                f"index files out of sync: {len(chunks)} chunks, {embeddings.shape[0]} vectors, "
+                f"{index.ntotal} indexed, manifest count {manifest['count']}"
+            )
+        if isinstance(index, faiss.IndexFlat):
+            # 早期版本保存的是裸 IndexFlatIP，按 chunk id 重新包装
+            index = ann_index.build_index(embeddings, chunks.ids)
+
+        if not added and not removed:
+            return index, chunks, embeddings
+
+        base_ids = set(chunks.ids.tolist())
+        stale_ids = [i for i in chunks.ids.tolist() if i in removed or i in added]
+        # 与 ChunkStore 的删除一致：末尾行移入空位
+        vectors = np.array(embeddings, dtype="float32")
+        for chunk_id in stale_ids:
+            pos = chunks.remove(chunk_id)
+            if pos != len(chunks):
+                vectors[pos] = vectors[len(chunks)]
+        parts = [vectors[: len(chunks)]]
+        if added:
+            chunks.extend(entry for entry, _ in added.values())
+            parts.append(np.stack([vec for _, vec in added.values()]))
+        embeddings = np.vstack(parts)
+
+        if stale_ids and not ann_index.supports_remove(index):
+            index = None
+        elif stale_ids:
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+        if index is not None and added:
+            index.add_with_ids(
+                np.stack([vec for _, vec in added.values()]),
+                np.array(list(added.keys()), dtype="int64"),
+            )
+        self.logger.info(
+            "replayed index delta: %d upserts, %d deletes on top of %d base chunks",
+            len(added), len(removed & base_ids), len(base_ids),
+        )
+        return index, chunks, embeddings
+
+    @staticmethod
+    def _read_manifest(snapshot: Path) -> Dict[str, Any]:
+        with (snapshot / _MANIFEST_NAME).open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _verify_files(self, snapshot: Path, manifest: Dict[str, Any]) -> None:
+        """校验快照文件的大小与（可选）sha256。"""
+        for name, info in manifest.get("files", {}).items():
+            path = snapshot / name
+            if not path.exists():
+                raise ValueError(f"missing {name}")
+            if path.stat().st_size != info["size"]:
+                raise ValueError(f"size mismatch for {name}")
+            if self.verify_checksums and _sha256(path) != info["sha256"]:
+                raise ValueError(f"checksum mismatch for {name}")
+
+    @staticmethod
+    def _read_chunks(snapshot: Path) -> ChunkStore:
+        """
+        读取 chunk 记录：文本在 chunk_text.bin 中的快照只读取位置，文本按需从内存映射读取；
+        文本在表中的旧快照整体读入内存，并兼容没有 id 列的旧表（以 pos 作为 id）。
+        """
+        conn = sqlite3.connect(str(snapshot / _META_NAME))
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)").fetchall()}
+            if "text_offset" in columns:
+                rows = conn.execute(
+                    "SELECT id, text_offset, text_bytes, text_codec, text_chars, metadata FROM chunks ORDER BY pos"
+                )
+                return ChunkStore.from_snapshot(
+                    snapshot / _TEXT_NAME,
+                    (
+                        (chunk_id, offset, size, codec, chars, json.loads(meta))
+                        for chunk_id, offset, size, codec, chars, meta in rows
+                    ),
+                )
+            id_column = "id" if "id" in columns else "pos"
+            rows = conn.execute(f"SELECT {id_column}, text, metadata FROM chunks ORDER BY pos")
+            return ChunkStore(
+                {"id": int(chunk_id), "text": text, "metadata": json.loads(meta)} for chunk_id, text, meta in rows
+            )
+        finally:
+            conn.close()
+
+    def save(
+        self,
+        index: faiss.Index,
+        chunks: ChunkStore,
+        embeddings: np.ndarray,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        写入新快照：在临时目录写完全部文件与 manifest 并 fsync，rename 发布后再原子替换指针，
+        最后清理超出保留数量的旧快照。新快照的增量日志为空。
+        文本按位置顺序写入 chunk_text.bin，调用方随后可用 chunks.attach_text(text_file) 改为映射该文件。
+        :param metadata: 额外写入 manifest 的信息（如嵌入 provider/model、source_head）
+        :return: 新快照的版本号
+        """
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        version = self._next_version()
+        tmp_dir = self.snapshots_dir / f"{_TMP_PREFIX}{version}"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir()
+
+        faiss.write_index(index, str(tmp_dir / _INDEX_NAME))
+        with (tmp_dir / _VECTORS_NAME).open("wb") as f:
+            # 保留向量精度（量化部署为 float16），加载时按当前配置转换
+            np.save(f, np.ascontiguousarray(embeddings))
+        with (tmp_dir / _TEXT_NAME).open("wb") as f:
+            chunks.write_texts(f)
+        self._write_meta(tmp_dir / _META_NAME, chunks)
+
+        manifest: Dict[str, Any] = {
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "count": len(chunks),
+            "dimension": int(index.d),
+            "index_type": ann_index.index_type_of(index),
+        }
+        manifest.update(metadata or {})
+        self._write_manifest(tmp_dir, manifest)
+
+        snapshot = self.snapshots_dir / version
+        os.replace(tmp_dir, snapshot)
+        _fsync_dir(self.snapshots_dir)
+        self._write_pointer(version)
+        self.current = snapshot
+        self.delta_records = 0
+        self.source_head = manifest.get("source_head")
+        self.retry_paths = dict(manifest.get("retry_paths") or {})
+        self._prune()
+        self._bump_version()
+        return version
+
+    def _next_version(self) -> str:
+        numbers = [int(d.name) for d in self._snapshot_dirs() if d.name.isdigit()]
+        return f"{max(numbers, default=0) + 1:06d}"
+
+    @staticmethod
+    def _write_meta(meta_file: Path, chunks: ChunkStore) -> None:
+        conn = sqlite3.connect(str(meta_file))
+        try:
+            conn.execute(
+                "CREATE TABLE chunks ("
+                "pos INTEGER PRIMARY KEY, id INTEGER NOT NULL UNIQUE, text_offset INTEGER NOT NULL, "
+                "text_bytes INTEGER NOT NULL, text_codec INTEGER NOT NULL, text_chars INTEGER NOT NULL, "
+                "metadata TEXT NOT NULL)"
+            )
+            conn.executemany(
+                "INSERT INTO chunks (pos, id, text_offset, text_bytes, text_codec, text_chars, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (pos, chunk_id, offset, size, codec, chars, json.dumps(meta, ensure_ascii=False, separators=(",", ":")))
+                    for pos, (chunk_id, offset, size, codec, chars, meta) in enumerate(chunks.iter_stored())
+                ),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _write_manifest(snapshot_dir: Path, manifest: Dict[str, Any]) -> None:
+        """计算快照文件的大小与 sha256 并写入 manifest，所有文件落盘后返回（旧布局迁移来的快照没有文本文件）。"""
+        files: Dict[str, Dict[str, Any]] = {}
+        for name in _SNAPSHOT_FILES:
+            path = snapshot_dir / name
+            if not path.exists():
+                continue
+            _fsync_file(path)
+            files[name] = {"size": path.stat().st_size, "sha256": _sha256(path)}
+        manifest["files"] = files
+        manifest_path = snapshot_dir / _MANIFEST_NAME
+        with manifest_path.open("w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_dir(snapshot_dir)
+
+    def _prune(self) -> None:
+        """删除超出保留数量的旧快照（当前快照始终保留）。"""
+        for snapshot in self._snapshot_dirs()[self.keep_snapshots:]:
+            if snapshot == self.current:
+                continue
+            try:
+                shutil.rmtree(snapshot)
+            except OSError as exc:
+                # Windows 下仍被内存映射的文件无法删除，留待下次清理
+                self.logger.warning("failed to remove old index snapshot %s: %s", snapshot.name, exc)
+
+    def _remove_stale_tmp(self) -> None:
+        """清理写入中途崩溃留下的临时快照目录。"""
+        if not self.snapshots_dir.exists():
+            return
+        for tmp_dir in self.snapshots_dir.glob(f"{_TMP_PREFIX}*"):
+            self.logger.info("removing unfinished index snapshot %s", tmp_dir.name)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def rollback(self, version: Optional[str] = None) -> str:
+        """
+        将指针切换到指定快照（默认为当前快照的上一份），调用方随后重新 load。
+        :return: 切换后的版本号
+        """
+        snapshots = self._snapshot_dirs()
+        current = self._read_pointer()
+        if version is None:
+            older = [d for d in snapshots if current is None or d.name < current.name]
+            if not older:
+                raise ValueError("no older index snapshot to roll back to")
+            target = older[0]
+        else:
+            target = self.snapshots_dir / version
+            if target not in snapshots:
+                raise ValueError(f"index snapshot {version} not found")
+        self._write_pointer(target.name)
+        self._bump_version()
+        self.logger.info("index pointer moved to snapshot %s", target.name)
+        return target.name
+
+    def append_delta(
+        self,
+        added: Sequence[Tuple[Dict[str, Any], np.ndarray]],
+        removed_ids: Sequence[int],
+        source_head: Optional[str] = None,
+        retry_paths: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """
+        追加增量记录：先写删除再写新增，然后是重试列表，最后写提交标记，重放时按顺序应用。
+        所有记录一次写入并 fsync，崩溃截断尾部时提交标记一定在它之前的记录之后丢失，不会超前于索引内容。
+        :param added: [(entry, 单位化向量)]，entry 需包含 "id"
+        :param removed_ids: 被删除的 chunk id
+        :param source_head: 写入后索引内容对应的笔记仓库提交，None 表示不变
+        :param retry_paths: 写入后待重试的文件 {rel_path: 已失败次数}，None 表示不变
+        """
+        records: List[bytes] = []
+        for chunk_id in removed_ids:
+            records.append(self._pack_record(_OP_DELETE, int(chunk_id), b""))
+        for entry, vec in added:
+            doc = json.dumps(
+                {"text": entry.get("text", ""), "metadata": entry.get("metadata", {})},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ).encode("utf-8")
+            payload = np.asarray(vec, dtype="float32").tobytes() + doc
+            records.append(self._pack_record(_OP_ADD, int(entry["id"]), payload))
+        if retry_paths is not None and retry_paths != self.retry_paths:
+            payload = json.dumps(retry_paths, ensure_ascii=False, sort_keys=True).encode("utf-8")
+            records.append(self._pack_record(_OP_RETRY, 0, payload))
+        if source_head is not None and source_head != self.source_head:
+            records.append(self._pack_record(_OP_SOURCE, 0, source_head.encode("utf-8")))
+        if not records:
+            return
+        if self.current is None:
+            raise ValueError("no index snapshot to append delta to")
+        with self.delta_file.open("ab") as f:
+            f.write(b"".join(records))
+            f.flush()
+            os.fsync(f.fileno())
+        self.delta_records += len(records)
+        if source_head is not None:
+            self.source_head = source_head
+        if retry_paths is not None:
+            self.retry_paths = dict(retry_paths)
+        self._bump_version()
+
+    def needs_compaction(self, total_entries: int) -> bool:
+        """增量日志是否已大到需要合并进基线。"""
+        return self.delta_records >= max(self.compact_min_records, int(total_entries * self.compact_ratio))
+
+    @staticmethod
+    def _pack_record(op: bytes, chunk_id: int, payload: bytes) -> bytes:
+        crc = zlib.crc32(op + struct.pack("<q", chunk_id) + payload)
+        return _DELTA_HEADER.pack(op, chunk_id, len(payload), crc) + payload
+
+    def _read_delta(self, dim: int, writable: bool) -> Tuple[Dict[int, Tuple[Dict[str, Any], np.ndarray]], set]:
+        """
+        读取增量日志，返回 (最终新增/替换的 {id: (entry, vec)}, 最终删除的 id 集合)。
+        遇到不完整或校验失败的尾部记录（写入中途崩溃）时截断到最后一条完整记录；
+        不持锁加载时尾部可能是写进程正在追加的记录，只跳过不截断（可写进程置 needs_repair，持锁后再判断）。
+        """
+        added: Dict[int, Tuple[Dict[str, Any], np.ndarray]] = {}
+        removed: set = set()
+        self.delta_records = 0
+        if self.delta_file is None or not self.delta_file.exists():
+            return added, removed
+
+        data = self.delta_file.read_bytes()
+        vec_bytes = dim * 4
+        offset = 0
+        while offset + _DELTA_HEADER.size <= len(data):
+            op, chunk_id, length, crc = _DELTA_HEADER.unpack_from(data, offset)
+            start = offset + _DELTA_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) != length or zlib.crc32(op + struct.pack("<q", chunk_id) + payload) != crc:
+                break
+            if op == _OP_ADD:
+                vec = np.frombuffer(payload[:vec_bytes], dtype="float32").copy()
+                doc = json.loads(payload[vec_bytes:].decode("utf-8"))
+                added[chunk_id] = ({"id": chunk_id, "text": doc["text"], "metadata": doc["metadata"]}, vec)
+                removed.discard(chunk_id)
+            elif op == _OP_DELETE:
+                added.pop(chunk_id, None)
+                removed.add(chunk_id)
+            elif op == _OP_SOURCE:
+                self.source_head = payload.decode("utf-8")
+            elif op == _OP_RETRY:
+                self.retry_paths = json.loads(payload.decode("utf-8"))
+            offset = start + length
+            self.delta_records += 1
+
+        if offset != len(data) and writable:
+            self.logger.warning("truncating corrupt index delta tail at byte %d of %d", offset, len(data))
+            with self.delta_file.open("r+b") as f:
+                f.truncate(offset)
+        elif offset != len(data) and not self.read_only:
+            self.needs_repair = True
+        return added, removed
+
+    def clear(self) -> None:
+        """
+        清空索引：移除指针，之后视为没有索引。已有快照保留（仍可通过 rollback 恢复），按保留数量逐步淘汰。
+        """
+        if self.pointer_file.exists():
+            self.pointer_file.unlink()
+        self.current = None
+        self.delta_records = 0
+        self.source_head = None
+        self.retry_paths = {}
+        self._bump_version()
+
+    def _has_flat_layout(self) -> bool:
+        """是否为尚未迁移的旧版平铺布局（没有指针，根目录下有 faiss.index）。"""
+        return not self.pointer_file.exists() and (self.persist_dir / _INDEX_NAME).exists()
+
+    def _migrate_flat_layout(self) -> None:
+        """
+        将旧版平铺布局迁移为第一份快照：faiss_meta.json 先转换为 .npy + SQLite，
+        根目录下的 faiss.index / faiss_vectors.npy / faiss_meta.sqlite / faiss_delta.log 移入快照目录。
+        """
+        if not self._has_flat_layout():
+            return
+        flat_index = self.persist_dir / _INDEX_NAME
+        if self.legacy_meta_file.exists() and not (self.persist_dir / _META_NAME).exists():
+            self.migrate_legacy()
+            return
+        # 平铺布局早于文本文件，文本在 SQLite 中
+        flat_files = [self.persist_dir / name for name in (_INDEX_NAME, _VECTORS_NAME, _META_NAME)]
+        if not all(path.exists() for path in flat_files):
+            return
+
+        self.logger.info("migrating flat index layout in %s to a snapshot", self.persist_dir)
+        index = faiss.read_index(str(flat_index))
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        version = self._next_version()
+        tmp_dir = self.snapshots_dir / f"{_TMP_PREFIX}{version}"
+        tmp_dir.mkdir()
+        for path in flat_files:
+            shutil.copy2(path, tmp_dir / path.name)
+        flat_delta = self.persist_dir / _DELTA_NAME
+        if flat_delta.exists():
+            shutil.copy2(flat_delta, tmp_dir / _DELTA_NAME)
+        self._write_manifest(
+            tmp_dir,
+            {
+                "version": version,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "count": int(index.ntotal),
+                "dimension": int(index.d),
+                "index_type": ann_index.index_type_of(index),
+                "migrated_from": "flat",
+            },
+        )
+        os.replace(tmp_dir, self.snapshots_dir / version)
+        _fsync_dir(self.snapshots_dir)
+        self._write_pointer(version)
+        self._bump_version()
+        # 指针发布后才删除旧文件，迁移中途崩溃时下次会重新迁移
+        for path in flat_files + [flat_delta]:
+            if path.exists():
+                path.unlink()
+
+    def migrate_legacy(self) -> None:
+        """
+        将旧版 faiss_meta.json（文本 + 元数据 + JSON 浮点向量）迁移为一份快照，完成后将 JSON 重命名为 .bak。
+        """
+        self.logger.info("migrating legacy index metadata %s", self.legacy_meta_file)
+        flat_index = self.persist_dir / _INDEX_NAME
+        with self.legacy_meta_file.open("r", encoding="utf-8") as f:
+            legacy: List[Dict[str, Any]] = json.load(f)
+        dim = faiss.read_index(str(flat_index)).d
+
+        entries = [
+            {"id": pos, "text": e.get("text", ""), "metadata": e.get("metadata", {})}
+            for pos, e in enumerate(legacy)
+        ]
+        if legacy:
+            embeddings = np.array([e["embedding"] for e in legacy], dtype="float32")
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+        else:
+            embeddings = np.zeros((0, dim), dtype="float32")
+        self.save(ann_index.build_index(embeddings, [e["id"] for e in entries]), ChunkStore(entries), embeddings)
+        os.replace(self.legacy_meta_file, self.legacy_meta_file.with_name(self.legacy_meta_file.name + ".bak"))
+        flat_index.unlink()
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _fsync_file(path: Path) -> None:
+    with path.open("rb") as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: Path) -> None:
+    """持久化目录项（rename / 新建文件），Windows 不支持对目录 fsync 时跳过。"""
+    if os.name == "nt":
+        return
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -2,9 +2,15 @@
 配置文件
 """
 
+import logging
 import os
 from typing import Dict
 
+logger = logging.getLogger(__name__)
+
+# 检索模式，与 app.api.services.indexer.SEARCH_MODES 一致
+_SEARCH_MODES = ('vector', 'keyword', 'hybrid')
+
 
 class Settings:
     """应用配置类"""
@@ -39,6 +45,15 @@ class Settings:
             }
         }
 
+        # 各提供商嵌入接口的请求上限：单次请求的条数与估算 token 总数、单条输入的 token 数
+        # 超过单条上限的 chunk 在分块时继续切分，批次按 token 预算装箱
+        self.EMBEDDING_LIMITS = {
+            'openai': {'max_batch_items': 2048, 'max_batch_tokens': 300000, 'max_item_tokens': 8191},
+            'qwen': {'max_batch_items': 10, 'max_batch_tokens': 81920, 'max_item_tokens': 8192},
+            'bigmodel': {'max_batch_items': 64, 'max_batch_tokens': 65536, 'max_item_tokens': 3072},
+            'default': {'max_batch_items': 64, 'max_batch_tokens': 65536, 'max_item_tokens': 2048},
+        }
+
         # 定义每个提供商的模型列表
         self.PROVIDER_MODELS = {
             'openai': [
@@ -71,6 +86,65 @@ class Settings:
         self.EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'embedding-3-pro')  # 使用 embedding-3-pro 模型
         self.EMBEDDING_BASE_URL = os.getenv('EMBEDDING_BASE_URL', os.getenv('BIGMODEL_BASE_URL', 'https://open.bigmodel.cn/api/paas/v4'))
         self.EMBEDDING_API_KEY = os.getenv('EMBEDDING_API_KEY') or self.UNIFIED_API_KEY
+        # 嵌入输出维度（如 embedding-3 / text-embedding-3 的 256、512、1024；0 为模型默认），修改后需全量重建索引
+        self.EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', 0))
+        # 嵌入缓存：按 hash(provider, model, text) 持久化到索引目录，超出上限按 LRU 淘汰（0 表示不限）
+        self.EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+        self.EMBEDDING_CACHE_MAX_ITEMS = int(os.getenv('EMBEDDING_CACHE_MAX_ITEMS', 200000))
+        # 嵌入请求并发：同时在途的批次数、每秒请求上限（0 为不限）、瞬时错误（429/5xx）最大尝试次数
+        self.EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', 4))
+        self.EMBEDDING_RATE_LIMIT = float(os.getenv('EMBEDDING_RATE_LIMIT', 0))
+        self.EMBEDDING_MAX_ATTEMPTS = int(os.getenv('EMBEDDING_MAX_ATTEMPTS', 4))
+        # 覆盖当前嵌入提供商的请求上限（0 表示使用 EMBEDDING_LIMITS 中的默认值）
+        self.EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv('EMBEDDING_BATCH_MAX_ITEMS', 0))
+        self.EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', 0))
+        self.EMBEDDING_MAX_ITEM_TOKENS = int(os.getenv('EMBEDDING_MAX_ITEM_TOKENS', 0))
+        # 查询向量缓存：进程内 LRU 条目上限（0 为禁用）与过期秒数（0 为不过期）
+        self.QUERY_CACHE_MAX_ITEMS = int(os.getenv('QUERY_CACHE_MAX_ITEMS', 1024))
+        self.QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 0))
+        # FAISS 索引类型：auto / flat / ivf_flat / hnsw / ivf_pq；auto 在 chunk 数超过阈值后切换到 ivf_flat
+        self.FAISS_INDEX_TYPE = os.getenv('FAISS_INDEX_TYPE', 'auto').lower()
+        self.FAISS_AUTO_THRESHOLD = int(os.getenv('FAISS_AUTO_THRESHOLD', 20000))
+        # 构建参数（0 表示按语料规模自动选择）
+        self.FAISS_IVF_NLIST = int(os.getenv('FAISS_IVF_NLIST', 0))
+        self.FAISS_PQ_M = int(os.getenv('FAISS_PQ_M', 0))
+        self.FAISS_HNSW_M = int(os.getenv('FAISS_HNSW_M', 32))
+        # 检索参数：IVF 探测的聚类数、HNSW 搜索宽度（可被 /api/search 的同名参数覆盖）
+        self.FAISS_NPROBE = int(os.getenv('FAISS_NPROBE', 16))
+        self.FAISS_EF_SEARCH = int(os.getenv('FAISS_EF_SEARCH', 64))
+        # 向量标量量化：none / fp16 / int8（FAISS 存储编码，索引外向量改存 float16）；
+        # 索引分数有损（int8、ivf_pq）时取 top_k * RERANK_FACTOR 个候选精确重排序（<= 1 为不重排）
+        self.VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'none').lower()
+        self.RERANK_FACTOR = int(os.getenv('RERANK_FACTOR', 4))
+        # 带过滤条件的检索：候选 chunk 数不超过该值时对候选向量精确打分，超过时在 ANN 扫描中按位图过滤
+        self.SEARCH_FILTER_EXACT_MAX = int(os.getenv('SEARCH_FILTER_EXACT_MAX', 4096))
+        # 混合检索（FAISS + BM25）：RAG / 聊天检索使用的模式、每路候选数、倒数排名融合常数。
+        # 默认 vector：结果的 score 是余弦相似度（界面显示为“相似度”）；hybrid 需显式开启，
+        # 此时 score 为倒数排名融合分数（约 0.01 ~ 0.03），只用于排序，不能与相似度阈值比较
+        self.RAG_SEARCH_MODE = os.getenv('RAG_SEARCH_MODE', 'vector').lower()
+        if self.RAG_SEARCH_MODE not in _SEARCH_MODES:
+            # 非法取值会让所有 RAG / 聊天检索抛出异常，启动时回退到纯向量检索
+            logger.warning("unknown RAG_SEARCH_MODE %r, falling back to vector", self.RAG_SEARCH_MODE)
+            self.RAG_SEARCH_MODE = 'vector'
+        self.HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 50))
+        self.RRF_K = int(os.getenv('RRF_K', 60))
+        # 全量重建的分块进程数（默认 CPU 核数，最多 4）与启用进程池的最少文件数
+        self.CHUNK_WORKERS = int(os.getenv('CHUNK_WORKERS', min(4, os.cpu_count() or 1)))
+        self.CHUNK_POOL_MIN_FILES = int(os.getenv('CHUNK_POOL_MIN_FILES', 200))
+        # 索引快照：保留的历史快照份数（用于回滚）、加载时是否校验 manifest 中的 sha256
+        self.INDEX_KEEP_SNAPSHOTS = int(os.getenv('INDEX_KEEP_SNAPSHOTS', 3))
+        self.INDEX_VERIFY_CHECKSUMS = os.getenv('INDEX_VERIFY_CHECKSUMS', 'true').lower() == 'true'
+        # 只读检索模式（多 worker 部署）：不执行同步 / 回滚，以内存映射方式共享快照，
+        # 每隔 INDEX_RELOAD_INTERVAL 秒检查写进程发布的新版本并重新加载（0 为不自动重新加载）。
+        # 共享范围：IVF 类映射倒排表，Flat 直接在映射的向量矩阵上打分；HNSW 图无法映射（faiss 1.7.4），
+        # 每个 worker 仍读入一份私有副本。存在增量日志时各类索引都读入进程内存
+        self.INDEX_READ_ONLY = os.getenv('INDEX_READ_ONLY', 'false').lower() == 'true'
+        self.INDEX_RELOAD_INTERVAL = float(os.getenv('INDEX_RELOAD_INTERVAL', 2))
+        # 后台任务：执行同步/重建的线程数、保留的已结束任务数
+        self.JOB_WORKERS = int(os.getenv('JOB_WORKERS', 1))
+        self.JOB_HISTORY = int(os.getenv('JOB_HISTORY', 100))
+        # 多 worker 部署时共享任务状态的目录（为空则只保存在进程内；python -m app.serve 多进程启动时默认为索引目录下的 jobs）
+        self.JOB_STATE_DIR = os.getenv('JOB_STATE_DIR', '')
         # 笔记仓库与索引配置
         self.NOTE_REPO_URL = os.getenv('NOTE_REPO_URL', '')
         self.NOTE_REPO_BRANCH = os.getenv('NOTE_REPO_BRANCH', 'main')
@@ -79,14 +153,42 @@ class Settings:
         self.NOTE_LOCAL_PATH = os.getenv('NOTE_LOCAL_PATH', os.path.join(project_root, 'notes'))
         self.CHROMA_PERSIST_DIR = self._select_chroma_dir(project_root)
         self.NOTE_FILE_GLOB = os.getenv('NOTE_FILE_GLOB', '**/*.md')
+        # 有 chunk 被嵌入接口跳过的笔记在之后的同步中最多重试的次数（超过后直到笔记再次修改前不再重试）
+        self.SYNC_RETRY_LIMIT = int(os.getenv('SYNC_RETRY_LIMIT', 3))
         # 控制前端列表是否只展示 frontmatter 中 status: publish 的笔记（默认展示全部，索引始终包含全部笔记）
         self.NOTE_ONLY_PUBLISHED = os.getenv('NOTE_ONLY_PUBLISHED', 'false').lower() == 'true'
 
+        # 启动时是否预先创建全局服务（默认在首次请求时按需创建，缩短启动时间）
+        self.WARM_UP_SERVICES = os.getenv('WARM_UP_SERVICES', 'false').lower() == 'true'
+
         self.SERVER_PORT = int(os.getenv('SERVER_PORT', 8008))
         self.SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+        # 生产启动器（python -m app.serve）：worker 进程数、每个进程的线程数（流式连接各占一个线程）、
+        # 请求超时与平滑重启时等待旧 worker 处理完请求的秒数、是否在 fork 前预加载应用与索引
+        self.SERVE_WORKERS = int(os.getenv('SERVE_WORKERS', min(4, os.cpu_count() or 1)))
+        self.SERVE_THREADS = int(os.getenv('SERVE_THREADS', 16))
+        self.SERVE_TIMEOUT = int(os.getenv('SERVE_TIMEOUT', 300))
+        self.SERVE_GRACEFUL_TIMEOUT = int(os.getenv('SERVE_GRACEFUL_TIMEOUT', 30))
+        self.SERVE_PRELOAD = os.getenv('SERVE_PRELOAD', 'true').lower() == 'true'
         # Wikipedia 调用所需的 User-Agent，避免 403
         self.WIKI_USER_AGENT = os.getenv('WIKI_USER_AGENT', 'flask-app-prompt/1.0 (contact: dev@example.com)')
 
+    def get_embedding_limits(self, provider: str) -> Dict[str, int]:
+        """
+        返回嵌入提供商的请求上限，环境变量中的非零值覆盖默认配置。
+
+        :param provider: 嵌入提供商名称
+        :return: 包含 max_batch_items / max_batch_tokens / max_item_tokens 的字典
+        """
+        limits = dict(self.EMBEDDING_LIMITS.get(provider, self.EMBEDDING_LIMITS['default']))
+        overrides = {
+            'max_batch_items': self.EMBEDDING_BATCH_MAX_ITEMS,
+            'max_batch_tokens': self.EMBEDDING_BATCH_MAX_TOKENS,
+            'max_item_tokens': self.EMBEDDING_MAX_ITEM_TOKENS,
+        }
+        limits.update({name: value for name, value in overrides.items() if value > 0})
+        return limits
+
     def _select_chroma_dir(self, project_root: str) -> str:
         """
         选择 Chroma 持久化目录，若默认路径包含非 ASCII 字符且在 Windows 上，
@@ -0,0 +1,141 @@
+"""
+生产启动器：python -m app.serve
+
+基于 gunicorn 的多进程、多线程（gthread）服务，替代 main.py 中的单进程开发服务器：
+- worker 进程数与每个进程的线程数可配置，流式接口（/stream_generate 等）的每个连接占用一个线程
+- fork 之前在主进程创建应用、导入重依赖并读取索引快照（SERVE_PRELOAD），worker 以写时复制共享
+- 每个 worker fork 之后执行预热钩子（warm_up_services：接管预加载的快照、创建服务，开启混合检索时构建 BM25）
+- kill -HUP <主进程 pid> 平滑重启：主进程重新读取最新快照，启动新 worker 后再让旧 worker 处理完请求退出
+Windows 没有 gunicorn（依赖 fork），回退到 Werkzeug 多线程服务器。
+"""
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from flask import Flask
+
+from app import create_app, warm_up_services
+from app.config.settings import settings
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # Windows
+    BaseApplication = None  # type: ignore[assignment,misc]
+
+logger = logging.getLogger(__name__)
+
+
+def _preload() -> None:
+    """主进程在 fork 之前导入重依赖并读取索引快照。"""
+    import faiss  # noqa: F401
+    import langchain_text_splitters  # noqa: F401
+    import openai  # noqa: F401
+
+    from app.api.services.indexer import preload_index
+
+    try:
+        preload_index()
+    except Exception as exc:  # noqa: BLE001
+        # 快照损坏等情况交给 worker 按原逻辑加载 / 报错，不阻止服务启动
+        logger.error("index preload failed, workers will load the index themselves: %s", exc, exc_info=True)
+
+
+def _on_reload(server: Any) -> None:
+    """平滑重启（HUP）：新 worker fork 之前重新读取快照，接管最新发布的版本。"""
+    if settings.SERVE_PRELOAD:
+        _preload()
+
+
+def _post_fork(server: Any, worker: Any) -> None:
+    """worker fork 之后执行预热：接管预加载的快照、创建全局服务与后台线程（开启混合检索时构建 BM25）。"""
+    warm_up_services()
+
+
+def _worker_exit(server: Any, worker: Any) -> None:
+    """worker 退出前取消本进程的后台任务，并等待运行中的任务在检查点停止。"""
+    from app.api.services.jobs import shutdown_job_manager
+
+    shutdown_job_manager(timeout=max(1.0, settings.SERVE_GRACEFUL_TIMEOUT - 1))
+
+
+if BaseApplication is not None:
+
+    class _Application(BaseApplication):
+        """以代码方式配置的 gunicorn 应用（不读取命令行与配置文件）。"""
+
+        def __init__(self, app: Flask, options: Dict[str, Any]) -> None:
+            self.application = app
+            self.options = options
+            super().__init__()
+
+        def load_config(self) -> None:
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Flask:
+            return self.application
+
+
+def serve(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    workers: Optional[int] = None,
+    threads: Optional[int] = None,
+    preload: Optional[bool] = None,
+) -> None:
+    """
+    启动生产服务，未指定的参数使用 settings（SERVER_HOST / SERVER_PORT / SERVE_*）。
+    多个 worker 时后台任务状态写入共享目录（JOB_STATE_DIR，默认索引目录下的 jobs），任何 worker 都能查询进度。
+    """
+    host = host or settings.SERVER_HOST
+    port = port or settings.SERVER_PORT
+    workers = max(1, workers or settings.SERVE_WORKERS)
+    threads = max(1, threads or settings.SERVE_THREADS)
+    preload = settings.SERVE_PRELOAD if preload is None else preload
+    settings.SERVE_PRELOAD = preload
+    if workers > 1 and not settings.JOB_STATE_DIR:
+        settings.JOB_STATE_DIR = str(Path(settings.CHROMA_PERSIST_DIR).resolve() / "jobs")
+
+    app = create_app()
+    if BaseApplication is None:
+        from werkzeug.serving import run_simple
+
+        logger.warning("gunicorn is not available on this platform, falling back to the threaded Werkzeug server")
+        warm_up_services()
+        run_simple(host, port, app, threaded=True)
+        return
+
+    if preload:
+        _preload()
+    _Application(app, {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "timeout": settings.SERVE_TIMEOUT,
+        "graceful_timeout": settings.SERVE_GRACEFUL_TIMEOUT,
+        "keepalive": 5,
+        "preload_app": preload,
+        "on_reload": _on_reload,
+        "post_fork": _post_fork,
+        "worker_exit": _worker_exit,
+    }).run()
+
+
+def main() -> None:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="KingStudy 生产启动器（gunicorn 多进程 + 多线程）")
+    parser.add_argument("--host", help="监听地址（默认 SERVER_HOST）")
+    parser.add_argument("--port", type=int, help="监听端口（默认 SERVER_PORT）")
+    parser.add_argument("--workers", type=int, help="worker 进程数（默认 SERVE_WORKERS）")
+    parser.add_argument("--threads", type=int, help="每个 worker 的线程数（默认 SERVE_THREADS）")
+    parser.add_argument("--no-preload", action="store_true", help="不在 fork 之前预加载应用与索引")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+    serve(args.host, args.port, args.workers, args.threads, preload=False if args.no_preload else None)
+
+
+if __name__ == "__main__":
+    main()
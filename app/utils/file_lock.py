@@ -0,0 +1,31 @@
+"""
+进程间文件锁
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+
+@contextmanager
+def interprocess_lock(path: Path) -> Iterator[None]:
+    """
+    以独占方式持有 path 上的 flock，多个 worker 进程之间互斥；锁随文件描述符释放，进程崩溃时自动解除。
+    不可重入：flock 按打开的文件描述符计，同一进程内嵌套获取同一个文件会自锁，进程内需另用线程锁串行化。
+    Windows 没有 fcntl 时不加锁（单进程部署）。
+    """
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
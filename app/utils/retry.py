@@ -0,0 +1,75 @@
+"""
+重试工具：指数退避 + 全抖动
+"""
+
+import logging
+import random
+import sys
+import time
+from typing import Callable, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+def error_status_code(exc: BaseException) -> Optional[int]:
+    """提取 httpx / openai 异常中的 HTTP 状态码。"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """429、5xx 与连接/超时类错误视为可重试的瞬时错误。"""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    # 只有 openai 已被导入时异常才可能来自它，避免为类型判断提前导入 SDK
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(exc, openai.APIConnectionError):
+        return True
+    status = error_status_code(exc)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _retry_after_seconds(exc: BaseException) -> float:
+    """读取 Retry-After 响应头（秒），没有则返回 0。"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def backoff_delay(attempt: int, base_delay: float = 0.5, max_delay: float = 30.0) -> float:
+    """第 attempt 次（从 0 开始）重试前的等待时间：[0, min(max_delay, base * 2^attempt)] 内均匀抖动。"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_with_backoff(
+    fn: Callable[[], T],
+    max_attempts: int = 4,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+    is_retryable: Callable[[BaseException], bool] = is_retryable_error,
+) -> T:
+    """
+    调用 fn，遇到可重试错误时按指数退避（全抖动）重试，最多尝试 max_attempts 次。
+    不可重试的错误与最后一次失败直接抛出。
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as exc:  # noqa: BLE001
+            attempt += 1
+            if attempt >= max_attempts or not is_retryable(exc):
+                raise
+            delay = min(max_delay, max(backoff_delay(attempt - 1, base_delay, max_delay), _retry_after_seconds(exc)))
+            logger.warning("transient error (attempt %d/%d), retrying in %.2fs: %s", attempt, max_attempts, delay, exc)
+            time.sleep(delay)
@@ -0,0 +1,55 @@
+"""
+文本 token 数估算与按 token 上限切分
+"""
+
+import re
+from typing import List
+
+# CJK 统一表意文字、假名与全角标点：主流 BPE 分词下约 1 字 1 token
+_CJK_RE = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+# 其余字符（英文、代码、空白）平均约 4 个字符 1 token
+_CHARS_PER_TOKEN = 4
+
+
+def _char_cost(ch: str) -> float:
+    return 1.0 if _CJK_RE.match(ch) else 1.0 / _CHARS_PER_TOKEN
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数（偏保守的上界近似，不依赖具体分词器）。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    将文本切分为估算 token 数均不超过 max_tokens 的若干段，不丢弃任何字符。
+    优先在窗口内最后一个换行或空白处断开，找不到时硬切。
+    """
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces: List[str] = []
+    start = 0
+    while start < len(text):
+        cost = 0.0
+        end = start
+        while end < len(text) and cost + _char_cost(text[end]) <= max_tokens:
+            cost += _char_cost(text[end])
+            end += 1
+        if end >= len(text):
+            pieces.append(text[start:])
+            break
+        end = max(end, start + 1)
+        cut = max(text.rfind("\n", start, end), text.rfind(" ", start, end))
+        # 断点过于靠前时宁可硬切，避免产生大量碎片
+        if cut > start + (end - start) // 2:
+            end = cut + 1
+        pieces.append(text[start:end])
+        start = end
+    return [p for p in pieces if p.strip()] or [text]
@@ -0,0 +1,3 @@
+"""
+性能基准脚本（python -m benchmarks.<name> 运行）
+"""
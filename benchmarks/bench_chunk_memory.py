@@ -0,0 +1,152 @@
+"""
+chunk 存储内存基准：对比旧的 entries（每个 chunk 一个嵌套 dict，另有 chunk id -> 下标的 dict）与列式 ChunkStore
+在加载快照后的常驻内存（tracemalloc 统计，不含两者相同的向量矩阵），以及组装检索结果、按长度抽样的耗时。
+数据为合成的中英混排 chunk，元数据结构与分块结果相同，模拟从快照 SQLite 读出的行。
+
+用法：python -m benchmarks.bench_chunk_memory --chunks 100000
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from app.api.services.chunk_store import ChunkStore  # noqa: E402
+from app.api.services.chunking import chunk_key  # noqa: E402
+from benchmarks.bench_keyword_search import _random_chunk, _ZipfWords  # noqa: E402
+
+_TAGS = ["project", "reading", "idea", "todo", "faiss", "python", "日记", "论文", "产品", "工作"]
+
+
+def _rows(rng: random.Random, chunks: int, chunks_per_file: int) -> List[Tuple[int, bytes, str]]:
+    """快照 SQLite 中的行：(chunk id, UTF-8 文本, 元数据 JSON)。"""
+    vocab = _ZipfWords(rng, 30000)
+    rows: List[Tuple[int, bytes, str]] = []
+    for file_no in range((chunks + chunks_per_file - 1) // chunks_per_file):
+        rel_path = f"notes/{file_no % 50}/note-{file_no}.md"
+        count = min(chunks_per_file, chunks - len(rows))
+        tags = rng.sample(_TAGS, rng.randint(0, 3))
+        status = rng.choice([None, None, "draft", "published"])
+        for order in range(count):
+            text = _random_chunk(rng, vocab)
+            meta = {
+                "file_path": f"/srv/notes/{rel_path}",
+                "rel_path": rel_path,
+                "title": f"笔记 {file_no}",
+                "chunk_id": chunk_key(rel_path, "", text, order),
+                "order": order,
+                "chunk_count": count,
+                "tags": tags,
+                "status": status,
+            }
+            rows.append((len(rows), text.encode("utf-8"), json.dumps(meta, ensure_ascii=False, separators=(",", ":"))))
+    return rows
+
+
+def _load_entries(rows: List[Tuple[int, bytes, str]]) -> Tuple[List[Dict[str, Any]], Dict[int, int]]:
+    entries = [{"id": chunk_id, "text": text.decode("utf-8"), "metadata": json.loads(meta)} for chunk_id, text, meta in rows]
+    return entries, {e["id"]: pos for pos, e in enumerate(entries)}
+
+
+def _load_store(rows: List[Tuple[int, bytes, str]]) -> ChunkStore:
+    return ChunkStore(
+        {"id": chunk_id, "text": text.decode("utf-8"), "metadata": json.loads(meta)} for chunk_id, text, meta in rows
+    )
+
+
+def _measure(build: Callable[[], Any]) -> Tuple[Any, float, int, int]:
+    """返回 (结构, 构建秒数, 常驻字节, 峰值字节)。"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current, peak
+
+
+def _time_ms(fn: Callable[[], Any], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def main() -> None:
+    """运行基准并打印结果。"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--chunks-per-file", type=int, default=12)
+    parser.add_argument("--lookups", type=int, default=2000, help="组装检索结果的次数（每次 10 个 chunk）")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    rows = _rows(rng, args.chunks, args.chunks_per_file)
+    raw_bytes = sum(len(text) + len(meta) for _, text, meta in rows)
+    print(f"chunks={len(rows)} files={len(rows) // args.chunks_per_file} raw utf-8 text+meta={raw_bytes / 2**20:.1f} MB")
+
+    (entries, id_to_pos), entries_s, entries_mem, entries_peak = _measure(lambda: _load_entries(rows))
+    store, store_s, store_mem, store_peak = _measure(lambda: _load_store(rows))
+    for name, seconds, mem, peak in (
+        ("dict entries", entries_s, entries_mem, entries_peak),
+        ("ChunkStore", store_s, store_mem, store_peak),
+    ):
+        print(
+            f"{name:<13} resident={mem / 2**20:7.1f} MB ({mem / len(rows):6.0f} B/chunk) "
+            f"peak={peak / 2**20:7.1f} MB load={seconds:.2f}s"
+        )
+    print(f"memory reduction: {entries_mem / store_mem:.2f}x")
+
+    picks = [np.random.default_rng(i).integers(0, len(rows), 10).tolist() for i in range(args.lookups)]
+
+    def docs_from_entries(ids: List[int]) -> List[Dict[str, Any]]:
+        docs = []
+        for chunk_id in ids:
+            entry = entries[id_to_pos[chunk_id]]
+            meta = entry.get("metadata", {})
+            docs.append({"content": entry.get("text"), "rel_path": meta.get("rel_path"), "title": meta.get("title"),
+                         "tags": meta.get("tags", []), "order": meta.get("order")})
+        return docs
+
+    def docs_from_store(ids: List[int]) -> List[Dict[str, Any]]:
+        docs = []
+        for chunk_id in ids:
+            pos = store.position(chunk_id)
+            meta = store.metadata(pos)
+            docs.append({"content": store.text(pos), "rel_path": meta["rel_path"], "title": meta["title"],
+                         "tags": meta["tags"], "order": meta["order"]})
+        return docs
+
+    lookup = iter(picks * 2)
+    entries_docs = _time_ms(lambda: docs_from_entries(next(lookup)), args.lookups)
+    store_docs = _time_ms(lambda: docs_from_store(next(lookup)), args.lookups)
+    print(f"build 10 result docs: dict {entries_docs * 1000:.1f}us  ChunkStore {store_docs * 1000:.1f}us")
+
+    def shorter_from_entries() -> int:
+        lengths = [len(str(entry.get("text", ""))) for entry in entries]
+        threshold = float(np.median(lengths)) * 1.2
+        return len([idx for idx, length in enumerate(lengths) if length <= threshold])
+
+    def shorter_from_store() -> int:
+        lengths = store.lengths
+        return int(np.count_nonzero(lengths <= float(np.median(lengths)) * 1.2))
+
+    print(
+        f"length-based sampling scan: dict {_time_ms(shorter_from_entries, 5):.1f}ms  "
+        f"ChunkStore {_time_ms(shorter_from_store, 5):.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+启动耗时基准：在全新子进程中以 `python -X importtime` 执行 `create_app()`，
+统计墙钟耗时（取多次运行的中位数）与累计导入耗时最高的模块。
+
+用法：python -m benchmarks.bench_import_time --runs 5 --top 15
+      python -m benchmarks.bench_import_time --budget-ms 1000 --json   # 超出预算时退出码为 1，可用于 CI 跟踪
+      python -m benchmarks.bench_import_time --warm-up                 # 额外统计 warm_up_services() 的耗时
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 子进程中执行的脚本：最后一行 stdout 输出 JSON 计时结果
+_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+from app import create_app, warm_up_services
+create_app()
+t1 = time.perf_counter()
+if {warm_up}:
+    warm_up_services()
+t2 = time.perf_counter()
+print(json.dumps({{"create_app_ms": (t1 - t0) * 1000, "warm_up_ms": (t2 - t1) * 1000}}))
+"""
+
+
+def _parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """解析 -X importtime 输出，返回 {模块: (自身耗时 us, 累计耗时 us)}。"""
+    modules: Dict[str, Tuple[int, int]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        modules[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return modules
+
+
+def _run_once(warm_up: bool, env: Dict[str, str]) -> Tuple[Dict[str, float], Dict[str, Tuple[int, int]]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SNIPPET.format(warm_up=warm_up)],
+        cwd=_PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"子进程执行失败：\n{proc.stderr[-2000:]}")
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    return timings, _parse_importtime(proc.stderr)
+
+
+def main() -> None:
+    """运行基准并打印结果。"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="列出累计导入耗时最高的模块数")
+    parser.add_argument("--warm-up", action="store_true", help="create_app() 之后再调用 warm_up_services()")
+    parser.add_argument("--budget-ms", type=float, default=0.0, help="create_app() 中位耗时上限，0 为不检查")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    # 使用临时目录，避免基准读写真实的索引与笔记仓库
+    tmp_root = tempfile.mkdtemp(prefix="synapse_bench_")
+    env = dict(os.environ)
+    env.setdefault("LLM_API_KEY", "bench")
+    env.setdefault("CHROMA_PERSIST_DIR", os.path.join(tmp_root, "index"))
+    env.setdefault("NOTE_LOCAL_PATH", os.path.join(tmp_root, "notes"))
+
+    runs: List[Dict[str, float]] = []
+    modules: Dict[str, Tuple[int, int]] = {}
+    for _ in range(max(1, args.runs)):
+        timings, modules = _run_once(args.warm_up, env)
+        runs.append(timings)
+
+    create_ms = statistics.median(run["create_app_ms"] for run in runs)
+    warm_ms = statistics.median(run["warm_up_ms"] for run in runs)
+    # 按累计耗时排序（取最后一次运行；嵌套模块的耗时同时计入其父模块）
+    top = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[: args.top]
+    over_budget = args.budget_ms > 0 and create_ms > args.budget_ms
+
+    if args.json:
+        print(json.dumps({
+            "runs": len(runs),
+            "create_app_ms": round(create_ms, 1),
+            "warm_up_ms": round(warm_ms, 1) if args.warm_up else None,
+            "budget_ms": args.budget_ms or None,
+            "over_budget": over_budget,
+            "top_modules": [
+                {"module": name, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cum_us / 1000, 1)}
+                for name, (self_us, cum_us) in top
+            ],
+        }, ensure_ascii=False, indent=2))
+    else:
+        print(f"runs={len(runs)} create_app() median={create_ms:.0f}ms"
+              + (f" warm_up_services() median={warm_ms:.0f}ms" if args.warm_up else ""))
+        print(f"{'module':<48}{'self (ms)':>12}{'cumulative (ms)':>18}")
+        for name, (self_us, cum_us) in top:
+            print(f"{name:<48}{self_us / 1000:>12.1f}{cum_us / 1000:>18.1f}")
+        if args.budget_ms > 0:
+            print(f"budget {args.budget_ms:.0f}ms: {'EXCEEDED' if over_budget else 'ok'}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+索引加载基准：旧版 faiss_meta.json 与 .npy + SQLite 存储的加载耗时、文件大小与内存峰值对比。
+
+用法：python -m benchmarks.bench_index_load --chunks 5000 --dim 2048
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# 导入 app 包会初始化全局服务，基准运行时使用临时目录与占位 Key
+_TMP_ROOT = tempfile.mkdtemp(prefix="synapse_bench_")
+os.environ.setdefault("LLM_API_KEY", "bench")
+os.environ.setdefault("CHROMA_PERSIST_DIR", os.path.join(_TMP_ROOT, "global_index"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+
+from app.api.services.chunk_store import ChunkStore  # noqa: E402
+from app.api.services.vector_store import VectorStore  # noqa: E402
+
+
+def _make_corpus(chunks: int, dim: int) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """生成与真实笔记 chunk 规模相近的合成数据。"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((chunks, dim), dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    entries = [
+        {
+            "id": i,
+            "text": f"第 {i} 段笔记内容 " + "lorem ipsum " * 60,
+            "metadata": {
+                "file_path": f"/notes/folder_{i % 50}/note_{i // 8}.md",
+                "rel_path": f"folder_{i % 50}/note_{i // 8}.md",
+                "title": f"note_{i // 8}",
+                "chunk_id": f"{i:032x}",
+                "order": i % 8,
+                "chunk_count": 8,
+                "tags": ["bench", f"t{i % 7}"],
+            },
+        }
+        for i in range(chunks)
+    ]
+    return entries, vectors
+
+
+def _measure(fn: Callable[[], Any]) -> Tuple[float, float]:
+    """
+    返回 (耗时秒, Python 堆峰值 MB)。耗时与内存分两次测量，避免 tracemalloc 拖慢计时；
+    堆峰值不含 FAISS 内部（C++）分配。
+    """
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak / 1024 / 1024
+
+
+def _dir_size_mb(paths: List[Path]) -> float:
+    return sum(p.stat().st_size for p in paths if p.exists()) / 1024 / 1024
+
+
+def main() -> None:
+    """运行基准并打印结果表。"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=2048)
+    args = parser.parse_args()
+
+    entries, vectors = _make_corpus(args.chunks, args.dim)
+    index = faiss.IndexFlatIP(args.dim)
+    index.add(vectors)
+
+    legacy_dir = Path(_TMP_ROOT) / "legacy"
+    legacy_dir.mkdir()
+    faiss.write_index(index, str(legacy_dir / "faiss.index"))
+    legacy_entries = [dict(e, embedding=v.tolist()) for e, v in zip(entries, vectors)]
+    with (legacy_dir / "faiss_meta.json").open("w", encoding="utf-8") as f:
+        json.dump(legacy_entries, f, ensure_ascii=False, indent=2)
+    del legacy_entries
+
+    store = VectorStore(Path(_TMP_ROOT) / "binary")
+    store.save(index, ChunkStore(entries), vectors)
+
+    def load_legacy() -> Any:
+        idx = faiss.read_index(str(legacy_dir / "faiss.index"))
+        with (legacy_dir / "faiss_meta.json").open("r", encoding="utf-8") as f:
+            return idx, json.load(f)
+
+    legacy_time, legacy_peak = _measure(load_legacy)
+    binary_time, binary_peak = _measure(store.load)
+    legacy_size = _dir_size_mb([legacy_dir / "faiss.index", legacy_dir / "faiss_meta.json"])
+    binary_size = _dir_size_mb([store.index_file, store.vectors_file, store.meta_file, store.text_file])
+
+    print(f"chunks={args.chunks} dim={args.dim}")
+    print(f"{'format':<16}{'load (s)':>10}{'peak heap (MB)':>16}{'on disk (MB)':>14}")
+    print(f"{'json (legacy)':<16}{legacy_time:>10.2f}{legacy_peak:>16.1f}{legacy_size:>14.1f}")
+    print(f"{'npy + sqlite':<16}{binary_time:>10.2f}{binary_peak:>16.1f}{binary_size:>14.1f}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(_TMP_ROOT, ignore_errors=True)
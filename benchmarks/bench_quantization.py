@@ -0,0 +1,106 @@
+"""
+向量量化基准：对比 none / fp16 / int8 标量量化下的内存占用与召回率（相对 float32 精确检索的 recall@k），
+以及 int8 / IVF 候选经保存向量重排序后的召回率与查询延迟。数据为带聚类结构的合成单位向量。
+
+用法：python -m benchmarks.bench_quantization --chunks 100000 --dim 1024
+      python -m benchmarks.bench_quantization --index-types flat,ivf_flat,hnsw --json
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+
+from app.api.services import ann_index  # noqa: E402
+
+
+def _synthetic(rng: np.random.Generator, n: int, dim: int, clusters: int) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim), dtype="float32")
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((n, dim), dtype="float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row[row >= 0].tolist()) & set(ref.tolist())) for row, ref in zip(found, truth))
+    return hits / truth.size
+
+
+def main() -> None:
+    """运行基准并打印结果。"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--index-types", default="flat,ivf_flat", help="逗号分隔，可选 flat / ivf_flat / hnsw")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = _synthetic(rng, args.chunks, args.dim, clusters=max(16, args.chunks // 500))
+    ids = np.arange(args.chunks, dtype="int64")
+    picks = rng.integers(0, args.chunks, args.queries)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, args.dim), dtype="float32") / np.sqrt(args.dim)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, : args.top_k]
+    baseline_bytes = 2 * vectors.nbytes  # float32 的 FAISS 索引 + 索引外 float32 向量
+
+    results: List[Dict[str, Any]] = []
+    for index_type in [t.strip() for t in args.index_types.split(",") if t.strip()]:
+        for quantization in ann_index.QUANTIZATIONS:
+            started = time.perf_counter()
+            index = ann_index.build_index(vectors, ids, index_type, quantization=quantization)
+            build_s = time.perf_counter() - started
+            stored = vectors.astype(ann_index.vector_dtype(quantization))
+            index_bytes = len(faiss.serialize_index(index))
+
+            depth = args.top_k * args.rerank_factor
+            latencies: List[float] = []
+            plain = np.empty((args.queries, args.top_k), dtype="int64")
+            reranked = np.empty((args.queries, args.top_k), dtype="int64")
+            for row, query in enumerate(queries):
+                started = time.perf_counter()
+                _, found = ann_index.search(index, query[None, :], depth, nprobe=args.nprobe)
+                _, top = ann_index.rerank(query[None, :], found, found, stored, args.top_k)
+                latencies.append((time.perf_counter() - started) * 1000)
+                reranked[row] = top[0]
+                plain[row] = ann_index.search(index, query[None, :], args.top_k, nprobe=args.nprobe)[1][0]
+
+            results.append({
+                "index_type": ann_index.index_type_of(index),
+                "quantization": quantization,
+                "index_mb": round(index_bytes / 2**20, 1),
+                "vectors_mb": round(stored.nbytes / 2**20, 1),
+                "reduction": round(baseline_bytes / (index_bytes + stored.nbytes), 2),
+                "recall": round(_recall(plain, truth), 4),
+                "recall_reranked": round(_recall(reranked, truth), 4),
+                "rerank_p50_ms": round(statistics.median(latencies), 2),
+                "build_s": round(build_s, 1),
+            })
+
+    if args.json:
+        print(json.dumps({"chunks": args.chunks, "dim": args.dim, "top_k": args.top_k, "results": results}, indent=2))
+        return
+    print(f"chunks={args.chunks} dim={args.dim} recall@{args.top_k} vs float32 exact, rerank depth={args.top_k * args.rerank_factor}")
+    header = f"{'index':<10}{'quant':<7}{'index MB':>10}{'vectors MB':>12}{'reduction':>11}{'recall':>9}{'reranked':>10}{'p50 ms':>9}{'build s':>9}"
+    print(header)
+    for r in results:
+        print(
+            f"{r['index_type']:<10}{r['quantization']:<7}{r['index_mb']:>10}{r['vectors_mb']:>12}{r['reduction']:>10}x"
+            f"{r['recall']:>9}{r['recall_reranked']:>10}{r['rerank_p50_ms']:>9}{r['build_s']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
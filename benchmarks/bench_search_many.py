@@ -0,0 +1,93 @@
+"""
+批量检索基准：逐条 search 与 search_many 在不同批大小下的吞吐对比。
+嵌入接口以固定延迟的本地函数模拟（每次请求 latency-ms，与批内条数无关）。
+
+用法：python -m benchmarks.bench_search_many --chunks 20000 --dim 256 --queries 512
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# 导入 app 包会初始化全局服务，基准运行时使用临时目录与占位 Key
+_TMP_ROOT = tempfile.mkdtemp(prefix="synapse_bench_")
+os.environ.setdefault("LLM_API_KEY", "bench")
+os.environ.setdefault("CHROMA_PERSIST_DIR", os.path.join(_TMP_ROOT, "global_index"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from app.api.services import ann_index  # noqa: E402
+from app.api.services.indexer import NoteIndexer  # noqa: E402
+
+
+def _fake_embedding_fn(dim: int, latency_s: float):
+    """按文本哈希生成确定性向量，并模拟一次网络往返。"""
+
+    def embed(texts: List[str]) -> List[List[float]]:
+        time.sleep(latency_s)
+        out = []
+        for text in texts:
+            seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+            out.append(np.random.default_rng(seed).standard_normal(dim, dtype="float32").tolist())
+        return out
+
+    return embed
+
+
+def main() -> None:
+    """运行基准并打印结果表。"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    indexer = NoteIndexer(
+        persist_dir=os.path.join(_TMP_ROOT, "bench_index"),
+        embedding_provider="bigmodel",
+        embedding_model="bench",
+        note_root=_TMP_ROOT,
+        enable_embedding_cache=False,
+    )
+    indexer.embedding_fn = _fake_embedding_fn(args.dim, args.latency_ms / 1000)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, args.dim), dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    entries = [
+        {"id": i, "text": f"chunk {i}", "metadata": {"rel_path": f"note_{i // 8}.md", "title": f"note_{i // 8}"}}
+        for i in range(args.chunks)
+    ]
+    indexer._set_state(ann_index.build_index(vectors, [e["id"] for e in entries]), entries, vectors)
+    queries = [f"query {i}" for i in range(args.queries)]
+
+    print(f"chunks={args.chunks} dim={args.dim} queries={len(queries)} embed latency={args.latency_ms:.0f}ms")
+    print(f"{'mode':<22}{'total (s)':>10}{'queries/s':>12}")
+
+    single = queries[: max(1, min(len(queries), 32))]
+    start = time.perf_counter()
+    for query in single:
+        indexer.search(query, top_k=args.top_k)
+    elapsed = time.perf_counter() - start
+    print(f"{'search x' + str(len(single)):<22}{elapsed:>10.2f}{len(single) / elapsed:>12.1f}")
+
+    for batch_size in (8, 64, 256, len(queries)):
+        if batch_size > len(queries):
+            continue
+        start = time.perf_counter()
+        for offset in range(0, len(queries), batch_size):
+            indexer.search_many(queries[offset:offset + batch_size], top_k=args.top_k)
+        elapsed = time.perf_counter() - start
+        print(f"{'search_many b=' + str(batch_size):<22}{elapsed:>10.2f}{len(queries) / elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+服务吞吐基准：对比开发服务器（python main.py，单进程 Werkzeug）与生产启动器（python -m app.serve，
+gunicorn 多进程 + 多线程）在混合负载下的吞吐与延迟。负载由 --clients 个并发客户端循环发出：
+--stream-ratio 比例的请求为 /stream_generate（大模型由本地桩服务 benchmarks/stub_openai.py 按固定首字延迟与 token 速率流式返回），
+其余为 /api/search?mode=keyword（BM25，纯 CPU）。索引为随机生成的快照，不需要嵌入接口与 API Key。
+仅支持 Linux / macOS（gunicorn 依赖 fork）。
+
+用法：python -m benchmarks.bench_serve --chunks 20000 --clients 32 --duration 20 --workers 4 --threads 16
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_keyword_search import _ZipfWords  # noqa: E402
+from benchmarks.bench_shared_index import _build_snapshot  # noqa: E402
+
+_PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 120) -> None:
+    """等待服务可用，并触发一次检索让开发服务器完成索引加载。"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            conn.request("GET", "/api/search?q=warmup&mode=keyword")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"server on port {port} did not become ready")
+
+
+def _client(port: int, args: argparse.Namespace, stop_at: float, rng: random.Random, words: List[str],
+            results: Dict[str, List[float]], lock: threading.Lock) -> None:
+    stream_body = json.dumps({
+        "messages": [{"sender": "user", "text": "你好"}],
+        "provider": "openai", "base_url": args.stub_url, "api_key": "bench", "model": "stub",
+    })
+    while time.monotonic() < stop_at:
+        kind = "stream" if rng.random() < args.stream_ratio else "search"
+        started = time.perf_counter()
+        first: Optional[float] = None
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            if kind == "stream":
+                conn.request("POST", "/stream_generate", stream_body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                while True:
+                    line = response.readline()
+                    if not line:
+                        break
+                    if first is None and line.startswith(b"data:"):
+                        first = time.perf_counter() - started
+            else:
+                query = " ".join(rng.sample(words, 2))
+                conn.request("GET", f"/api/search?q={quote(query)}&mode=keyword&top_k=10")
+                response = conn.getresponse()
+                response.read()
+            ok = response.status == 200
+            conn.close()
+        except OSError:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if not ok:
+                results["errors"].append(elapsed)
+            elif kind == "stream":
+                results["stream"].append(elapsed)
+                results["stream_first"].append(first if first is not None else elapsed)
+            else:
+                results["search"].append(elapsed)
+
+
+def _run_load(port: int, args: argparse.Namespace, words: List[str]) -> Dict[str, Any]:
+    results: Dict[str, List[float]] = {"stream": [], "stream_first": [], "search": [], "errors": []}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=_client, args=(port, args, stop_at, random.Random(i), words, results, lock))
+        for i in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def pct(values: List[float], q: float) -> float:
+        return sorted(values)[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+    completed = len(results["stream"]) + len(results["search"])
+    return {
+        "rps": completed / args.duration,
+        "streams": len(results["stream"]),
+        "searches": len(results["search"]),
+        "errors": len(results["errors"]),
+        "first_p50": pct(results["stream_first"], 0.5),
+        "stream_p50": pct(results["stream"], 0.5),
+        "search_p50": pct(results["search"], 0.5),
+        "search_p99": pct(results["search"], 0.99),
+    }
+
+
+def _start_server(mode: str, port: int, env: Dict[str, str], args: argparse.Namespace) -> subprocess.Popen:
+    if mode == "dev":
+        command = [sys.executable, "main.py"]
+    else:
+        command = [
+            sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(args.workers), "--threads", str(args.threads),
+        ]
+    return subprocess.Popen(
+        command, cwd=_PROJECT_ROOT, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def main() -> None:
+    """运行基准并打印结果。"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=32, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=20, help="每种服务器的压测秒数")
+    parser.add_argument("--stream-ratio", type=float, default=0.25, help="流式生成请求的比例")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--first-token-ms", type=float, default=200, help="桩服务的首字延迟")
+    parser.add_argument("--tokens", type=int, default=64, help="桩服务每次回复的 token 数")
+    parser.add_argument("--token-rate", type=float, default=200, help="桩服务每秒输出的 token 数")
+    args = parser.parse_args()
+
+    # 桩服务（benchmarks/stub_openai.py）在独立进程中运行，不与压测客户端争用 GIL
+    stub_port = _free_port()
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_openai", "--port", str(stub_port),
+         "--latency-ms", str(args.first_token_ms), "--completion-tokens", str(args.tokens),
+         "--token-rate", str(args.token_rate)],
+        cwd=_PROJECT_ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    stub.stdout.readline()
+    args.stub_url = f"http://127.0.0.1:{stub_port}/v1"
+
+    tmp_root = Path(tempfile.mkdtemp(prefix="synapse_bench_"))
+    try:
+        started = time.perf_counter()
+        _build_snapshot(tmp_root / "index", args.chunks, args.dim)
+        (tmp_root / "notes").mkdir()
+        words = _ZipfWords(random.Random(0), 30000).words[:2000]
+        print(
+            f"chunks={args.chunks} dim={args.dim} clients={args.clients} stream_ratio={args.stream_ratio} "
+            f"stub={args.first_token_ms:.0f}ms+{args.tokens}tok@{args.token_rate:.0f}/s cpus={os.cpu_count()} "
+            f"(built in {time.perf_counter() - started:.1f}s)"
+        )
+        print(f"{'server':<26}{'req/s':>8}{'streams':>9}{'searches':>10}{'errors':>8}"
+              f"{'first p50':>11}{'stream p50':>12}{'search p50':>12}{'search p99':>12}")
+        for mode in ("dev", "serve"):
+            port = _free_port()
+            env = dict(
+                os.environ, CHROMA_PERSIST_DIR=str(tmp_root / "index"), NOTE_LOCAL_PATH=str(tmp_root / "notes"),
+                LLM_API_KEY="bench", SERVER_HOST="127.0.0.1", SERVER_PORT=str(port), INDEX_RELOAD_INTERVAL="0",
+            )
+            proc = _start_server(mode, port, env, args)
+            try:
+                _wait_ready(port)
+                if mode == "serve":
+                    # 每个 worker 各自预热一次
+                    for _ in range(args.workers * 2):
+                        _wait_ready(port)
+                r = _run_load(port, args, words)
+            finally:
+                os.killpg(proc.pid, signal.SIGTERM)
+                proc.wait()
+            label = "main.py (werkzeug)" if mode == "dev" else f"app.serve ({args.workers}w x {args.threads}t)"
+            print(
+                f"{label:<26}{r['rps']:>8.1f}{r['streams']:>9}{r['searches']:>10}{r['errors']:>8}"
+                f"{r['first_p50']:>11.0f}{r['stream_p50']:>12.0f}{r['search_p50']:>12.1f}{r['search_p99']:>12.1f}"
+            )
+        print("延迟单位 ms；first p50 为流式请求收到第一个事件的耗时，stream p50 为读完整个流的耗时")
+    finally:
+        stub.terminate()
+        stub.wait()
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+多 worker 共享索引基准：同时启动 N 个子进程加载同一份 IVF（或 Flat）快照并执行检索，对比各自读入内存（默认模式）
+与只读内存映射（INDEX_READ_ONLY）时每个进程的私有内存（RssAnon）、按共享进程数分摊后的内存（Pss）
+以及加载耗时与检索延迟。所有子进程保持存活后同时测量，Pss 之和即这组 worker 实际占用的物理内存。
+仅支持 Linux（读取 /proc/self/status 与 /proc/self/smaps_rollup）。
+
+用法：python -m benchmarks.bench_shared_index --chunks 100000 --dim 512 --workers 4 [--index-type flat]
+"""
+
+import argparse
+import ctypes
+import gc
+import json
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from app.api.services import ann_index  # noqa: E402
+from app.api.services.chunk_store import ChunkStore  # noqa: E402
+from app.api.services.vector_store import VectorStore  # noqa: E402
+from benchmarks.bench_keyword_search import _random_chunk, _ZipfWords  # noqa: E402
+
+_PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+def _memory_mb() -> Dict[str, float]:
+    """当前进程的 RssAnon / RssFile / Pss（MB），读取前归还空闲的堆内存。"""
+    gc.collect()
+    ctypes.CDLL("libc.so.6").malloc_trim(0)
+    values: Dict[str, float] = {}
+    for path, keys in (("/proc/self/status", ("RssAnon", "RssFile")), ("/proc/self/smaps_rollup", ("Pss",))):
+        with open(path, encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in keys:
+                    values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def _build_snapshot(persist_dir: Path, chunks: int, dim: int, index_type: str) -> None:
+    rng = random.Random(0)
+    vocab = _ZipfWords(rng, 30000)
+    entries: List[Dict[str, Any]] = []
+    for i in range(chunks):
+        rel_path = f"notes/{i // 12 % 50}/note-{i // 12}.md"
+        entries.append({
+            "id": i,
+            "text": _random_chunk(rng, vocab),
+            "metadata": {
+                "file_path": f"/srv/{rel_path}", "rel_path": rel_path, "title": f"笔记 {i // 12}",
+                "chunk_id": f"{i:032x}", "order": i % 12, "chunk_count": 12, "tags": ["bench"], "status": None,
+            },
+        })
+    vectors = np.random.default_rng(0).standard_normal((chunks, dim), dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = ann_index.build_index(vectors, list(range(chunks)), index_type)
+    VectorStore(persist_dir).save(index, ChunkStore(entries), vectors)
+
+
+def _child(persist_dir: str, mode: str, queries: int, nprobe: int) -> None:
+    """子进程：加载快照并检索，输出就绪行后等待父进程通知，再测量内存并输出 JSON。"""
+    baseline = _memory_mb()
+    started = time.perf_counter()
+    store = VectorStore(Path(persist_dir), read_only=mode == "mmap")
+    index, chunks, vectors = store.load()
+    load_s = time.perf_counter() - started
+
+    rng = np.random.default_rng()
+    latencies: List[float] = []
+    for _ in range(queries):
+        query = rng.standard_normal((1, vectors.shape[1]), dtype="float32")
+        query /= np.linalg.norm(query)
+        started = time.perf_counter()
+        _, ids = ann_index.search(index, query, 10, nprobe=nprobe)
+        [{"content": chunks.text(pos), **chunks.metadata(pos)} for pos in chunks.positions(ids[0]).tolist()]
+        latencies.append((time.perf_counter() - started) * 1000)
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    after = _memory_mb()
+    print(json.dumps({
+        "mode": mode,
+        "anon_mb": round(after["RssAnon"] - baseline["RssAnon"], 1),
+        "file_mb": round(after["RssFile"] - baseline["RssFile"], 1),
+        "pss_mb": round(after["Pss"] - baseline["Pss"], 1),
+        "index_mmap": store.index_mmapped,
+        "load_s": round(load_s, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+    }), flush=True)
+
+
+def _run_workers(persist_dir: Path, mode: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """同时启动 workers 个子进程，全部就绪后通知测量。"""
+    command = [
+        sys.executable, "-m", "benchmarks.bench_shared_index", "--child", str(persist_dir), mode,
+        "--queries", str(args.queries), "--nprobe", str(args.nprobe),
+    ]
+    procs = [
+        subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=_PROJECT_ROOT)
+        for _ in range(args.workers)
+    ]
+    for proc in procs:
+        if proc.stdout.readline().strip() != "ready":
+            raise RuntimeError("benchmark worker failed")
+    results: List[Dict[str, Any]] = []
+    for proc in procs:
+        proc.stdin.write("\n")
+        proc.stdin.flush()
+        results.append(json.loads(proc.stdout.readline()))
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait()
+    return results
+
+
+def main() -> None:
+    """运行基准并打印结果。"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=300, help="每个 worker 的检索次数")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--index-type", choices=(ann_index.INDEX_IVF_FLAT, ann_index.INDEX_FLAT), default=ann_index.INDEX_IVF_FLAT)
+    parser.add_argument("--child", nargs=2, metavar=("PERSIST_DIR", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child[0], args.child[1], args.queries, args.nprobe)
+        return
+
+    tmp_root = Path(tempfile.mkdtemp(prefix="synapse_bench_"))
+    try:
+        started = time.perf_counter()
+        _build_snapshot(tmp_root, args.chunks, args.dim, args.index_type)
+        store = VectorStore(tmp_root)
+        store.load()
+        sizes = {name: store.current.joinpath(name).stat().st_size / 2**20 for name in ("faiss.index", "chunk_text.bin")}
+        print(
+            f"chunks={args.chunks} dim={args.dim} workers={args.workers} {args.index_type} faiss.index={sizes['faiss.index']:.1f} MB "
+            f"chunk_text.bin={sizes['chunk_text.bin']:.1f} MB (built in {time.perf_counter() - started:.1f}s)"
+        )
+        print(f"{'mode':<8}{'anon MB':>10}{'file MB':>10}{'Pss MB':>9}{'total Pss':>11}{'load s':>8}{'p50 ms':>8}")
+        for mode in ("memory", "mmap"):
+            results = _run_workers(tmp_root, mode, args)
+            mean = {key: statistics.mean(r[key] for r in results) for key in ("anon_mb", "file_mb", "pss_mb", "load_s", "p50_ms")}
+            print(
+                f"{mode:<8}{mean['anon_mb']:>10.1f}{mean['file_mb']:>10.1f}{mean['pss_mb']:>9.1f}"
+                f"{sum(r['pss_mb'] for r in results):>11.1f}{mean['load_s']:>8.2f}{mean['p50_ms']:>8.2f}"
+            )
+        print("每列为各 worker 的平均值；total Pss 为全部 worker 之和（共享页按进程数分摊），即这组 worker 实际占用的物理内存")
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
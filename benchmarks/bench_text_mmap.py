@@ -0,0 +1,134 @@
+"""
+chunk 文本内存映射基准：在子进程中加载同一份快照，对比文本全部读入内存与从 chunk_text.bin 内存映射读取时
+进程的私有内存（RssAnon，多个 worker 各占一份）与文件映射内存（RssFile，页缓存，多个 worker 共享），
+以及组装检索结果（每次 10 个 chunk）的耗时。仅支持 Linux（读取 /proc/self/status）。
+
+用法：python -m benchmarks.bench_text_mmap --chunks 100000 --dim 512
+"""
+
+import argparse
+import ctypes
+import gc
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from app.api.services import ann_index  # noqa: E402
+from app.api.services.chunk_store import ChunkStore  # noqa: E402
+from app.api.services.vector_store import VectorStore  # noqa: E402
+from benchmarks.bench_keyword_search import _random_chunk, _ZipfWords  # noqa: E402
+
+
+def _memory_mb() -> Dict[str, float]:
+    """当前进程的 RssAnon / RssFile（MB），读取前归还空闲的堆内存，避免加载时的临时对象计入。"""
+    gc.collect()
+    ctypes.CDLL("libc.so.6").malloc_trim(0)
+    values: Dict[str, float] = {}
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("RssAnon", "RssFile"):
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def _build_snapshot(persist_dir: Path, chunks: int, dim: int) -> None:
+    rng = random.Random(0)
+    vocab = _ZipfWords(rng, 30000)
+    entries: List[Dict[str, Any]] = []
+    for i in range(chunks):
+        rel_path = f"notes/{i // 12 % 50}/note-{i // 12}.md"
+        entries.append({
+            "id": i,
+            "text": _random_chunk(rng, vocab),
+            "metadata": {
+                "file_path": f"/srv/{rel_path}", "rel_path": rel_path, "title": f"笔记 {i // 12}",
+                "chunk_id": f"{i:032x}", "order": i % 12, "chunk_count": 12, "tags": ["bench"], "status": None,
+            },
+        })
+    vectors = np.random.default_rng(0).standard_normal((chunks, dim), dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    VectorStore(persist_dir).save(ann_index.build_index(vectors, list(range(chunks))), ChunkStore(entries), vectors)
+
+
+def _child(persist_dir: str, mode: str, lookups: int) -> None:
+    """子进程：加载快照、按模式保存文本、组装检索结果，输出 JSON。"""
+    baseline = _memory_mb()
+    index, chunks, vectors = VectorStore(Path(persist_dir)).load()
+    if mode == "memory":
+        # 改动前的行为：全部文本常驻进程内存
+        chunks = ChunkStore(list(chunks))
+    loaded = _memory_mb()
+
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    for _ in range(lookups):
+        [{"content": chunks.text(pos), **chunks.metadata(pos)} for pos in rng.integers(0, len(chunks), 10).tolist()]
+    lookup_us = (time.perf_counter() - started) * 1e6 / lookups
+    after = _memory_mb()
+    print(json.dumps({
+        "mode": mode,
+        "anon_mb": round(loaded["RssAnon"] - baseline["RssAnon"], 1),
+        "file_mb": round(loaded["RssFile"] - baseline["RssFile"], 1),
+        "anon_after_lookups_mb": round(after["RssAnon"] - baseline["RssAnon"], 1),
+        "file_after_lookups_mb": round(after["RssFile"] - baseline["RssFile"], 1),
+        "lookup_us": round(lookup_us, 1),
+        "vectors_mb": round(vectors.nbytes / 2**20, 1),
+        "index_ntotal": index.ntotal,
+        "stats": chunks.stats(),
+    }))
+
+
+def main() -> None:
+    """运行基准并打印结果。"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--lookups", type=int, default=1000, help="组装检索结果的次数（每次 10 个 chunk）")
+    parser.add_argument("--child", nargs=2, metavar=("PERSIST_DIR", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child[0], args.child[1], args.lookups)
+        return
+
+    tmp_root = Path(tempfile.mkdtemp(prefix="synapse_bench_"))
+    try:
+        started = time.perf_counter()
+        _build_snapshot(tmp_root, args.chunks, args.dim)
+        store = VectorStore(tmp_root)
+        store.load()
+        text_mb = store.text_file.stat().st_size / 2**20
+        index_mb = store.index_file.stat().st_size / 2**20
+        print(
+            f"chunks={args.chunks} dim={args.dim} faiss.index={index_mb:.1f} MB chunk_text.bin={text_mb:.1f} MB "
+            f"(built in {time.perf_counter() - started:.1f}s)"
+        )
+        print(f"{'text':<8}{'anon MB':>9}{'file MB':>9}{'anon after':>12}{'file after':>12}{'10 docs us':>12}")
+        for mode in ("memory", "mmap"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_text_mmap", "--child", str(tmp_root), mode,
+                 "--lookups", str(args.lookups)],
+                check=True, capture_output=True, text=True, cwd=str(Path(__file__).resolve().parent.parent),
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{r['mode']:<8}{r['anon_mb']:>9}{r['file_mb']:>9}{r['anon_after_lookups_mb']:>12}"
+                f"{r['file_after_lookups_mb']:>12}{r['lookup_us']:>12}"
+            )
+        print("anon 为进程私有内存（含 FAISS 索引，每个 worker 一份）；file 为映射的向量与文本中实际读到的页，同一快照的 worker 共享页缓存")
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
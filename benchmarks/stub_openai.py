@@ -0,0 +1,381 @@
+"""
+本地 OpenAI 兼容桩服务：不联网、不需要 API Key，用于离线运行应用与压测。
+- /chat/completions：流式（SSE）与非流式；请求带 tools 时先返回工具调用，收到工具结果后再返回文本
+- /embeddings：基于特征哈希的确定性向量（同一文本总得到同一向量，共享词项越多的文本越相似），
+  支持 dimensions 参数与 base64 编码（openai SDK 默认）
+- 可配置首字延迟、抖动、token 速率与错误注入（指定比例的请求返回 429 / 5xx，或流式中途断开）
+路径只按结尾匹配，/v1/chat/completions、/api/paas/v4/chat/completions 等任意前缀都可用，
+把 *_BASE_URL 指向 http://127.0.0.1:<port>/v1 即可。回复内容由请求内容的哈希决定，相同请求得到相同回复。
+
+用法：python -m benchmarks.stub_openai --port 8090 --latency-ms 200 --token-rate 50 --error-rate 0.01
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+# 回复用词表：中英文混排，每个词算一个 token
+_VOCAB = (
+    "笔记 知识 检索 索引 向量 模型 问题 回答 总结 方法 步骤 例子 概念 关系 学习 复习 记录 整理 "
+    "the note index search vector model answer summary method step example concept link review"
+).split()
+
+
+class StubConfig:
+    """桩服务的行为参数（所有请求共享，由命令行设置）。"""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.latency_s = args.latency_ms / 1000
+        self.jitter_s = args.jitter_ms / 1000
+        self.token_rate = args.token_rate
+        self.completion_tokens = args.completion_tokens
+        self.tool_call_rate = args.tool_call_rate
+        self.dim = args.dim
+        self.embedding_latency_s = args.embedding_latency_ms / 1000
+        self.embedding_ms_per_input = args.embedding_ms_per_input
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.disconnect_rate = args.disconnect_rate
+        self._rng = random.Random(args.seed)
+        self._rng_lock = threading.Lock()
+        self.counters: Dict[str, int] = {"chat": 0, "embeddings": 0, "inputs": 0, "errors": 0, "disconnects": 0}
+
+    def roll(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def delay(self, base: float) -> None:
+        """等待 base 秒加上 [0, jitter) 的随机抖动。"""
+        jitter = self.roll() * self.jitter_s if self.jitter_s > 0 else 0.0
+        if base + jitter > 0:
+            time.sleep(base + jitter)
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._rng_lock:
+            self.counters[key] += n
+
+
+def embed_text(text: str, dim: int) -> np.ndarray:
+    """
+    特征哈希向量：英文词与中文二字组各按 crc32 映射到一个维度与正负号后累加，再单位化。
+    不依赖进程的哈希种子，重启后结果不变；没有可用词项的文本退化为以 sha256 为种子的随机向量。
+    """
+    lowered = text.lower()
+    terms = _WORD_RE.findall(lowered)
+    for run in _CJK_RE.findall(lowered):
+        terms.extend(run[i:i + 2] for i in range(max(1, len(run) - 1)))
+    if not terms:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    else:
+        hashes = np.fromiter((zlib.crc32(term.encode("utf-8")) for term in terms), dtype="uint64", count=len(terms))
+        signs = np.where(hashes & (1 << 31), -1.0, 1.0)
+        vector = np.bincount((hashes % dim).astype("int64"), weights=signs, minlength=dim).astype("float32")
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def _completion_words(messages: List[Dict[str, Any]], count: int) -> List[str]:
+    """由消息内容的哈希决定的回复词序列（相同请求得到相同回复）。"""
+    digest = hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).digest()
+    rng = random.Random(digest)
+    return [("" if i == 0 else " ") + rng.choice(_VOCAB) for i in range(count)]
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                return " ".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+            return str(content or "")
+    return ""
+
+
+def _tool_arguments(schema: Dict[str, Any], user_text: str) -> Dict[str, Any]:
+    """按参数 schema 构造调用参数：必填的字符串参数取用户最后一条消息（有 enum 时取第一个），其余取默认值。"""
+    parameters = schema.get("parameters") or {}
+    required = set(parameters.get("required") or [])
+    arguments: Dict[str, Any] = {}
+    for name, prop in (parameters.get("properties") or {}).items():
+        if "default" in prop:
+            arguments[name] = prop["default"]
+        elif name in required:
+            if prop.get("enum"):
+                arguments[name] = prop["enum"][0]
+            elif prop.get("type") == "string":
+                arguments[name] = user_text or "test"
+            elif prop.get("type") in ("integer", "number"):
+                arguments[name] = 1
+            elif prop.get("type") == "boolean":
+                arguments[name] = False
+            elif prop.get("type") == "array":
+                arguments[name] = []
+            else:
+                arguments[name] = {}
+    return arguments
+
+
+def _pick_tool_call(body: Dict[str, Any], config: StubConfig) -> Optional[Dict[str, Any]]:
+    """
+    请求带 tools、tool_choice 不为 none、且最后一条用户消息之后还没有工具结果时返回一个工具调用：
+    tool_choice 指定了函数时调用该函数，否则调用第一个工具；按 tool_call_rate 的比例（由消息哈希决定）触发。
+    """
+    tools = [tool.get("function") or {} for tool in body.get("tools") or [] if tool.get("type", "function") == "function"]
+    choice = body.get("tool_choice")
+    messages = body.get("messages") or []
+    if not tools or choice == "none":
+        return None
+    for message in reversed(messages):
+        if message.get("role") == "tool":
+            return None
+        if message.get("role") == "user":
+            break
+    forced = choice.get("function", {}).get("name") if isinstance(choice, dict) else None
+    if forced is None and choice != "required":
+        digest = hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).digest()
+        if int.from_bytes(digest[:4], "little") / 2**32 >= config.tool_call_rate:
+            return None
+    tool = next((t for t in tools if t.get("name") == forced), tools[0])
+    return {
+        "id": f"call_{uuid.uuid4().hex[:24]}",
+        "type": "function",
+        "function": {
+            "name": tool.get("name", ""),
+            "arguments": json.dumps(_tool_arguments(tool, _last_user_text(messages)), ensure_ascii=False),
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """请求处理：按路径结尾分发到聊天、嵌入与模型列表。"""
+
+    protocol_version = "HTTP/1.1"
+    config: StubConfig
+
+    def do_GET(self) -> None:  # noqa: N802
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]})
+        elif path.endswith("/health") or path == "":
+            self._send_json(200, {"status": "ok", "counters": self.config.counters})
+        else:
+            self._send_error(404, f"no route for GET {self.path}", "not_found")
+
+    def do_POST(self) -> None:  # noqa: N802
+        path = self.path.split("?", 1)[0].rstrip("/")
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            self._send_error(400, "request body is not valid JSON", "invalid_request_error")
+            return
+        if path.endswith("/chat/completions"):
+            self.config.count("chat")
+            if not self._inject_error():
+                self._chat(body)
+        elif path.endswith("/embeddings"):
+            self.config.count("embeddings")
+            if not self._inject_error():
+                self._embeddings(body)
+        else:
+            self._send_error(404, f"no route for POST {self.path}", "not_found")
+
+    def _inject_error(self) -> bool:
+        """按 error_rate 返回错误；429 带 Retry-After，客户端的退避重试会按它等待。"""
+        config = self.config
+        if config.error_rate <= 0 or config.roll() >= config.error_rate:
+            return False
+        config.count("errors")
+        headers = {"Retry-After": "1"} if config.error_status == 429 else {}
+        self._send_error(config.error_status, "injected error from stub server", "stub_injected_error", headers)
+        return True
+
+    def _chat(self, body: Dict[str, Any]) -> None:
+        config = self.config
+        messages = body.get("messages") or []
+        model = body.get("model") or "stub"
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or config.completion_tokens
+        tool_call = _pick_tool_call(body, config)
+        words = [] if tool_call else _completion_words(messages, max(1, min(config.completion_tokens, max_tokens)))
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 2 + 1
+        completion_tokens = len(words) if words else len(tool_call["function"]["arguments"]) // 4 + 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        finish_reason = "tool_calls" if tool_call else "stop"
+
+        if not body.get("stream"):
+            generation = completion_tokens / config.token_rate if config.token_rate > 0 else 0.0
+            config.delay(config.latency_s + generation)
+            message: Dict[str, Any] = {"role": "assistant", "content": None if tool_call else "".join(words)}
+            if tool_call:
+                message["tool_calls"] = [tool_call]
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+            return
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None) -> Dict[str, Any]:
+            return {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        config.delay(config.latency_s)
+        disconnect_at = -1
+        if config.disconnect_rate > 0 and config.roll() < config.disconnect_rate:
+            config.count("disconnects")
+            disconnect_at = len(words) // 2
+        interval = 1 / config.token_rate if config.token_rate > 0 else 0.0
+        try:
+            self._send_event(chunk({"role": "assistant", "content": ""}))
+            for delta in self._stream_deltas(words, tool_call):
+                if disconnect_at == 0:
+                    # 模拟上游中途断开：不发送结束标记直接关闭连接
+                    return
+                disconnect_at -= 1
+                self._send_event(chunk(delta))
+                if interval:
+                    time.sleep(interval)
+            self._send_event(chunk({}, finish_reason))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._send_event({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [], "usage": usage,
+                })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    @staticmethod
+    def _stream_deltas(words: List[str], tool_call: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """文本逐词输出；工具调用先发 id 与函数名，参数按 16 字符分片输出（与 OpenAI 的分片方式一致）。"""
+        if tool_call is None:
+            for word in words:
+                yield {"content": word}
+            return
+        function = tool_call["function"]
+        yield {"tool_calls": [{
+            "index": 0, "id": tool_call["id"], "type": "function",
+            "function": {"name": function["name"], "arguments": ""},
+        }]}
+        arguments = function["arguments"]
+        for start in range(0, len(arguments), 16):
+            yield {"tool_calls": [{"index": 0, "function": {"arguments": arguments[start:start + 16]}}]}
+
+    def _embeddings(self, body: Dict[str, Any]) -> None:
+        config = self.config
+        inputs = body.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if not isinstance(inputs, list) or not inputs:
+            self._send_error(400, "input must be a non-empty string or array", "invalid_request_error")
+            return
+        dim = int(body.get("dimensions") or config.dim)
+        config.count("inputs", len(inputs))
+        config.delay(config.embedding_latency_s + config.embedding_ms_per_input * len(inputs) / 1000)
+        encode_base64 = body.get("encoding_format") == "base64"
+        data: List[Dict[str, Any]] = []
+        tokens = 0
+        for i, text in enumerate(inputs):
+            text = str(text)
+            tokens += len(text) // 2 + 1
+            vector = embed_text(text, dim)
+            embedding: Any = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii") if encode_base64 \
+                else vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        self._send_json(200, {
+            "object": "list", "data": data, "model": body.get("model") or "stub",
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _send_event(self, payload: Dict[str, Any]) -> None:
+        self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str, code: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send_json(status, {"error": {"message": message, "type": code, "code": code}}, headers)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+
+def make_server(args: argparse.Namespace) -> Tuple[ThreadingHTTPServer, StubConfig]:
+    """按参数创建桩服务（未启动），返回服务器与共享配置。"""
+    config = StubConfig(args)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server, config
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=200, help="首字延迟（非流式为响应前的固定延迟）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="在延迟上叠加 [0, jitter) 的随机抖动")
+    parser.add_argument("--token-rate", type=float, default=50, help="每秒输出的 token 数（0 为不限速）")
+    parser.add_argument("--completion-tokens", type=int, default=64, help="每次回复的 token 数（不超过请求的 max_tokens）")
+    parser.add_argument("--tool-call-rate", type=float, default=1.0, help="请求带 tools 时返回工具调用的比例")
+    parser.add_argument("--dim", type=int, default=1024, help="嵌入维度（请求带 dimensions 时以请求为准）")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50, help="每次嵌入请求的固定延迟")
+    parser.add_argument("--embedding-ms-per-input", type=float, default=0.5, help="嵌入请求中每条输入增加的延迟")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回错误的请求比例")
+    parser.add_argument("--error-status", type=int, default=500, help="注入错误的状态码（429 时带 Retry-After）")
+    parser.add_argument("--disconnect-rate", type=float, default=0, help="流式回复中途断开的比例")
+    parser.add_argument("--seed", type=int, default=0, help="错误注入与抖动的随机种子")
+    return parser
+
+
+def main() -> None:
+    """启动桩服务直到被中断。"""
+    args = build_parser().parse_args()
+    server, _ = make_server(args)
+    base_url = f"http://{args.host}:{server.server_address[1]}/v1"
+    print(f"stub OpenAI server listening on {base_url}", flush=True)
+    print(f"  export LLM_API_KEY=stub BIGMODEL_BASE_URL={base_url} OPENAI_BASE_URL={base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,11 @@ import os
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-from app import create_app
+from app import create_app, warm_up_services
 from app.config.settings import settings
 
 if __name__ == '__main__':
     app = create_app()
+    if settings.WARM_UP_SERVICES:
+        warm_up_services()
     app.run(debug=True, host=settings.SERVER_HOST, port=settings.SERVER_PORT)
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+测试公共夹具：确定性的假嵌入函数、临时目录中的索引器，以及用 GitPython 构造提交的辅助函数。
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pytest
+from git import Actor, Repo
+
+from app.api.services import ann_index
+from app.api.services.chunk_store import ChunkStore
+from app.api.services.indexer import NoteIndexer
+from app.api.services.vector_store import VectorStore
+
+_AUTHOR = Actor("Test", "test@example.com")
+EMBEDDING_DIM = 8
+# VectorStore 测试使用的向量维度
+STORE_DIM = 4
+
+
+class FakeEmbedding:
+    """按文本 sha256 生成确定性向量的嵌入函数，记录每次请求，可模拟接口故障与跳过个别文本。"""
+
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+        # 为 True 时每次调用抛出异常（模拟嵌入接口不可用）
+        self.fail = False
+        # 包含这些子串的文本返回 None（模拟接口跳过的坏条目）
+        self.skip: Set[str] = set()
+
+    @staticmethod
+    def vector(text: str) -> List[float]:
+        """返回 text 对应的向量（未单位化）。"""
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255.0 + 0.01 for b in digest[:EMBEDDING_DIM]]
+
+    @property
+    def texts(self) -> List[str]:
+        """所有调用中请求嵌入的文本。"""
+        return [text for batch in self.calls for text in batch]
+
+    def __call__(self, texts: List[str]) -> List[Optional[List[float]]]:
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("embedding service unavailable")
+        return [None if any(s in text for s in self.skip) else self.vector(text) for text in texts]
+
+
+@pytest.fixture
+def fake_embedding() -> FakeEmbedding:
+    """返回新的假嵌入函数。"""
+    return FakeEmbedding()
+
+
+def make_indexer(persist_dir: Path, note_root: Path, embedding_fn: FakeEmbedding, **options: Any) -> NoteIndexer:
+    """
+    在 persist_dir 创建（或加载）索引器，使用假嵌入函数，默认关闭嵌入缓存与后台轮询。
+    :param options: 覆盖 NoteIndexer 的其他构造参数
+    """
+    params: Dict[str, Any] = {
+        "enable_embedding_cache": False,
+        "embedding_max_attempts": 1,
+        "reload_interval": 0,
+        "embedding_dimensions": 0,
+    }
+    params.update(options)
+    indexer = NoteIndexer(
+        persist_dir=str(persist_dir),
+        embedding_provider="bigmodel",
+        embedding_model="test-model",
+        embedding_api_key="test-key",
+        note_root=str(note_root),
+        **params,
+    )
+    indexer.embedding_fn = embedding_fn
+    return indexer
+
+
+@pytest.fixture
+def indexer(tmp_path: Path, fake_embedding: FakeEmbedding) -> NoteIndexer:
+    """临时目录中的空索引器，笔记根目录为 tmp_path / "notes"。"""
+    (tmp_path / "notes").mkdir(exist_ok=True)
+    return make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding)
+
+
+def commit_files(
+    repo: Repo, message: str, write: Optional[Dict[str, str]] = None, remove: Optional[List[str]] = None
+) -> str:
+    """在 repo 的工作区写入 / 删除文件（相对路径）并提交，返回新提交的哈希。"""
+    root = Path(repo.working_dir)
+    for rel_path, content in (write or {}).items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        repo.index.add([rel_path])
+    if remove:
+        repo.index.remove(remove, working_tree=True)
+    return repo.index.commit(message, author=_AUTHOR, committer=_AUTHOR).hexsha
+
+
+def write_notes(note_root: Path, notes: Dict[str, str]) -> List[Dict[str, str]]:
+    """在 note_root 下写入笔记（相对路径 -> 内容），返回 rebuild_index / upsert_files 使用的文件列表。"""
+    files = []
+    for rel_path, content in notes.items():
+        path = note_root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        files.append({"path": str(path), "content": content})
+    return files
+
+
+def rename_file(repo: Repo, old: str, new: str) -> None:
+    """在 repo 中移动文件（git mv），调用方随后提交。"""
+    repo.index.move([old, new])
+
+
+def store_entries(ids: List[int]) -> List[Dict[str, Any]]:
+    """按 id 生成 VectorStore 的 chunk 记录。"""
+    return [{"id": i, "text": f"chunk {i}", "metadata": {"rel_path": f"n{i}.md"}} for i in ids]
+
+
+def store_vectors(ids: List[int]) -> np.ndarray:
+    """按 id 生成确定性的单位向量（同一 id 总是同一个向量）。"""
+    rng = np.random.default_rng(0)
+    table = rng.standard_normal((max(ids) + 1, STORE_DIM)).astype("float32")
+    vecs = table[ids]
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def save_snapshot(store: VectorStore, ids: List[int], source_head: str = "") -> str:
+    """把 ids 对应的 chunk 保存为新快照，返回版本号。"""
+    vecs = store_vectors(ids)
+    metadata = {"source_head": source_head} if source_head else None
+    return store.save(ann_index.build_index(vecs, ids), ChunkStore(store_entries(ids)), vecs, metadata=metadata)
+
+
+def loaded_texts(store: VectorStore) -> Dict[int, str]:
+    """load() 后的 {chunk id: 文本}，并检查索引、chunk 与向量条数一致。"""
+    loaded = store.load()
+    assert loaded is not None
+    index, chunks, embeddings = loaded
+    assert index is not None and index.ntotal == len(chunks) == embeddings.shape[0]
+    return {int(chunk_id): chunks.text(pos) for pos, chunk_id in enumerate(chunks.ids.tolist())}
+
+
+def delta_entries(ids: List[int]) -> List[Tuple[Dict[str, Any], np.ndarray]]:
+    """append_delta 的新增参数。"""
+    return list(zip(store_entries(ids), store_vectors(ids)))
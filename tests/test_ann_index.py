@@ -0,0 +1,91 @@
+"""
+ANN 索引类型：auto 按语料规模选择、各类型的检索结果，以及 HNSW 删除时的墓碑与锁外重建。
+"""
+
+import threading
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+import pytest
+
+from app.api.services import ann_index
+from app.api.services.indexer import NoteIndexer
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+
+def _unit_vectors(n: int, dim: int) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    vecs = rng.standard_normal((n, dim)).astype("float32")
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def test_auto_switches_to_ivf_above_threshold() -> None:
+    """auto 在阈值以内用精确的 Flat，超过后用 IVF-Flat；显式配置的类型不受语料规模影响，未知取值回退 auto。"""
+    assert ann_index.resolve_index_type("auto", 100, 1000) == ann_index.INDEX_FLAT
+    assert ann_index.resolve_index_type("auto", 1001, 1000) == ann_index.INDEX_IVF_FLAT
+    assert ann_index.resolve_index_type("hnsw", 10, 1000) == ann_index.INDEX_HNSW
+    assert ann_index.resolve_index_type("bogus", 10, 1000) == ann_index.INDEX_FLAT
+
+
+@pytest.mark.parametrize("index_type", [ann_index.INDEX_FLAT, ann_index.INDEX_IVF_FLAT, ann_index.INDEX_HNSW])
+def test_each_index_type_finds_stored_vectors(index_type: str) -> None:
+    """各类型索引以保存的向量为查询时返回其自身（chunk id 而非位置），分数约为 1。"""
+    vecs = _unit_vectors(2000, 16)
+    ids = list(range(1000, 3000))
+    index = ann_index.build_index(vecs, ids, index_type)
+
+    assert ann_index.index_type_of(index) == index_type
+    scores, labels = ann_index.search(index, vecs[:20], 3, nprobe=64, ef_search=128)
+
+    assert labels[:, 0].tolist() == ids[:20]
+    assert np.allclose(scores[:, 0], 1.0, atol=1e-4)
+
+
+def test_too_few_vectors_fall_back_to_flat() -> None:
+    """训练样本不足以训练 IVF 时回退到 Flat。"""
+    index = ann_index.build_index(_unit_vectors(50, 8), list(range(50)), ann_index.INDEX_IVF_FLAT)
+
+    assert ann_index.index_type_of(index) == ann_index.INDEX_FLAT
+
+
+def _hnsw_indexer(tmp_path: Path, fake_embedding: FakeEmbedding) -> NoteIndexer:
+    notes = {f"n{i}.md": f"# N{i}\nnote number {i}\n" for i in range(12)}
+    indexer = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding, index_type="hnsw")
+    indexer.rebuild_index(write_notes(tmp_path / "notes", notes))
+    return indexer
+
+
+def test_hnsw_removal_rebuilds_graph_outside_the_write_lock(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """HNSW 删除后重建图期间检索不被阻塞，且不会返回已删除的 chunk。"""
+    indexer = _hnsw_indexer(tmp_path, fake_embedding)
+    real_build = indexer._build_ann
+    during_rebuild: List[Any] = []
+
+    def build_while_searching(vectors: np.ndarray, ids: Any) -> Any:
+        # 重建在写锁外进行：另一个线程的检索能在重建期间完成
+        thread = threading.Thread(target=lambda: during_rebuild.append(indexer.search("note number 3", top_k=12)))
+        thread.start()
+        thread.join(timeout=5)
+        assert not thread.is_alive(), "search blocked while the HNSW graph was rebuilt"
+        return real_build(vectors, ids)
+
+    indexer._build_ann = build_while_searching  # type: ignore[method-assign]
+    indexer.remove_files(["n3.md", "n4.md"])
+
+    # 重建期间：墓碑被剔除，结果数不受影响
+    assert during_rebuild and len(during_rebuild[0]) == 10
+    assert {doc["rel_path"] for doc in during_rebuild[0]}.isdisjoint({"n3.md", "n4.md"})
+    assert indexer._tombstones == 0 and indexer.index.ntotal == len(indexer.chunks) == 10
+
+
+def test_hnsw_index_survives_reload_after_removal(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """删除后持久化的是重建后的图，重新加载后条数一致，检索结果不含已删除的笔记。"""
+    indexer = _hnsw_indexer(tmp_path, fake_embedding)
+    indexer.remove_files(["n0.md"])
+
+    reloaded = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding, index_type="hnsw")
+
+    assert ann_index.index_type_of(reloaded.index) == ann_index.INDEX_HNSW
+    assert reloaded.index.ntotal == len(reloaded.chunks) == 11
+    assert "n0.md" not in {doc["rel_path"] for doc in reloaded.search("note number 0", top_k=11)}
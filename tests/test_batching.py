@@ -0,0 +1,71 @@
+"""
+按 token 预算装批：批次条数与估算 token 数不超过提供商上限，超长 chunk 在分块时切分，索引器的嵌入请求遵守上限。
+"""
+
+from pathlib import Path
+
+from app.api.services.chunking import chunk_markdown
+from app.api.services.embedding_pool import iter_batches, pack_batches
+from app.utils.tokens import estimate_tokens, split_by_tokens
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+
+def test_estimate_counts_cjk_per_character() -> None:
+    """中文约 1 字 1 token，其他字符约 4 字符 1 token（向上取整）。"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("笔记检索") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("索引abcde") == 2 + 2
+
+
+def test_batches_respect_item_and_token_limits() -> None:
+    """每批不超过 max_items 条、估算 token 不超过 max_tokens，顺序与内容不变；单条超限的文本独占一批。"""
+    texts = ["x" * 40] * 7 + ["长" * 50] + ["y" * 4] * 5
+    batches = pack_batches(texts, max_items=4, max_tokens=30)
+
+    assert [text for batch in batches for text in batch] == texts
+    for batch in batches:
+        assert len(batch) <= 4
+        assert len(batch) == 1 or sum(estimate_tokens(t) for t in batch) <= 30
+    assert ["长" * 50] in batches
+
+
+def test_iter_batches_consumes_a_stream_lazily() -> None:
+    """输入是生成器时逐批产出，取第一批时只消费了装满它所需的文本。"""
+    consumed = []
+
+    def stream():
+        for i in range(100):
+            consumed.append(i)
+            yield f"t{i}"
+
+    first = next(iter_batches(stream(), max_items=3, max_tokens=1000))
+
+    assert first == ["t0", "t1", "t2"] and len(consumed) == 4
+
+
+def test_long_sections_are_split_below_item_limit(tmp_path: Path) -> None:
+    """单个段落超过单条 token 上限时分块阶段继续切分，不丢字符。"""
+    body = " ".join(f"word{i}" for i in range(400))
+    chunks = chunk_markdown(str(tmp_path / "long.md"), f"# Long\n{body}\n", tmp_path, max_item_tokens=64)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c["text"]) <= 64 for c in chunks)
+    assert "".join(split_by_tokens(body, 64)) == body
+
+
+def test_indexer_requests_follow_provider_limits(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """索引器按配置的上限装批：每次嵌入请求的条数与 token 数都不超过上限。"""
+    notes = {f"n{i}.md": f"# N{i}\n" + f"note {i} body text " * 5 for i in range(20)}
+    indexer = make_indexer(
+        tmp_path / "index", tmp_path / "notes", fake_embedding,
+        embedding_limits={"max_batch_items": 3, "max_batch_tokens": 80, "max_item_tokens": 40},
+    )
+
+    indexer.rebuild_index(write_notes(tmp_path / "notes", notes))
+
+    assert len(fake_embedding.calls) > 1
+    for batch in fake_embedding.calls:
+        assert len(batch) <= 3
+        assert all(estimate_tokens(text) <= 40 for text in batch)
+        assert len(batch) == 1 or sum(estimate_tokens(text) for text in batch) <= 80
@@ -0,0 +1,77 @@
+"""
+BM25 关键词检索与混合检索：中文二字组与标识符切分、倒数排名融合，以及 RAG_SEARCH_MODE 默认为 vector
+（结果 score 为相似度，不构建 BM25），hybrid 需显式开启。
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from app.api.services.bm25 import BM25Index, reciprocal_rank_fusion
+from app.config.settings import Settings
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+_NOTES = {
+    "faiss.md": "# 向量索引\n使用 faiss.IndexIVFFlat 建立倒排索引，检索速度更快\n",
+    "git.md": "# 同步\nget_note_indexer 在 Git 同步后增量更新笔记\n",
+    "cook.md": "# 做饭\n番茄炒蛋需要先把鸡蛋炒熟\n",
+}
+
+
+def test_keyword_search_matches_cjk_bigrams_and_identifier_parts() -> None:
+    """中文查询按二字组命中；标识符整体与拆出的部分都能命中；增删后结果随之更新。"""
+    index = BM25Index.from_entries({"id": i, "text": text} for i, text in enumerate(_NOTES.values()))
+
+    assert [cid for cid, _ in index.search("倒排索引", top_k=3)] == [0]
+    assert [cid for cid, _ in index.search("鸡蛋", top_k=3)] == [2]
+    assert [cid for cid, _ in index.search("faiss.IndexIVFFlat", top_k=3)] == [0]
+    assert [cid for cid, _ in index.search("indexer", top_k=3)] == [1]
+
+    index.remove(2)
+    index.add(7, "鸡蛋羹")
+    assert [cid for cid, _ in index.search("鸡蛋", top_k=3)] == [7]
+
+
+def test_reciprocal_rank_fusion_uses_ranks_only() -> None:
+    """融合分数为 Σ 1/(k + rank)，与原始分数的量纲无关；两路都靠前的条目排在最前。"""
+    fused = reciprocal_rank_fusion([[(1, 0.9), (2, 0.8)], [(2, 35.0), (3, 12.0)]], k=60)
+
+    assert [cid for cid, _ in fused] == [2, 1, 3]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
+
+
+def test_rag_search_mode_defaults_to_vector(monkeypatch: "MonkeyPatch") -> None:
+    """未设置时为 vector；hybrid 需显式开启；未知取值回退到 vector。"""
+    monkeypatch.delenv("RAG_SEARCH_MODE", raising=False)
+    assert Settings().RAG_SEARCH_MODE == "vector"
+
+    monkeypatch.setenv("RAG_SEARCH_MODE", "Hybrid")
+    assert Settings().RAG_SEARCH_MODE == "hybrid"
+
+    monkeypatch.setenv("RAG_SEARCH_MODE", "fuzzy")
+    assert Settings().RAG_SEARCH_MODE == "vector"
+
+
+def test_vector_mode_keeps_similarity_scores_and_skips_bm25(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """
+    vector 模式的 score 为余弦相似度，warm_up 不构建 BM25；hybrid 的 score 为融合分数（不超过 2/(k+1)），
+    并在第一次混合检索时按需构建 BM25。
+    """
+    indexer = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding, keyword_index=False)
+    indexer.rebuild_index(write_notes(tmp_path / "notes", _NOTES))
+    indexer.warm_up()
+    assert indexer.keyword_index_stats() is None
+
+    vector = indexer.search("番茄炒蛋", top_k=3)
+    assert all(0.0 < doc["score"] <= 1.0 for doc in vector)
+    assert indexer.keyword_index_stats() is None
+
+    hybrid = indexer.search("番茄炒蛋", top_k=3, mode="hybrid")
+    assert hybrid[0]["rel_path"] == "cook.md"
+    assert all(doc["score"] <= 2 / 61 + 1e-9 for doc in hybrid)
+    assert indexer.keyword_index_stats()["chunks"] == len(indexer.chunks)
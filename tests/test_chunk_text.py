@@ -0,0 +1,67 @@
+"""
+chunk 文本内存映射：快照保存后文本改为映射 chunk_text.bin（内存中不留副本），快照之后新增的文本在内存缓冲区中，
+删除与整理后两段地址上的文本都能正确读取；中文为主的文本以 UTF-16 保存。
+"""
+
+from pathlib import Path
+
+import pytest
+
+from app.api.services.chunk_store import ChunkStore
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+_NOTES = {
+    "a.md": "# A\nalpha apple\n",
+    "b.md": "# 乙\n中文为主的段落，每个字在 UTF-8 中占三个字节\n",
+    "c.md": "# C\ncharlie cherry\n",
+}
+
+
+def _texts(chunks: ChunkStore) -> dict:
+    return {chunks.rel_path(pos): chunks.text(pos) for pos in range(len(chunks))}
+
+
+def test_saved_text_is_memory_mapped(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """重建后文本全部来自快照文件；增量新增的文本在内存中，重新加载后从映射读取且内容不变。"""
+    note_root = tmp_path / "notes"
+    indexer = make_indexer(tmp_path / "index", note_root, fake_embedding)
+    indexer.rebuild_index(write_notes(note_root, _NOTES))
+    stats = indexer.chunks.stats()
+
+    assert stats["memory_text_bytes"] == 0
+    assert stats["mapped_text_bytes"] == indexer.store.text_file.stat().st_size > 0
+
+    indexer.upsert_files(write_notes(note_root, {"d.md": "# D\ndelta date\n"}))
+    indexer.remove_files(["a.md"])
+    expected = _texts(indexer.chunks)
+    assert indexer.chunks.stats()["memory_text_bytes"] > 0 and indexer.chunks.stats()["dead_text_bytes"] > 0
+
+    reloaded = make_indexer(tmp_path / "index", note_root, FakeEmbedding())
+    assert _texts(reloaded.chunks) == expected
+    assert "a.md" not in expected and "中文为主" in expected["b.md"]
+
+
+def test_store_reads_across_mapped_and_memory_text(tmp_path: Path) -> None:
+    """写出并映射文本文件后追加与删除：映射段与内存段的文本都按位置读出，整理内存段不影响映射段。"""
+    store = ChunkStore({"id": i, "text": f"mapped {i}", "metadata": {"rel_path": f"m{i}.md"}} for i in range(3))
+    with (tmp_path / "text.bin").open("wb") as f:
+        store.write_texts(f)
+    store.attach_text(tmp_path / "text.bin")
+    store.extend({"id": 10 + i, "text": f"内存 {i}", "metadata": {"rel_path": f"n{i}.md"}} for i in range(3))
+
+    store.remove(1)
+    store.remove(11)
+    store._compact_text()
+
+    assert sorted(_texts(store).values()) == ["mapped 0", "mapped 2", "内存 0", "内存 2"]
+    assert store.stats()["dead_text_bytes"] == len("mapped 1".encode("utf-8"))
+
+
+def test_attach_rejects_mismatched_text_file(tmp_path: Path) -> None:
+    """文本文件与行记录的字节数不符时拒绝映射，避免按错误的偏移读出其他 chunk 的文本。"""
+    store = ChunkStore([{"id": 0, "text": "alpha", "metadata": {}}])
+    (tmp_path / "text.bin").write_bytes(b"alph")
+
+    with pytest.raises(ValueError):
+        store.attach_text(tmp_path / "text.bin")
+    assert store.text(0) == "alpha"
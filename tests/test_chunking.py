@@ -0,0 +1,94 @@
+"""
+确定性 chunk 标识与 chunk 级差异更新：同一内容重新分块得到相同的 chunk_id，修改笔记的一个章节只嵌入该章节；
+全量重建在进程池中分块时结果与单线程一致，并按输入顺序逐批产出。
+"""
+
+from pathlib import Path
+
+from app.api.services.chunking import chunk_key, chunk_markdown, iter_chunk_batches
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+_SECTIONS = 12
+
+
+def _note(edited: int = -1) -> str:
+    sections = [
+        f"## Section {i}\n{'edited paragraph' if i == edited else 'original paragraph'} number {i}\n"
+        for i in range(_SECTIONS)
+    ]
+    return "# Long note\n" + "".join(sections)
+
+
+def test_chunk_ids_are_deterministic(tmp_path: Path) -> None:
+    """同一文件重新分块得到相同的 chunk_id；标识随路径、标题路径与内容变化，重复段落按出现序号区分。"""
+    path = str(tmp_path / "a.md")
+    content = "# A\n## B\nsame\n## C\nsame\n"
+
+    first = [c["metadata"]["chunk_id"] for c in chunk_markdown(path, content, tmp_path, 8000)]
+    second = [c["metadata"]["chunk_id"] for c in chunk_markdown(path, content, tmp_path, 8000)]
+
+    assert first == second and len(set(first)) == len(first)
+    assert chunk_key("a.md", "A > B", "same") != chunk_key("a.md", "A > C", "same")
+    assert chunk_key("a.md", "A", "same") != chunk_key("b.md", "A", "same")
+    assert chunk_key("a.md", "A", "same", 0) != chunk_key("a.md", "A", "same", 1)
+    assert len(chunk_key("a.md", "A", "same")) == 32
+
+
+def test_editing_one_section_embeds_one_chunk(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """修改长笔记中的一个章节：只为改动的 chunk 发起一次嵌入，其余 chunk 保留原向量与标识，检索看到新内容。"""
+    note_root = tmp_path / "notes"
+    indexer = make_indexer(tmp_path / "index", note_root, fake_embedding, query_cache_max_items=0)
+    indexer.rebuild_index(write_notes(note_root, {"long.md": _note()}))
+    before = {item["metadata"]["chunk_id"] for item in indexer.chunks.iter_metadata()}
+    fake_embedding.calls.clear()
+
+    indexer.upsert_files(write_notes(note_root, {"long.md": _note(edited=5)}))
+
+    assert len(fake_embedding.calls) == 1 and len(fake_embedding.texts) == 1
+    assert "edited paragraph number 5" in fake_embedding.texts[0]
+    after = {item["metadata"]["chunk_id"] for item in indexer.chunks.iter_metadata()}
+    assert len(after) == len(before) and len(after - before) == 1
+    hit = indexer.search("## Section 5\nedited paragraph number 5", top_k=1)[0]
+    assert "edited paragraph number 5" in hit["content"]
+
+
+def test_unchanged_file_is_not_re_embedded(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """内容未变的文件再次 upsert 不发起任何嵌入请求。"""
+    note_root = tmp_path / "notes"
+    indexer = make_indexer(tmp_path / "index", note_root, fake_embedding)
+    files = write_notes(note_root, {"long.md": _note()})
+    indexer.rebuild_index(files)
+    fake_embedding.calls.clear()
+
+    indexer.upsert_files(files)
+
+    assert fake_embedding.calls == []
+
+
+def test_process_pool_chunking_matches_single_thread(tmp_path: Path) -> None:
+    """进程池分块按输入顺序逐批产出（已完成文件数递增），文本与元数据和单线程分块完全相同。"""
+    files = write_notes(tmp_path, {f"n{i:02d}.md": _note(edited=i % _SECTIONS) for i in range(10)})
+
+    serial = list(iter_chunk_batches(files, tmp_path, 8000))
+    pooled = list(iter_chunk_batches(files, tmp_path, 8000, workers=2, files_per_task=3))
+
+    assert [done for done, _, _ in pooled] == [3, 6, 9, 10]
+    assert [t for _, texts, _ in pooled for t in texts] == [t for _, texts, _ in serial for t in texts]
+    assert [m for _, _, metas in pooled for m in metas] == [m for _, _, metas in serial for m in metas]
+
+
+def test_rebuild_with_chunk_pool_matches_serial_rebuild(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """文件数达到 chunk_pool_min_files 时全量重建走进程池，索引内容与单线程重建相同。"""
+    files = write_notes(tmp_path / "notes", {f"n{i}.md": _note(edited=i) for i in range(4)})
+    serial = make_indexer(tmp_path / "serial", tmp_path / "notes", fake_embedding)
+    pooled = make_indexer(
+        tmp_path / "pooled", tmp_path / "notes", FakeEmbedding(), chunk_workers=2, chunk_pool_min_files=2
+    )
+
+    serial.rebuild_index(files)
+    pooled.rebuild_index(files)
+
+    assert list(pooled.chunks.iter_metadata()) == list(serial.chunks.iter_metadata())
+    assert [hit["rel_path"] for hit in pooled.search("edited paragraph number 2", top_k=3)] == [
+        hit["rel_path"] for hit in serial.search("edited paragraph number 2", top_k=3)
+    ]
@@ -0,0 +1,177 @@
+"""
+读写锁与原子替换：检索在同步（嵌入）期间不被阻塞并看到旧的完整状态；按需构建 BM25 不持有写操作互斥锁，
+构建期间的增删通过变更日志补上；嵌入期间不持有存储层文件锁，其他进程（共用目录的另一个索引器）照常加载与发布。
+"""
+
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, TYPE_CHECKING
+
+from app.api.services import indexer as indexer_module
+from app.api.services.bm25 import BM25Index
+from app.api.services.indexer import NoteIndexer
+from app.utils.file_lock import interprocess_lock
+from app.utils.rwlock import ReadWriteLock
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+
+class _BlockingEmbedding(FakeEmbedding):
+    """armed 后第一次调用时阻塞，直到 release 被设置（模拟耗时的嵌入请求）。"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.armed = False
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, texts: List[str]) -> List[Optional[List[float]]]:
+        if self.armed:
+            self.armed = False
+            self.entered.set()
+            self.release.wait(10)
+        return super().__call__(texts)
+
+
+def _in_thread(fn: Any) -> Dict[str, Any]:
+    """在线程中执行 fn，5 秒内未完成视为被阻塞。"""
+    out: Dict[str, Any] = {}
+    thread = threading.Thread(target=lambda: out.setdefault("value", fn()))
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive(), "call blocked"
+    return out
+
+
+def test_rwlock_readers_share_and_writer_excludes() -> None:
+    """多个读者可同时持有；写者等待读者全部释放；有写者等待时新读者排队（写优先）。"""
+    lock = ReadWriteLock()
+    lock.acquire_read()
+    _in_thread(lock.acquire_read)
+    lock.release_read()
+
+    acquired = threading.Event()
+    writer = threading.Thread(target=lambda: (lock.acquire_write(), acquired.set()))
+    writer.start()
+    assert not acquired.wait(0.1)
+
+    late_reader = threading.Event()
+    reader = threading.Thread(target=lambda: (lock.acquire_read(), late_reader.set(), lock.release_read()))
+    reader.start()
+    assert not late_reader.wait(0.1)
+
+    lock.release_read()
+    assert acquired.wait(5)
+    assert not late_reader.wait(0.1)
+    lock.release_write()
+    assert late_reader.wait(5)
+    writer.join()
+    reader.join()
+
+
+def _blocked_upsert(tmp_path: Path, **options: Any) -> Any:
+    """建好索引后开始一次 upsert，并让它停在嵌入请求上（持有 _write_mutex），返回 (indexer, embedding, thread)。"""
+    embedding = _BlockingEmbedding()
+    note_root = tmp_path / "notes"
+    indexer = make_indexer(tmp_path / "index", note_root, embedding, query_cache_max_items=0, **options)
+    indexer.rebuild_index(write_notes(note_root, {"a.md": "# A\nalpha apple\n", "b.md": "# B\nbravo banana\n"}))
+    changed = write_notes(note_root, {"a.md": "# A\nalpha avocado rewritten\n"})
+
+    embedding.armed = True
+    thread = threading.Thread(target=indexer.upsert_files, args=(changed,))
+    thread.start()
+    assert embedding.entered.wait(5)
+    return indexer, embedding, thread
+
+
+def test_search_sees_old_state_while_sync_embeds(tmp_path: Path) -> None:
+    """同步在锁外嵌入期间检索照常返回旧状态；替换完成后检索看到新内容。"""
+    indexer, embedding, thread = _blocked_upsert(tmp_path)
+    try:
+        during = _in_thread(lambda: indexer.search("alpha", top_k=2))["value"]
+        assert {doc["rel_path"] for doc in during} == {"a.md", "b.md"}
+        assert "apple" in " ".join(doc["content"] for doc in during)
+    finally:
+        embedding.release.set()
+        thread.join(5)
+
+    texts = " ".join(doc["content"] for doc in indexer.search("alpha", top_k=2))
+    assert "avocado" in texts and "apple" not in texts
+
+
+def test_keyword_index_builds_while_sync_is_running(tmp_path: Path) -> None:
+    """按需构建 BM25 不等待进行中的同步：第一次关键词检索在同步嵌入期间完成。"""
+    indexer, embedding, thread = _blocked_upsert(tmp_path, keyword_index=False)
+    try:
+        hits = _in_thread(lambda: indexer.search("banana", top_k=1, mode="keyword"))["value"]
+        assert [doc["rel_path"] for doc in hits] == ["b.md"]
+    finally:
+        embedding.release.set()
+        thread.join(5)
+
+    # 构建完成后同步的修改随 chunks 增量维护到 BM25
+    assert [doc["rel_path"] for doc in indexer.search("avocado", top_k=1, mode="keyword")] == ["a.md"]
+    assert indexer.search("apple", top_k=1, mode="keyword") == []
+
+
+def test_changes_during_build_are_replayed(
+    tmp_path: Path, fake_embedding: FakeEmbedding, monkeypatch: "MonkeyPatch"
+) -> None:
+    """BM25 构建期间（快照之后、替换之前）发生的删除与新增通过变更日志补进新索引。"""
+    note_root = tmp_path / "notes"
+    indexer: NoteIndexer = make_indexer(tmp_path / "index", note_root, fake_embedding, keyword_index=False)
+    indexer.rebuild_index(write_notes(note_root, {"a.md": "# A\nalpha apple\n", "b.md": "# B\nbravo banana\n"}))
+    real_from_entries = BM25Index.from_entries
+
+    def build_during_sync(entries: Iterable[Dict[str, Any]]) -> BM25Index:
+        index = real_from_entries(entries)
+        indexer.remove_files(["b.md"])
+        indexer.upsert_files(write_notes(note_root, {"c.md": "# C\ncharlie cherry\n"}))
+        return index
+
+    monkeypatch.setattr(indexer_module.BM25Index, "from_entries", staticmethod(build_during_sync))
+    indexer.search("alpha", top_k=1, mode="keyword")
+
+    assert indexer.keyword_index_stats()["chunks"] == len(indexer.chunks) == 2
+    assert indexer.search("banana", top_k=1, mode="keyword") == []
+    assert [doc["rel_path"] for doc in indexer.search("cherry", top_k=1, mode="keyword")] == ["c.md"]
+
+
+def test_store_lock_is_free_while_sync_embeds(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """同步嵌入期间存储层 LOCK 未被持有：其他进程可取得写锁，共用目录的新索引器加载不等待。"""
+    indexer, embedding, thread = _blocked_upsert(tmp_path)
+    try:
+        def take_lock() -> bool:
+            with interprocess_lock(tmp_path / "index" / "LOCK"):
+                return True
+
+        assert _in_thread(take_lock)["value"]
+        reader = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding)
+        hits = _in_thread(lambda: reader.search("banana", top_k=1))["value"]
+        assert [doc["rel_path"] for doc in hits] == ["b.md"]
+    finally:
+        embedding.release.set()
+        thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_publish_merges_changes_published_during_embedding(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """嵌入期间另一个进程发布了新版本：发布时在锁内重新加载并重新对比，两边的修改都保留，新读者看到合并结果。"""
+    indexer, embedding, thread = _blocked_upsert(tmp_path)
+    other = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding)
+    try:
+        _in_thread(lambda: other.upsert_files(write_notes(tmp_path / "notes", {"c.md": "# C\ncharlie cherry\n"})))
+    finally:
+        embedding.release.set()
+        thread.join(5)
+    assert not thread.is_alive()
+
+    fresh = make_indexer(tmp_path / "index", tmp_path / "notes", FakeEmbedding())
+    for current in (indexer, fresh):
+        texts = {doc["rel_path"]: doc["content"] for doc in current.search("alpha", top_k=3)}
+        assert set(texts) == {"a.md", "b.md", "c.md"}
+        assert "avocado" in texts["a.md"]
+    # c.md 的 chunk 从已发布的快照复用，锁内不再嵌入
+    assert not any("charlie" in text for text in embedding.texts)
@@ -0,0 +1,94 @@
+"""
+增量日志：VectorStore 的 add/delete 记录重放与崩溃截断，以及索引器的增量持久化与合并。
+"""
+
+from pathlib import Path
+from typing import Dict, List
+
+from app.api.services.indexer import NoteIndexer
+from app.api.services.vector_store import VectorStore
+from tests.conftest import (
+    FakeEmbedding,
+    delta_entries,
+    loaded_texts,
+    make_indexer,
+    save_snapshot,
+    store_vectors,
+    write_notes,
+)
+
+
+def _texts_by_path(indexer: NoteIndexer) -> Dict[str, List[str]]:
+    """{rel_path: 排序后的 chunk 文本}。"""
+    texts: Dict[str, List[str]] = {}
+    for entry in indexer.chunks:
+        texts.setdefault(entry["metadata"]["rel_path"], []).append(entry["text"])
+    return {path: sorted(items) for path, items in texts.items()}
+
+
+def test_delta_is_replayed_on_load(tmp_path: Path) -> None:
+    """增量日志中的删除、新增与替换在加载时按顺序重放。"""
+    store = VectorStore(tmp_path)
+    save_snapshot(store, [0, 1, 2])
+    store.append_delta(delta_entries([3]), [1])
+    store.append_delta([({"id": 0, "text": "chunk 0 v2", "metadata": {}}, store_vectors([0])[0])], [0])
+
+    texts = loaded_texts(VectorStore(tmp_path))
+
+    assert texts == {0: "chunk 0 v2", 2: "chunk 2", 3: "chunk 3"}
+
+
+def test_truncated_delta_tail_is_dropped(tmp_path: Path) -> None:
+    """写入中途崩溃留下的不完整尾部记录被截断，之前的记录照常重放。"""
+    store = VectorStore(tmp_path)
+    save_snapshot(store, [0, 1])
+    store.append_delta(delta_entries([2]), [])
+    intact = store.delta_file.stat().st_size
+    store.append_delta(delta_entries([3]), [])
+    with store.delta_file.open("r+b") as f:
+        f.truncate(store.delta_file.stat().st_size - 3)
+
+    reopened = VectorStore(tmp_path)
+    texts = loaded_texts(reopened)
+
+    assert sorted(texts) == [0, 1, 2]
+    assert reopened.delta_file.stat().st_size == intact
+
+
+def test_upsert_appends_to_delta_without_new_snapshot(
+    tmp_path: Path, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """upsert 与删除只追加增量记录，不写新快照；重新加载（重放增量）得到与内存中相同的内容。"""
+    notes = tmp_path / "notes"
+    indexer.rebuild_index(write_notes(notes, {"a.md": "# A\nalpha\n", "b.md": "# B\nbravo\n", "c.md": "# C\ncharlie\n"}))
+    fake_embedding.calls.clear()
+
+    indexer.upsert_files(write_notes(notes, {"a.md": "# A\nalpha two\n", "d.md": "# D\ndelta\n"}))
+    indexer.remove_files(["b.md"])
+
+    assert len(indexer.list_snapshots()) == 1
+    assert indexer.store.delta_records > 0
+    assert all("bravo" not in text and "charlie" not in text for text in fake_embedding.texts)
+    reloaded = make_indexer(tmp_path / "index", notes, fake_embedding)
+    assert _texts_by_path(reloaded) == _texts_by_path(indexer)
+    assert sorted(_texts_by_path(reloaded)) == ["a.md", "c.md", "d.md"]
+
+
+def test_delta_is_compacted_into_a_snapshot(
+    tmp_path: Path, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """增量记录数超过阈值时合并为新快照，日志清空，内容不变。"""
+    notes = tmp_path / "notes"
+    indexer.rebuild_index(write_notes(notes, {"a.md": "# A\nalpha\n"}))
+    indexer.store.compact_min_records = 3
+    indexer.store.compact_ratio = 0.0
+
+    indexer.upsert_files(write_notes(notes, {"b.md": "# B\nbravo\n"}))
+    assert len(indexer.list_snapshots()) == 1
+    indexer.upsert_files(write_notes(notes, {"c.md": "# C\ncharlie\n", "d.md": "# D\ndelta\n"}))
+
+    snapshots = indexer.list_snapshots()
+    assert len(snapshots) == 2 and snapshots[0]["current"] and snapshots[0]["delta_bytes"] == 0
+    assert indexer.store.delta_records == 0
+    reloaded = make_indexer(tmp_path / "index", notes, fake_embedding)
+    assert sorted(_texts_by_path(reloaded)) == ["a.md", "b.md", "c.md", "d.md"]
@@ -0,0 +1,79 @@
+"""
+嵌入输出维度（EMBEDDING_DIMENSIONS）：请求携带 dimensions 参数，接口拒绝该参数时改为本地截断并重新单位化，
+快照 manifest 记录实际维度。
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import httpx
+
+from app.api.services.ai_providers import fit_dimensions, get_embedding_callable
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+_FULL = [3.0, 4.0, 12.0, 84.0]
+
+
+def _bigmodel(monkeypatch: "MonkeyPatch", payloads: List[Dict[str, Any]], supports_dimensions: bool) -> Any:
+    """返回 bigmodel 嵌入函数（dimensions=2）；接口总是返回完整的 4 维向量，不支持时以 400 拒绝 dimensions 参数。"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        payloads.append(payload)
+        if "dimensions" in payload and not supports_dimensions:
+            return httpx.Response(400, json={"error": {"message": "unsupported parameter: dimensions"}})
+        return httpx.Response(200, json={"data": [{"index": i, "embedding": _FULL} for i in range(len(payload["input"]))]})
+
+    real_client = httpx.Client
+    monkeypatch.setattr(httpx, "Client", lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs))
+    return get_embedding_callable(
+        provider="bigmodel", model="embedding-test", base_url="http://embed.test/v4", api_key="k", dimensions=2
+    )
+
+
+def test_fit_dimensions_truncates_and_renormalizes() -> None:
+    """长于目标维度时取前几维并单位化；不长于目标维度、未配置维度或为 None 时原样返回。"""
+    assert fit_dimensions(_FULL, 2) == [0.6, 0.8]
+    assert fit_dimensions(_FULL, 4) is _FULL
+    assert fit_dimensions(_FULL, 0) is _FULL
+    assert fit_dimensions(None, 2) is None
+
+
+def test_dimensions_are_sent_and_enforced_locally(monkeypatch: "MonkeyPatch") -> None:
+    """请求携带 dimensions；接口忽略该参数返回完整向量时仍在本地截断为配置的维度。"""
+    payloads: List[Dict[str, Any]] = []
+    embed = _bigmodel(monkeypatch, payloads, supports_dimensions=True)
+
+    assert embed(["a", "b"]) == [[0.6, 0.8], [0.6, 0.8]]
+    assert [p.get("dimensions") for p in payloads] == [2]
+
+
+def test_rejected_dimensions_fall_back_to_local_truncation(monkeypatch: "MonkeyPatch") -> None:
+    """接口拒绝 dimensions 参数时去掉该参数重试并本地截断，之后的批次不再发送。"""
+    payloads: List[Dict[str, Any]] = []
+    embed = _bigmodel(monkeypatch, payloads, supports_dimensions=False)
+
+    first = embed(["a"])
+    second = embed(["b", "c"])
+
+    assert first == [[0.6, 0.8]] and second == [[0.6, 0.8], [0.6, 0.8]]
+    assert ["dimensions" in p for p in payloads] == [True, False, False]
+
+
+def test_manifest_records_embedding_dimension(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """以截断后的向量建索引：索引与快照 manifest 的维度为截断后的维度，向量仍为单位向量。"""
+
+    def truncated(texts: List[str]) -> List[Optional[List[float]]]:
+        return [fit_dimensions(vec, 4) for vec in fake_embedding(texts)]
+
+    indexer = make_indexer(tmp_path / "index", tmp_path / "notes", truncated, embedding_dimensions=4)
+    indexer.rebuild_index(write_notes(tmp_path / "notes", {"a.md": "# A\nalpha\n", "b.md": "# B\nbravo\n"}))
+
+    assert indexer.index.d == 4
+    assert indexer.list_snapshots()[0]["dimension"] == 4
+    assert all(math.isclose(float((row.astype("float64") ** 2).sum()), 1.0, rel_tol=1e-5) for row in indexer.embeddings)
@@ -0,0 +1,121 @@
+"""
+bigmodel 嵌入的二分重试（_embed_bisect）：坏条目被二分定位并跳过，其余条目照常返回；瞬时错误交给调用方重试。
+"""
+
+import json
+from typing import TYPE_CHECKING, Callable, List
+
+import httpx
+import pytest
+
+from app.api.services.ai_providers import get_embedding_callable
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+
+def _install_transport(monkeypatch: "MonkeyPatch", handler: Callable[[httpx.Request], httpx.Response]) -> None:
+    """让 ai_providers 创建的 httpx.Client 使用 MockTransport。"""
+    real_client = httpx.Client
+    monkeypatch.setattr(httpx, "Client", lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs))
+
+
+def _embed(monkeypatch: "MonkeyPatch", handler: Callable[[httpx.Request], httpx.Response]) -> Callable:
+    """返回使用 handler 作为接口的 bigmodel 嵌入函数。"""
+    _install_transport(monkeypatch, handler)
+    return get_embedding_callable(
+        provider="bigmodel", model="embedding-test", base_url="http://embed.test/v4", api_key="k", dimensions=0
+    )
+
+
+def _rejecting(bad: str, requests: List[List[str]]) -> Callable[[httpx.Request], httpx.Response]:
+    """批次中含 bad 时返回 400（不可重试），否则按输入长度返回向量，并记录每次请求的输入。"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        inputs = json.loads(request.content)["input"]
+        requests.append(inputs)
+        if bad in inputs:
+            return httpx.Response(400, json={"error": {"message": "input rejected"}})
+        return httpx.Response(200, json={
+            "data": [{"index": i, "embedding": [float(len(text)), 1.0]} for i, text in enumerate(inputs)]
+        })
+
+    return handler
+
+
+def test_bisect_skips_only_the_bad_input(monkeypatch: "MonkeyPatch") -> None:
+    """8 条中有 1 条被拒绝：其余 7 条得到向量，坏条目为 None，额外请求数为 O(log n)。"""
+    requests: List[List[str]] = []
+    texts = [f"text-{i}" for i in range(8)]
+    texts[5] = "bad"
+    embed = _embed(monkeypatch, _rejecting("bad", requests))
+
+    results = embed(texts)
+
+    assert results[5] is None
+    assert [r for i, r in enumerate(results) if i != 5] == [[float(len(t)), 1.0] for i, t in enumerate(texts) if i != 5]
+    # 顶层 1 次 + 每层二分 2 次，共 3 层
+    assert len(requests) == 1 + 2 * 3
+    assert ["bad"] in requests
+
+
+def test_all_good_inputs_use_a_single_request(monkeypatch: "MonkeyPatch") -> None:
+    """没有坏条目时只发出一次请求，空白文本不发送、结果为 None。"""
+    requests: List[List[str]] = []
+    embed = _embed(monkeypatch, _rejecting("bad", requests))
+
+    results = embed(["a", "  ", "bc"])
+
+    assert results == [[1.0, 1.0], None, [2.0, 1.0]]
+    assert requests == [["a", "bc"]]
+
+
+def test_retryable_error_at_top_level_is_raised(monkeypatch: "MonkeyPatch") -> None:
+    """顶层请求遇到 5xx 不做二分，直接抛出，由调用方（EmbeddingDispatcher）退避重试。"""
+    requests: List[List[str]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content)["input"])
+        return httpx.Response(503, text="busy")
+
+    embed = _embed(monkeypatch, handler)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        embed(["a", "b", "c"])
+    assert len(requests) == 1
+
+
+def test_several_bad_inputs_are_all_isolated(monkeypatch: "MonkeyPatch") -> None:
+    """多个坏条目分散在批次中时各自被二分定位，其余条目全部得到向量。"""
+    requests: List[List[str]] = []
+    texts = [f"text-{i}" for i in range(16)]
+    texts[2] = texts[11] = "bad"
+    embed = _embed(monkeypatch, _rejecting("bad", requests))
+
+    results = embed(texts)
+
+    assert [i for i, r in enumerate(results) if r is None] == [2, 11]
+    assert all(r == [float(len(t)), 1.0] for t, r in zip(texts, results) if r is not None)
+    assert requests.count(["bad"]) == 2
+
+
+def test_transient_error_during_bisect_is_retried(monkeypatch: "MonkeyPatch") -> None:
+    """二分中的子请求遇到 5xx 时就地退避重试，不会把好条目当作坏条目跳过。"""
+    monkeypatch.setattr("app.utils.retry.time.sleep", lambda seconds: None)
+    requests: List[List[str]] = []
+    reject = _rejecting("bad", requests)
+    busy = {"left": 1}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        inputs = json.loads(request.content)["input"]
+        if len(requests) == 1 and busy["left"]:
+            busy["left"] -= 1
+            requests.append(inputs)
+            return httpx.Response(503, text="busy")
+        return reject(request)
+
+    embed = _embed(monkeypatch, handler)
+    results = embed(["a", "bb", "bad", "dddd"])
+
+    assert busy["left"] == 0
+    assert results == [[1.0, 1.0], [2.0, 1.0], None, [4.0, 1.0]]
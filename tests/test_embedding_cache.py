@@ -0,0 +1,64 @@
+"""
+EmbeddingCache：按 (provider, model, text) 持久化的嵌入缓存，重启后命中、模型变化时失效、超出容量按 LRU 淘汰。
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from app.api.services.embedding_cache import EmbeddingCache
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+
+def test_cache_survives_reopen(tmp_path: Path) -> None:
+    """写入的向量落盘，重新打开同一个库后按文本命中，未写入的文本返回 None。"""
+    db = tmp_path / "cache.sqlite"
+    cache = EmbeddingCache(db, provider="p", model="m")
+    cache.put_many(["alpha", "beta"], [[0.1, 0.2], [0.3, 0.4]])
+
+    reopened = EmbeddingCache(db, provider="p", model="m")
+    found = reopened.get_many(["beta", "gamma", "alpha"])
+
+    assert np.allclose(found[0], [0.3, 0.4]) and found[1] is None and np.allclose(found[2], [0.1, 0.2])
+    assert reopened.stats()["hits"] == 2 and reopened.stats()["misses"] == 1
+
+
+def test_model_change_invalidates(tmp_path: Path) -> None:
+    """以另一个模型打开时清空缓存，不会把其他模型的向量当作命中。"""
+    db = tmp_path / "cache.sqlite"
+    EmbeddingCache(db, provider="p", model="m1").put_many(["alpha"], [[1.0, 0.0]])
+
+    cache = EmbeddingCache(db, provider="p", model="m2")
+
+    assert cache.get_many(["alpha"]) == [None]
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path: Path) -> None:
+    """超出 max_items 时淘汰最久未使用的条目，最近查询过的条目保留。"""
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", provider="p", model="m", max_items=2)
+    cache.put_many(["old"], [[1.0]])
+    cache.put_many(["used"], [[2.0]])
+    cache.get_many(["old"])
+
+    cache.put_many(["new"], [[3.0]])
+
+    assert cache.get_many(["used"]) == [None]
+    assert cache.get_many(["old"])[0] == [1.0] and cache.get_many(["new"])[0] == [3.0]
+
+
+def test_rebuild_after_restart_embeds_nothing(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """开启缓存时，进程重启后的全量重建全部命中缓存，不再请求嵌入接口，得到相同的向量。"""
+    files = write_notes(tmp_path / "notes", {"a.md": "# A\nalpha\n", "b.md": "# B\nbravo\n"})
+    first = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding, enable_embedding_cache=True)
+    first.rebuild_index(files)
+    vectors = np.array(first.embeddings, dtype="float32")
+    assert fake_embedding.calls
+
+    fake_embedding.calls.clear()
+    restarted = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding, enable_embedding_cache=True)
+    restarted.rebuild_index(files)
+
+    assert fake_embedding.calls == []
+    assert np.allclose(np.array(restarted.embeddings, dtype="float32"), vectors)
+    assert restarted.embedding_cache_stats()["hits"] == len(restarted.chunks)
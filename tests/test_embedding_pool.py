@@ -0,0 +1,106 @@
+"""
+EmbeddingDispatcher：批次并发执行、结果按输入顺序产出、瞬时错误重试、失败时停止，以及令牌桶限流。
+"""
+
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, List
+
+import pytest
+
+from app.api.services.embedding_pool import EmbeddingDispatcher
+from app.utils.rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+
+class _StatusError(Exception):
+    """带 HTTP 状态码的接口错误。"""
+
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch: "MonkeyPatch") -> None:
+    """重试不实际等待（替换的是 time.sleep 本身，测试中的耗时改用 _pause）。"""
+    monkeypatch.setattr("app.utils.retry.time.sleep", lambda seconds: None)
+
+
+def _pause(seconds: float) -> None:
+    threading.Event().wait(seconds)
+
+
+def test_batches_run_concurrently_and_yield_in_order() -> None:
+    """批次并发执行（同时在途不超过 concurrency），完成顺序打乱时结果仍按输入顺序产出。"""
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def embed(batch: List[str]) -> List[List[float]]:
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        _pause(random.uniform(0.005, 0.03))
+        with lock:
+            state["active"] -= 1
+        return [[float(text)] for text in batch]
+
+    batches = [[str(i), str(i + 0.5)] for i in range(20)]
+    results = list(EmbeddingDispatcher(embed, concurrency=4).run(iter(batches)))
+
+    assert [batch for batch, _ in results] == batches
+    assert all(emb == [[float(t)] for t in batch] for batch, emb in results)
+    assert 1 < state["peak"] <= 4
+
+
+def test_transient_errors_are_retried() -> None:
+    """429 / 5xx 按退避重试，成功后结果照常返回。"""
+    failures = {"left": 2}
+
+    def flaky(batch: List[str]) -> List[List[float]]:
+        if failures["left"]:
+            failures["left"] -= 1
+            raise _StatusError(503 if failures["left"] else 429)
+        return [[1.0] for _ in batch]
+
+    results = list(EmbeddingDispatcher(flaky, concurrency=1, max_attempts=3).run([["a"]]))
+
+    assert results == [(["a"], [[1.0]])] and failures["left"] == 0
+
+
+def test_permanent_error_stops_the_run() -> None:
+    """不可重试的错误（如 400）不重试，直接抛出，尚未开始的批次不再请求。"""
+    calls: List[List[str]] = []
+
+    def embed(batch: List[str]) -> List[List[float]]:
+        calls.append(batch)
+        if batch == ["bad"]:
+            raise _StatusError(400)
+        _pause(0.01)
+        return [[0.0]]
+
+    batches = [["bad"]] + [[str(i)] for i in range(50)]
+    with pytest.raises(_StatusError):
+        list(EmbeddingDispatcher(embed, concurrency=2, max_attempts=4).run(iter(batches)))
+
+    assert calls.count(["bad"]) == 1
+    assert len(calls) < len(batches)
+
+
+def test_token_bucket_limits_request_rate() -> None:
+    """令牌桶按 rate 个/秒发放：容量 1、每秒 50 个时，6 次请求至少耗时约 0.1 秒；rate <= 0 不限流。"""
+    bucket = TokenBucket(50, capacity=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+
+    assert time.monotonic() - started >= 0.09
+
+    unlimited = TokenBucket(0)
+    started = time.monotonic()
+    for _ in range(1000):
+        unlimited.acquire()
+    assert time.monotonic() - started < 0.05
@@ -0,0 +1,55 @@
+"""
+GitSync.diff_changes：两个提交之间的新增 / 修改 / 删除 / 重命名分类。
+"""
+
+from pathlib import Path
+
+from git import Repo
+
+from app.api.services.git_sync import GitSync
+from tests.conftest import commit_files, rename_file
+
+
+def _repo(tmp_path: Path) -> Repo:
+    """在 tmp_path / "repo" 初始化仓库并提交初始文件。"""
+    repo = Repo.init(tmp_path / "repo")
+    commit_files(repo, "init", write={
+        "keep.md": "# Keep\nunchanged\n",
+        "edit.md": "# Edit\nbefore\n",
+        "gone.md": "# Gone\nto be deleted\n",
+        "dir/move.md": "# Move\n" + "a long enough body so git detects the rename\n" * 5,
+    })
+    return repo
+
+
+def test_diff_changes_classifies_add_modify_delete_rename(tmp_path: Path) -> None:
+    """新增、修改、删除、重命名分别归入 added / modified / deleted / renamed，未变的文件不出现。"""
+    repo = _repo(tmp_path)
+    old = repo.head.commit.hexsha
+    rename_file(repo, "dir/move.md", "dir/moved.md")
+    new = commit_files(repo, "change", write={"edit.md": "# Edit\nafter\n", "new.md": "# New\n"}, remove=["gone.md"])
+
+    changes = GitSync("", str(tmp_path / "repo")).diff_changes(old, new)
+
+    assert changes == {
+        "added": ["new.md"],
+        "modified": ["edit.md"],
+        "deleted": ["gone.md"],
+        "renamed": [{"from": "dir/move.md", "to": "dir/moved.md"}],
+    }
+
+
+def test_diff_changes_same_commit_is_empty(tmp_path: Path) -> None:
+    """两个提交相同时返回空变更，不访问仓库。"""
+    head = _repo(tmp_path).head.commit.hexsha
+
+    changes = GitSync("", str(tmp_path / "repo")).diff_changes(head, head)
+
+    assert changes == {"added": [], "modified": [], "deleted": [], "renamed": []}
+
+
+def test_diff_changes_unknown_commit_returns_none(tmp_path: Path) -> None:
+    """起点提交不存在（如强制推送后）时返回 None，调用方回退到全量重建。"""
+    head = _repo(tmp_path).head.commit.hexsha
+
+    assert GitSync("", str(tmp_path / "repo")).diff_changes("0" * 40, head) is None
@@ -0,0 +1,153 @@
+"""
+后台任务队列：同 key 排队任务合并、取消排队 / 运行中的任务，以及多 worker 通过 JOB_STATE_DIR 共享任务状态
+（两个 JobManager 共用一个目录模拟两个 worker）。
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Tuple
+
+from app.api.routes import analyze
+from app.api.services.jobs import (
+    JOB_CANCELLED,
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    Job,
+    JobManager,
+    SharedJob,
+)
+from app.config.settings import settings
+from app.utils.file_lock import interprocess_lock
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+
+def _wait_for(predicate: Any, timeout: float = 5.0) -> None:
+    done = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        done.wait(0.01)
+    assert predicate(), "condition not reached"
+
+
+def _blocking_job(manager: JobManager, key: str = "block") -> Tuple[Job, threading.Event]:
+    """提交一个运行后等待 release 的任务（等待期间持续上报进度，可被取消），返回 (job, release)。"""
+    release = threading.Event()
+
+    def run(job: Job) -> str:
+        for i in range(500):
+            job.report("embed", i, 500)
+            if release.wait(0.01):
+                return "released"
+        return "timeout"
+
+    job, _ = manager.submit("block", run, coalesce_key=key)
+    _wait_for(lambda: job.status == JOB_RUNNING)
+    return job, release
+
+
+def test_queued_jobs_with_same_key_are_coalesced() -> None:
+    """运行中的任务之后，同 key 的多次提交合并为一个排队任务（累加 triggers），只多执行一次。"""
+    manager = JobManager(workers=1)
+    running, release = _blocking_job(manager)
+    runs = []
+
+    first, merged_first = manager.submit("sync", lambda job: runs.append(1), coalesce_key="sync")
+    second, merged_second = manager.submit("sync", lambda job: runs.append(2), coalesce_key="sync")
+    release.set()
+    _wait_for(lambda: first.status == JOB_SUCCEEDED)
+
+    assert (merged_first, merged_second) == (False, True)
+    assert second is first and first.triggers == 2
+    assert runs == [1]
+    assert running.result == "released"
+
+
+def test_cancel_queued_and_running_jobs() -> None:
+    """取消排队中的任务后它不再执行；运行中的任务在下一个进度检查点停止，状态为 cancelled。"""
+    manager = JobManager(workers=1)
+    running, _ = _blocking_job(manager)
+    ran = []
+    queued, _ = manager.submit("sync", lambda job: ran.append(1), coalesce_key="sync")
+
+    manager.cancel(queued.id)
+    manager.cancel(running.id)
+    _wait_for(lambda: queued.status == JOB_CANCELLED and running.status == JOB_CANCELLED)
+
+    assert ran == [] and running.result is None
+    # 已取消的排队任务不再接受合并，新的提交另建任务
+    fresh, merged = manager.submit("sync", lambda job: "ok", coalesce_key="sync")
+    assert not merged and fresh is not queued
+
+
+def test_other_worker_sees_and_cancels_job(tmp_path: Path) -> None:
+    """共享目录中另一个 worker 能查询任务进度并取消它；pid 只写在磁盘记录里，不在接口返回。"""
+    owner = JobManager(workers=1, shared_dir=tmp_path)
+    other = JobManager(workers=1, shared_dir=tmp_path)
+    job, _ = _blocking_job(owner)
+
+    seen = other.get(job.id)
+    assert isinstance(seen, SharedJob) and seen.status == JOB_RUNNING
+    assert "pid" not in seen.to_dict() and "pid" not in job.to_dict()
+    assert set(seen.to_dict()) == set(job.to_dict())
+    assert "pid" in json.loads((tmp_path / f"{job.id}.json").read_text(encoding="utf-8"))
+    assert [j.id for j in other.list()] == [job.id]
+
+    other.cancel(job.id)
+    _wait_for(lambda: job.status == JOB_CANCELLED)
+    _wait_for(lambda: other.get(job.id).status == JOB_CANCELLED)
+
+
+def test_queued_sync_is_coalesced_across_workers(tmp_path: Path) -> None:
+    """其他 worker 已有排队中的同 key 任务时不再新建，返回该任务；取消后不再合并进来。"""
+    owner = JobManager(workers=1, shared_dir=tmp_path)
+    other = JobManager(workers=1, shared_dir=tmp_path)
+    _, release = _blocking_job(owner)
+    queued, _ = owner.submit("sync", lambda job: "ok", coalesce_key="sync")
+
+    try:
+        job, merged = other.submit("sync", lambda job: "ok", coalesce_key="sync")
+        assert merged and isinstance(job, SharedJob) and job.id == queued.id and job.status == JOB_QUEUED
+
+        owner.cancel(queued.id)
+        fresh, merged = other.submit("sync", lambda job: "ok", coalesce_key="sync")
+        assert not merged and isinstance(fresh, Job)
+    finally:
+        release.set()
+    _wait_for(lambda: fresh.status == JOB_SUCCEEDED)
+
+
+def test_job_of_exited_worker_is_reported_failed(tmp_path: Path) -> None:
+    """所属进程已退出而任务未结束的共享记录，查询时视为失败。"""
+    owner = JobManager(workers=1, shared_dir=tmp_path)
+    job, release = _blocking_job(owner)
+    release.set()
+    _wait_for(lambda: job.status == JOB_SUCCEEDED)
+    record = json.loads((tmp_path / f"{job.id}.json").read_text(encoding="utf-8"))
+    record.update(status=JOB_RUNNING, pid=2 ** 22 + 7)
+    (tmp_path / f"{job.id}.json").write_text(json.dumps(record), encoding="utf-8")
+
+    seen = JobManager(shared_dir=tmp_path).get(job.id)
+
+    assert seen is not None and seen.status == JOB_FAILED
+    assert seen.to_dict()["progress"]["stage"] == JOB_FAILED
+
+
+def test_syncs_are_serialized_through_sync_lock(tmp_path: Path, monkeypatch: "MonkeyPatch") -> None:
+    """配置 JOB_STATE_DIR 时同步主体在共享目录的 sync.lock 内执行：另一个 worker 持有锁期间不会开始 pull。"""
+    monkeypatch.setattr(settings, "JOB_STATE_DIR", str(tmp_path))
+    started = threading.Event()
+    monkeypatch.setattr(analyze, "_sync_locked", lambda job, full: started.set())
+    job = Job("sync", lambda job: None)
+
+    with interprocess_lock(tmp_path / "sync.lock"):
+        thread = threading.Thread(target=analyze._run_sync, args=(job,))
+        thread.start()
+        assert not started.wait(0.2)
+    assert started.wait(5)
+    thread.join(5)
@@ -0,0 +1,59 @@
+"""
+全局服务按需创建：create_app() 只注册路由，不创建索引器 / 笔记存储 / Git 同步 / 任务队列，也不导入 openai 与分块依赖；
+访问函数在并发首次调用时只创建一个实例。
+"""
+
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, List
+
+from app.api.services import jobs
+from app.api.services.jobs import JobManager, get_job_manager
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+_PROBE = """
+import sys
+from app import create_app
+create_app()
+from app.api.services import git_sync, indexer, jobs, notes
+created = [indexer._note_indexer, notes._note, git_sync._git_sync, jobs._job_manager]
+print(sum(obj is not None for obj in created), ",".join(m for m in ("openai", "langchain_text_splitters") if m in sys.modules))
+"""
+
+
+def test_create_app_creates_no_services() -> None:
+    """在干净的子进程中 create_app()：四个全局服务都未创建，openai 与 langchain_text_splitters 未被导入。"""
+    root = Path(__file__).resolve().parents[1]
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=root, capture_output=True, text=True, timeout=120, check=True
+    ).stdout.split()
+
+    assert out == ["0"]
+
+
+def test_accessor_creates_one_instance_under_concurrency(monkeypatch: "MonkeyPatch") -> None:
+    """多个线程同时首次调用访问函数时只创建一个实例；旧的模块属性名仍返回同一个实例。"""
+    monkeypatch.setattr(jobs, "_job_manager", None)
+    created: List[JobManager] = []
+    real_init = JobManager.__init__
+
+    def counting_init(self: JobManager, *args: Any, **kwargs: Any) -> None:
+        created.append(self)
+        threading.Event().wait(0.02)
+        real_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(JobManager, "__init__", counting_init)
+    results: List[JobManager] = []
+    threads = [threading.Thread(target=lambda: results.append(get_job_manager())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(created) == 1
+    assert all(manager is created[0] for manager in results) and len(results) == 8
+    assert jobs.job_manager is created[0]
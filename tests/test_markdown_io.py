@@ -0,0 +1,44 @@
+"""
+match_note_glob：增量同步按路径判断是否为笔记，结果必须与全量同步使用的 Path.glob 一致。
+"""
+
+from pathlib import Path
+
+import pytest
+
+from app.api.services.markdown_io import match_note_glob, read_markdown_files
+
+_FILES = [
+    "root.md",
+    "notes.txt",
+    "a/one.md",
+    "a/b/two.md",
+    "a/b/c/three.md",
+    "x/y.md",
+    "docs/guide.md",
+    "docs/sub/deep.md",
+    ".hidden/h.md",
+]
+
+
+@pytest.mark.parametrize(
+    "pattern", ["**/*.md", "*.md", "*/*.md", "a/**/*.md", "docs/*.md", "**/b/*.md", "a/*/*.md", "**/*.txt"]
+)
+def test_match_note_glob_agrees_with_path_glob(tmp_path: Path, pattern: str) -> None:
+    """对同一组文件，match_note_glob 命中的集合与 read_markdown_files（Path.glob）读出的集合相同。"""
+    for rel in _FILES:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("# note\n", encoding="utf-8")
+
+    globbed = {Path(f["path"]).relative_to(tmp_path).as_posix() for f in read_markdown_files(str(tmp_path), pattern)}
+
+    assert {rel for rel in _FILES if match_note_glob(rel, pattern)} == globbed
+
+
+def test_star_does_not_cross_directories() -> None:
+    """"*" 只匹配一段路径：docs/*.md 不包含子目录中的笔记（fnmatch 的 "*" 会跨越 "/"）。"""
+    assert match_note_glob("docs/guide.md", "docs/*.md")
+    assert not match_note_glob("docs/sub/deep.md", "docs/*.md")
+    assert not match_note_glob("a/b.md", "*.md")
+    assert match_note_glob("a\\b\\c.md", "a/**/*.md")
@@ -0,0 +1,65 @@
+"""
+标量量化存储：fp16 / int8 索引与 float16 保存的向量，int8 候选经 float32 重排序后与不量化的结果一致；
+配置的量化方式与快照不同时用保存的向量重建索引，不重新嵌入。
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.api.services import ann_index
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+_NOTES = {f"n{i:02d}.md": f"# Note {i}\nparagraph about topic {i}\n" for i in range(60)}
+_QUERIES = ["topic 3", "Note 17", "paragraph about topic 42", "# Note 8"]
+
+
+def test_rerank_orders_candidates_by_exact_inner_product() -> None:
+    """重排序用保存的向量重新计算内积并排序，空位（-1）排在最后且 id 为 -1。"""
+    vectors = np.eye(3, dtype="float16")
+    query = np.array([[0.1, 0.9, 0.5]], dtype="float32")
+    ids = np.array([[10, 11, 12, -1]])
+    rows = np.array([[0, 1, 2, -1]])
+
+    scores, top = ann_index.rerank(query, ids, rows, vectors, 4)
+
+    assert top.tolist() == [[11, 12, 10, -1]]
+    assert scores[0, :3] == pytest.approx([0.9, 0.5, 0.1])
+
+
+@pytest.mark.parametrize("quantization", [ann_index.QUANT_FP16, ann_index.QUANT_INT8])
+def test_quantized_index_matches_full_precision(
+    tmp_path: Path, fake_embedding: FakeEmbedding, quantization: str
+) -> None:
+    """量化索引与 float16 向量下的检索顺序与 float32 相同，分数误差在 1e-2 以内。"""
+    files = write_notes(tmp_path / "notes", _NOTES)
+    full = make_indexer(tmp_path / "full", tmp_path / "notes", fake_embedding)
+    quantized = make_indexer(
+        tmp_path / "quantized", tmp_path / "notes", FakeEmbedding(), quantization=quantization, rerank_factor=8
+    )
+    full.rebuild_index(files)
+    quantized.rebuild_index(files)
+
+    assert ann_index.quantization_of(quantized.index) == quantization
+    assert quantized.embeddings.dtype == np.float16
+    for query in _QUERIES:
+        expected = full.search(query, top_k=5)
+        got = quantized.search(query, top_k=5)
+        assert [doc["rel_path"] for doc in got] == [doc["rel_path"] for doc in expected]
+        assert [doc["score"] for doc in got] == pytest.approx([doc["score"] for doc in expected], abs=1e-2)
+
+
+def test_changing_quantization_rebuilds_from_stored_vectors(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """以 int8 重新加载 float32 快照：索引按新的量化方式重建，不发起嵌入请求，检索结果不变。"""
+    note_root = tmp_path / "notes"
+    full = make_indexer(tmp_path / "index", note_root, fake_embedding)
+    full.rebuild_index(write_notes(note_root, _NOTES))
+    expected = [doc["rel_path"] for doc in full.search("topic 3", top_k=5)]
+    reloaded_embedding = FakeEmbedding()
+
+    reloaded = make_indexer(tmp_path / "index", note_root, reloaded_embedding, quantization=ann_index.QUANT_INT8)
+
+    assert ann_index.quantization_of(reloaded.index) == ann_index.QUANT_INT8
+    assert [doc["rel_path"] for doc in reloaded.search("topic 3", top_k=5)] == expected
+    assert reloaded_embedding.texts == ["topic 3"]
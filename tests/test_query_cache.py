@@ -0,0 +1,57 @@
+"""
+QueryEmbeddingCache：重复查询跳过嵌入往返，同批重复查询只嵌入一次，超出容量按 LRU 淘汰、过期条目视为未命中。
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from app.api.services.query_cache import QueryEmbeddingCache
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+
+def test_repeated_queries_skip_embedding(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """同一查询第二次检索命中缓存不再请求嵌入，结果不变；同一批内重复的查询只嵌入一次。"""
+    indexer = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding)
+    indexer.rebuild_index(write_notes(tmp_path / "notes", {"a.md": "# A\nalpha\n", "b.md": "# B\nbravo\n"}))
+    fake_embedding.calls.clear()
+
+    first = indexer.search("alpha", top_k=2)
+    second = indexer.search("alpha", top_k=2)
+    indexer.search_many(["bravo", "bravo", "alpha"], top_k=1)
+
+    assert fake_embedding.calls == [["alpha"], ["bravo"]]
+    assert first == second
+    assert indexer.query_cache_stats()["hits"] >= 2
+
+
+def test_lru_eviction_and_ttl(monkeypatch: "MonkeyPatch") -> None:
+    """超出 max_items 时淘汰最久未使用的查询；超过 ttl_seconds 的条目视为未命中并计入 expired。"""
+    now = {"t": 100.0}
+    monkeypatch.setattr("app.api.services.query_cache.time.monotonic", lambda: now["t"])
+    cache = QueryEmbeddingCache("p", "m", max_items=2, ttl_seconds=10)
+    cache.put_many(["a", "b"], [np.ones(2), np.zeros(2)])
+    cache.get_many(["a"])
+    cache.put_many(["c"], [np.ones(2)])
+
+    assert cache.get_many(["b"]) == [None]
+    assert cache.get_many(["a"])[0] is not None
+
+    now["t"] += 11
+    assert cache.get_many(["a", "c"]) == [None, None]
+    assert cache.stats()["expired"] == 2 and cache.stats()["size"] == 0
+
+
+def test_cached_vectors_are_read_only() -> None:
+    """缓存的是只读副本：调用方修改传入的数组不影响缓存内容。"""
+    cache = QueryEmbeddingCache("p", "m")
+    vec = np.array([1.0, 2.0], dtype="float32")
+    cache.put_many(["q"], [vec])
+    vec[0] = 9.0
+
+    cached = cache.get_many(["q"])[0]
+    assert cached.tolist() == [1.0, 2.0] and not cached.flags.writeable
@@ -0,0 +1,78 @@
+"""
+元数据过滤检索：过滤条件解析，以及各索引类型在精确打分（候选集较小）与位图选择器（候选集较大）两条路径下
+都只返回满足条件的 chunk，且结果与“先全量检索再按条件筛选”一致。
+"""
+
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from app.api.services import ann_index
+from app.api.services.search_filters import SearchFilters
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+_NOTE_COUNT = 240
+
+
+def _note(i: int) -> str:
+    tag = "even" if i % 2 == 0 else "odd"
+    status = "publish" if i % 3 == 0 else "draft"
+    return f"---\ntitle: n{i}\ntags: [{tag}, t{i % 5}]\nstatus: {status}\n---\n# Note {i}\nbody text number {i}\n"
+
+
+def _rel_path(i: int) -> str:
+    return f"{'projects' if i % 4 == 0 else 'archive'}/n{i}.md"
+
+
+def test_parse_combines_fields_with_and_values_with_or() -> None:
+    """同一字段的多个取值为“或”（可逗号分隔），不同字段之间为“且”；没有条件时返回 None，类型不合法时报错。"""
+    filters = SearchFilters.parse(tags=["a, b"], path_prefix="./projects/", status=" Publish ")
+
+    assert filters.tags == ("a", "b") and filters.path_prefixes == ("projects/",) and filters.status == "publish"
+    assert filters.matches({"tags": ["b"], "rel_path": "projects/x.md", "status": "publish"})
+    assert not filters.matches({"tags": ["c"], "rel_path": "projects/x.md", "status": "publish"})
+    assert not filters.matches({"tags": ["a"], "rel_path": "archive/x.md", "status": "publish"})
+    assert SearchFilters.parse(tags=[], path_prefix=None, status="") is None
+    with pytest.raises(ValueError):
+        SearchFilters.parse(tags=[1])
+
+
+@pytest.mark.parametrize("exact_max", [0, 100000], ids=["selector", "exact"])
+@pytest.mark.parametrize("index_type", [ann_index.INDEX_FLAT, ann_index.INDEX_IVF_FLAT, ann_index.INDEX_HNSW])
+def test_filtered_search_matches_post_filtered_results(
+    tmp_path: Path, fake_embedding: FakeEmbedding, index_type: str, exact_max: int
+) -> None:
+    """过滤检索返回 top_k 条满足条件的结果，与全量检索后按条件筛选的前 top_k 条相同。"""
+    notes = {_rel_path(i): _note(i) for i in range(_NOTE_COUNT)}
+    indexer = make_indexer(
+        tmp_path / "index", tmp_path / "notes", fake_embedding,
+        index_type=index_type, filter_exact_max=exact_max, ann_build_params={"nlist": 4},
+        nprobe=4, ef_search=512,
+    )
+    indexer.rebuild_index(write_notes(tmp_path / "notes", notes))
+    assert ann_index.index_type_of(indexer.index) == index_type
+
+    cases: List[SearchFilters] = [
+        SearchFilters(tags=["even"]),
+        SearchFilters(tags=["t1", "t2"], status="publish"),
+        SearchFilters(path_prefixes=["projects/"], status="draft"),
+    ]
+    for filters in cases:
+        for query in ("body text number 7", "Note 42"):
+            everything = indexer.search(query, top_k=len(indexer.chunks))
+            expected = [doc["rel_path"] for doc in everything if filters.matches(doc)][:5]
+
+            got = indexer.search(query, top_k=5, filters=filters)
+
+            assert [doc["rel_path"] for doc in got] == expected
+            assert len(got) == 5 and all(filters.matches(doc) for doc in got)
+
+
+def test_filter_without_matches_returns_nothing(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """没有 chunk 满足条件时返回空列表，而不是退回未过滤的结果。"""
+    indexer = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding)
+    indexer.rebuild_index(write_notes(tmp_path / "notes", {"a.md": _note(0), "b.md": _note(1)}))
+
+    assert indexer.search("Note", top_k=3, filters=SearchFilters(tags=["missing"])) == []
+    assert {doc["rel_path"] for doc in indexer.search("Note", top_k=3, filters=SearchFilters(tags=["odd"]))} == {"b.md"}
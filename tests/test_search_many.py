@@ -0,0 +1,62 @@
+"""
+批量检索：search_many 一次嵌入所有查询、单次 FAISS 检索，结果与逐条 search 一致；POST /api/search 接口。
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from app import create_app
+from app.api.services.indexer import NoteIndexer
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+_NOTES = {f"n{i}.md": f"# Note {i}\ntopic {i} details about item {i}\n" for i in range(10)}
+
+
+@pytest.fixture
+def search_indexer(tmp_path: Path, fake_embedding: FakeEmbedding) -> NoteIndexer:
+    """已索引 10 篇笔记、关闭查询向量缓存（每次检索都请求嵌入）的索引器。"""
+    indexer = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding, query_cache_max_items=0)
+    indexer.rebuild_index(write_notes(tmp_path / "notes", _NOTES))
+    fake_embedding.calls.clear()
+    return indexer
+
+
+def test_search_many_matches_single_searches(search_indexer: NoteIndexer, fake_embedding: FakeEmbedding) -> None:
+    """批量结果与逐条检索一致、顺序与 queries 对应；所有查询在一次嵌入请求中完成，空查询得到空列表。"""
+    queries = ["topic 3", "", "item 7 details", "Note 1"]
+
+    batched = search_indexer.search_many(queries, top_k=3)
+
+    assert len(fake_embedding.calls) == 1 and fake_embedding.calls[0] == ["topic 3", "item 7 details", "Note 1"]
+    assert batched[1] == []
+    for query, result in zip(queries, batched):
+        if query:
+            assert result == search_indexer.search(query, top_k=3)
+
+
+def test_unknown_mode_is_rejected(search_indexer: NoteIndexer) -> None:
+    """未知的检索模式直接报错，而不是静默回退。"""
+    with pytest.raises(ValueError):
+        search_indexer.search_many(["topic"], mode="fuzzy")
+
+
+def test_post_search_route(search_indexer: NoteIndexer, monkeypatch: "MonkeyPatch") -> None:
+    """POST /api/search 返回与 queries 对应的结果列表；参数不合法时返回 400。"""
+    monkeypatch.setattr("app.api.routes.search.get_note_indexer", lambda: search_indexer)
+    client = create_app().test_client()
+
+    response = client.post("/api/search", json={"queries": ["topic 2", "item 5"], "top_k": 2})
+
+    assert response.status_code == 200
+    result = response.get_json()["result"]
+    assert len(result) == 2 and all(len(hits) == 2 for hits in result)
+    assert result[0] == search_indexer.search("topic 2", top_k=2)
+
+    assert client.post("/api/search", json={"queries": []}).status_code == 400
+    assert client.post("/api/search", json={"queries": ["a"], "top_k": "x"}).status_code == 400
+    assert client.post("/api/search", json={"queries": ["a"], "mode": "fuzzy"}).status_code == 400
@@ -0,0 +1,64 @@
+"""
+只读共享索引（INDEX_READ_ONLY）：没有增量日志时 Flat 直接在内存映射的向量矩阵上打分、IVF 映射倒排表，
+检索结果与可写进程一致；存在增量日志时读入进程内存；只读进程拒绝写操作。
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.api.services import ann_index
+from app.api.services.search_filters import SearchFilters
+from tests.conftest import FakeEmbedding, make_indexer, write_notes
+
+_NOTES = {
+    f"{'projects' if i % 2 else 'archive'}/n{i}.md": f"---\ntitle: n{i}\n---\n# Note {i}\nbody text number {i}\n"
+    for i in range(60)
+}
+_QUERIES = ["body text number 7", "Note 42", "# Note 3"]
+
+
+def _writer_and_reader(tmp_path: Path, index_type: str):
+    note_root = tmp_path / "notes"
+    writer = make_indexer(tmp_path / "index", note_root, FakeEmbedding(), index_type=index_type, query_cache_max_items=0)
+    writer.rebuild_index(write_notes(note_root, _NOTES))
+    reader = make_indexer(tmp_path / "index", note_root, FakeEmbedding(), read_only=True, query_cache_max_items=0)
+    return writer, reader
+
+
+def test_read_only_flat_scores_mapped_vectors(tmp_path: Path) -> None:
+    """只读 Flat 不读入 FAISS 副本：检索直接使用映射的向量矩阵，结果与分数（含过滤检索）与写进程一致。"""
+    writer, reader = _writer_and_reader(tmp_path, ann_index.INDEX_FLAT)
+
+    assert isinstance(reader.index, ann_index.MappedFlatIndex)
+    assert isinstance(reader.index.vectors, np.memmap) and reader.store.index_mmapped
+    filters = SearchFilters(path_prefixes=["projects/"])
+    # 只读进程走位图（掩码）路径，写进程走候选集精确打分路径
+    reader.filter_exact_max = 0
+    for query in _QUERIES:
+        assert reader.search(query, top_k=5) == writer.search(query, top_k=5)
+        assert reader.search(query, top_k=5, filters=filters) == writer.search(query, top_k=5, filters=filters)
+    with pytest.raises(RuntimeError):
+        reader.remove_files(["archive/n0.md"])
+
+
+def test_read_only_ivf_maps_inverted_lists(tmp_path: Path) -> None:
+    """只读 IVF 以内存映射方式打开倒排表，检索结果与写进程一致。"""
+    writer, reader = _writer_and_reader(tmp_path, ann_index.INDEX_IVF_FLAT)
+    writer.nprobe = reader.nprobe = 64
+
+    assert ann_index.index_type_of(reader.index) == ann_index.INDEX_IVF_FLAT and reader.store.index_mmapped
+    for query in _QUERIES:
+        assert reader.search(query, top_k=5) == writer.search(query, top_k=5)
+
+
+def test_pending_delta_loads_private_index(tmp_path: Path) -> None:
+    """写进程追加增量后，只读进程重新加载时读入进程内存的 FAISS 索引，并看到增量的修改。"""
+    writer, reader = _writer_and_reader(tmp_path, ann_index.INDEX_FLAT)
+    writer.upsert_files(write_notes(tmp_path / "notes", {"new.md": "# New\nfreshly added chunk\n"}))
+
+    assert reader.reload_if_changed()
+
+    assert not isinstance(reader.index, ann_index.MappedFlatIndex) and not reader.store.index_mmapped
+    assert reader.search("# New\nfreshly added chunk", top_k=1)[0]["rel_path"] == "new.md"
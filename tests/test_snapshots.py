@@ -0,0 +1,80 @@
+"""
+索引快照：保留最近 keep_snapshots 份、回滚到上一份或指定版本、当前快照损坏时回退，以及索引器回滚后的内存状态。
+"""
+
+from pathlib import Path
+
+import pytest
+
+from app.api.services.vector_store import VectorStore
+from tests.conftest import FakeEmbedding, loaded_texts, make_indexer, save_snapshot, write_notes
+
+
+def test_only_recent_snapshots_are_kept(tmp_path: Path) -> None:
+    """超出 keep_snapshots 的旧快照在保存时删除，list_snapshots 从新到旧列出并标记当前快照。"""
+    store = VectorStore(tmp_path, keep_snapshots=2)
+    versions = [save_snapshot(store, list(range(n + 1))) for n in range(4)]
+
+    listed = store.list_snapshots()
+
+    assert [s["version"] for s in listed] == versions[:1:-1]
+    assert [s["current"] for s in listed] == [True, False]
+    assert sorted(p.name for p in (tmp_path / "snapshots").iterdir()) == versions[2:]
+
+
+def test_rollback_restores_previous_snapshot(tmp_path: Path) -> None:
+    """回滚把指针切回上一份快照，重新加载得到该快照的内容与 source_head。"""
+    store = VectorStore(tmp_path)
+    first = save_snapshot(store, [0, 1], source_head="c1")
+    save_snapshot(store, [0, 1, 2, 3], source_head="c2")
+    version_before = store.read_version()
+
+    assert store.rollback() == first
+    texts = loaded_texts(store)
+
+    assert sorted(texts) == [0, 1]
+    assert store.source_head == "c1"
+    assert store.read_version() != version_before
+
+
+def test_rollback_without_older_snapshot_fails(tmp_path: Path) -> None:
+    """只有一份快照时回滚报错，指针不变。"""
+    store = VectorStore(tmp_path)
+    version = save_snapshot(store, [0])
+
+    with pytest.raises(ValueError):
+        store.rollback()
+    assert store.rollback(version) == version
+
+
+def test_corrupt_snapshot_falls_back_to_previous(tmp_path: Path) -> None:
+    """当前快照文件损坏时加载回退到上一份可用快照，并改写指针。"""
+    store = VectorStore(tmp_path)
+    first = save_snapshot(store, [0, 1])
+    second = save_snapshot(store, [0, 1, 2])
+    (tmp_path / "snapshots" / second / "faiss_vectors.npy").write_bytes(b"corrupt")
+
+    reopened = VectorStore(tmp_path)
+    texts = loaded_texts(reopened)
+
+    assert sorted(texts) == [0, 1]
+    assert reopened.current is not None and reopened.current.name == first
+    assert (tmp_path / "CURRENT").read_text(encoding="utf-8").strip() == first
+
+
+def test_indexer_rollback_swaps_in_previous_state(tmp_path: Path, fake_embedding: FakeEmbedding) -> None:
+    """索引器回滚后检索结果回到上一份快照（全量重建各写一份快照），不重新嵌入；另一个进程打开同一目录时也加载回滚后的版本。"""
+    note_root = tmp_path / "notes"
+    indexer = make_indexer(tmp_path / "index", note_root, fake_embedding)
+    indexer.rebuild_index(write_notes(note_root, {"a.md": "# A\nalpha\n"}))
+    indexer.rebuild_index(write_notes(note_root, {"a.md": "# A\nalpha\n", "b.md": "# B\nbravo\n"}))
+    assert {doc["rel_path"] for doc in indexer.search("bravo", top_k=5)} == {"a.md", "b.md"}
+    fake_embedding.calls.clear()
+
+    result = indexer.rollback()
+
+    assert result["chunks"] == 1
+    assert [doc["rel_path"] for doc in indexer.search("bravo", top_k=5)] == ["a.md"]
+    assert fake_embedding.calls == [["bravo"]]
+    reopened = make_indexer(tmp_path / "index", note_root, fake_embedding)
+    assert len(reopened.chunks) == 1
@@ -0,0 +1,135 @@
+"""
+本地 OpenAI 兼容桩服务（benchmarks/stub_openai.py）：在随机端口启动，经应用的嵌入封装与 openai SDK 访问，
+检查确定性嵌入（dimensions、base64）、工具调用往返、流式与非流式回复一致，以及错误注入。
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, List
+
+import httpx
+import numpy as np
+import pytest
+from openai import OpenAI
+
+from app.api.services.ai_providers import get_embedding_callable
+from benchmarks.stub_openai import build_parser, embed_text, make_server
+
+_TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "search_notes",
+        "parameters": {
+            "type": "object",
+            "properties": {"query": {"type": "string"}, "top_k": {"type": "integer", "default": 5}},
+            "required": ["query"],
+        },
+    },
+}]
+
+
+@contextmanager
+def _serve(*flags: str) -> Iterator[str]:
+    """在随机端口启动桩服务（无延迟），产出 base_url，结束时关闭。"""
+    args = build_parser().parse_args(
+        ["--port", "0", "--latency-ms", "0", "--token-rate", "0", "--embedding-latency-ms", "0",
+         "--embedding-ms-per-input", "0", "--dim", "64", *flags]
+    )
+    server, _ = make_server(args)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
+
+
+@pytest.fixture
+def stub_url() -> Iterator[str]:
+    with _serve() as url:
+        yield url
+
+
+@pytest.mark.parametrize("provider", ["bigmodel", "openai"])
+def test_embeddings_are_deterministic_and_honour_dimensions(stub_url: str, provider: str) -> None:
+    """
+    bigmodel（JSON 数组）与 openai SDK（默认 base64）两条路径得到相同的单位向量，维度取请求的 dimensions；
+    共享词项的文本更相似，空白文本对应 None。
+    """
+    embed = get_embedding_callable(provider, "stub", base_url=stub_url, api_key="stub", dimensions=32)
+    texts = ["faiss 向量索引", "faiss 向量检索", "番茄炒蛋", "  "]
+
+    first = embed(texts)
+    assert embed(texts) == first
+    assert first[3] is None
+    vectors = np.array(first[:3], dtype="float32")
+    assert vectors.shape == (3, 32)
+    np.testing.assert_allclose(vectors[0], embed_text(texts[0], 32), atol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_tool_call_round_trip(stub_url: str) -> None:
+    """带 tools 时先返回工具调用（必填字符串参数取用户消息，其余取默认值）；收到工具结果后返回文本。"""
+    client = OpenAI(base_url=stub_url, api_key="stub")
+    messages: List[Any] = [{"role": "user", "content": "最近的读书笔记"}]
+
+    first = client.chat.completions.create(model="stub", messages=messages, tools=_TOOLS)
+    choice = first.choices[0]
+    assert choice.finish_reason == "tool_calls"
+    call = choice.message.tool_calls[0]
+    assert call.function.name == "search_notes"
+    assert json.loads(call.function.arguments) == {"query": "最近的读书笔记", "top_k": 5}
+
+    messages += [
+        {"role": "assistant", "content": None, "tool_calls": [call.model_dump()]},
+        {"role": "tool", "tool_call_id": call.id, "content": "[]"},
+    ]
+    second = client.chat.completions.create(model="stub", messages=messages, tools=_TOOLS)
+    assert second.choices[0].finish_reason == "stop"
+    assert second.choices[0].message.content
+
+
+def test_stream_matches_non_stream(stub_url: str) -> None:
+    """同一请求流式逐段拼接的文本与非流式回复相同，max_tokens 限制回复长度，include_usage 时最后返回用量。"""
+    client = OpenAI(base_url=stub_url, api_key="stub")
+    messages: List[Any] = [{"role": "user", "content": "总结一下向量索引"}]
+
+    whole = client.chat.completions.create(model="stub", messages=messages, max_tokens=8)
+    chunks = list(client.chat.completions.create(
+        model="stub", messages=messages, max_tokens=8, stream=True, stream_options={"include_usage": True}
+    ))
+
+    text = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+    assert text == whole.choices[0].message.content
+    assert len(text.split()) == 8 == whole.usage.completion_tokens
+    assert [c.choices[0].finish_reason for c in chunks if c.choices][-1] == "stop"
+    assert chunks[-1].usage.completion_tokens == 8
+
+
+def test_streamed_tool_call_arguments_reassemble(stub_url: str) -> None:
+    """流式工具调用先发 id 与函数名，参数分片输出，按 index 拼接后是完整的 JSON。"""
+    client = OpenAI(base_url=stub_url, api_key="stub")
+    messages: List[Any] = [{"role": "user", "content": "查找关于 faiss.IndexIVFFlat 倒排索引参数调优的全部笔记"}]
+    chunks = list(client.chat.completions.create(model="stub", messages=messages, tools=_TOOLS, stream=True))
+
+    calls = [call for c in chunks for call in (c.choices[0].delta.tool_calls or [])]
+    assert calls[0].id and calls[0].function.name == "search_notes"
+    assert len(calls) > 2
+    arguments = json.loads("".join(call.function.arguments or "" for call in calls))
+    assert arguments["query"] == messages[0]["content"]
+    assert chunks[-1].choices[0].finish_reason == "tool_calls"
+
+
+def test_injected_errors() -> None:
+    """error_rate=1 时每个请求都返回注入的错误，429 带 Retry-After；计数在 /health 中可见。"""
+    with _serve("--error-rate", "1", "--error-status", "429") as url:
+        resp = httpx.post(f"{url}/embeddings", json={"model": "stub", "input": ["a"]})
+        assert resp.status_code == 429 and resp.headers["Retry-After"] == "1"
+        assert resp.json()["error"]["code"] == "stub_injected_error"
+
+        counters = httpx.get(f"{url}/health").json()["counters"]
+        assert counters["embeddings"] == 1 and counters["errors"] == 1
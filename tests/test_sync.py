@@ -0,0 +1,246 @@
+"""
+/api/sync 的同步主体（_run_sync）：首次全量、按索引记录的提交增量更新，失败 / 取消后下一次同步补齐，
+以及被嵌入接口跳过的文件的重试。
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import pytest
+from git import Repo
+
+from app.api.routes import analyze
+from app.api.services.git_sync import GitSync
+from app.api.services.indexer import NoteIndexer
+from app.api.services.jobs import Job, JobCancelled
+from app.config.settings import settings
+from tests.conftest import FakeEmbedding, commit_files, make_indexer, rename_file
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+
+@pytest.fixture
+def upstream(tmp_path: Path) -> Repo:
+    """作为远端的笔记仓库，初始包含四篇笔记与一个非 Markdown 文件。"""
+    repo = Repo.init(tmp_path / "upstream")
+    commit_files(repo, "init", write={
+        "a.md": "# A\nalpha one\n",
+        "b.md": "# B\nbravo one\n",
+        "keep.md": "# Keep\nkilo\n",
+        "dir/d.md": "# D\n" + "delta body that is long enough for rename detection\n" * 5,
+        "readme.txt": "not a note",
+    })
+    return repo
+
+
+@pytest.fixture
+def sync_env(
+    tmp_path: Path, upstream: Repo, indexer: NoteIndexer, monkeypatch: "MonkeyPatch"
+) -> GitSync:
+    """让 _run_sync 使用临时目录中的仓库克隆与索引器，返回 GitSync。"""
+    git_sync = GitSync(str(upstream.working_dir), str(tmp_path / "notes"), branch=upstream.active_branch.name)
+    monkeypatch.setattr(analyze, "get_git_sync", lambda: git_sync)
+    monkeypatch.setattr(analyze, "get_note_indexer", lambda: indexer)
+    monkeypatch.setattr(settings, "NOTE_LOCAL_PATH", str(tmp_path / "notes"))
+    monkeypatch.setattr(settings, "NOTE_FILE_GLOB", "**/*.md")
+    return git_sync
+
+
+def _sync(full: bool = False, job: Optional[Job] = None) -> Dict[str, Any]:
+    """执行一次同步。"""
+    return analyze._run_sync(job or Job("sync", lambda job: None), full)
+
+
+def _indexed_texts(indexer: NoteIndexer) -> Dict[str, List[str]]:
+    """{rel_path: [chunk 文本]}。"""
+    texts: Dict[str, List[str]] = {}
+    for entry in indexer.chunks:
+        texts.setdefault(entry["metadata"]["rel_path"], []).append(entry["text"])
+    return texts
+
+
+def test_first_sync_is_full_and_records_head(
+    sync_env: GitSync, upstream: Repo, indexer: NoteIndexer
+) -> None:
+    """索引为空时全量重建，只索引 Markdown，并记录索引对应的提交。"""
+    result = _sync()
+
+    assert result["mode"] == "full"
+    assert sorted(_indexed_texts(indexer)) == ["a.md", "b.md", "dir/d.md", "keep.md"]
+    assert indexer.source_head == upstream.head.commit.hexsha == result["new_head"]
+
+
+def test_incremental_sync_applies_only_the_diff(
+    sync_env: GitSync, upstream: Repo, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """第二次同步按 source_head..新 HEAD 的 diff 更新：修改与新增的笔记重新嵌入，删除与重命名的旧路径移出。"""
+    _sync()
+    rename_file(upstream, "dir/d.md", "dir/e.md")
+    new_head = commit_files(
+        upstream, "change",
+        write={"a.md": "# A\nalpha two\n", "c.md": "# C\ncharlie\n", "readme.txt": "still not a note"},
+        remove=["b.md"],
+    )
+    fake_embedding.calls.clear()
+
+    result = _sync()
+
+    assert result["mode"] == "incremental"
+    assert result["changes"] == {
+        "added": ["c.md"],
+        "modified": ["a.md"],
+        "deleted": ["b.md"],
+        "renamed": [{"from": "dir/d.md", "to": "dir/e.md"}],
+    }
+    texts = _indexed_texts(indexer)
+    assert sorted(texts) == ["a.md", "c.md", "dir/e.md", "keep.md"]
+    assert any("alpha two" in text for text in texts["a.md"])
+    # 只有 diff 中的笔记会被读取与嵌入，未变的 keep.md 不再请求嵌入接口
+    assert fake_embedding.texts
+    assert not any("kilo" in text for text in fake_embedding.texts)
+    assert indexer.source_head == new_head
+
+
+def test_sync_without_changes_keeps_index(
+    sync_env: GitSync, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """没有新提交时为空的增量同步，不调用嵌入接口。"""
+    _sync()
+    fake_embedding.calls.clear()
+
+    result = _sync()
+
+    assert result["mode"] == "incremental"
+    assert result["changes"]["modified"] == [] and fake_embedding.calls == []
+
+
+def test_failed_embedding_keeps_head_and_next_sync_retries(
+    sync_env: GitSync, upstream: Repo, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """嵌入失败时任务报错、索引记录的提交不前进；pull 已完成的情况下，下一次同步仍会重新嵌入该文件。"""
+    _sync()
+    indexed_head = indexer.source_head
+    new_head = commit_files(upstream, "edit", write={"a.md": "# A\nalpha two\n"})
+    fake_embedding.fail = True
+
+    with pytest.raises(RuntimeError):
+        _sync()
+    assert indexer.source_head == indexed_head
+
+    fake_embedding.fail = False
+    result = _sync()
+
+    assert result["old_head"] == result["new_head"] == new_head
+    assert result["changes"]["modified"] == ["a.md"]
+    assert any("alpha two" in text for text in _indexed_texts(indexer)["a.md"])
+    assert indexer.source_head == new_head
+
+
+def test_skipped_chunks_are_retried_by_the_next_sync(
+    sync_env: GitSync, upstream: Repo, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """嵌入接口跳过个别 chunk 时其余文件照常写入、提交照常前进，任务部分成功，下一次同步补齐被跳过的文件。"""
+    _sync()
+    new_head = commit_files(upstream, "edit", write={"a.md": "# A\nalpha poison\n", "c.md": "# C\ncharlie\n"})
+    fake_embedding.skip = {"poison"}
+
+    result = _sync()
+
+    assert result["partial"] is True and result["skipped_files"] == {"a.md": 1}
+    assert "c.md" in _indexed_texts(indexer)
+    assert indexer.source_head == new_head
+
+    fake_embedding.skip = set()
+    fake_embedding.calls.clear()
+    result = _sync()
+
+    assert result["retried"] == ["a.md"] and result["partial"] is False
+    assert any("alpha poison" in text for text in _indexed_texts(indexer)["a.md"])
+    assert not any("charlie" in text for text in fake_embedding.texts)
+    assert indexer.retry_paths == {}
+
+
+def test_skip_that_never_clears_stops_after_retry_limit(
+    tmp_path: Path, sync_env: GitSync, upstream: Repo, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """接口始终拒绝的 chunk：每次同步都是增量的，只重试该文件，超过重试上限后不再请求，文件修改后重新嵌入。"""
+    indexer.retry_limit = 2
+    _sync()
+    commit_files(upstream, "edit", write={"a.md": "# A\nalpha poison\n"})
+    fake_embedding.skip = {"poison"}
+
+    attempts = []
+    for _ in range(4):
+        fake_embedding.calls.clear()
+        result = _sync()
+        assert result["mode"] == "incremental" and result["partial"] is True
+        assert all("poison" in text for text in fake_embedding.texts)
+        attempts.append((result["skipped_files"]["a.md"], len(fake_embedding.calls)))
+
+    # 第一次来自 diff，之后两次来自重试列表，超过上限后不再请求嵌入接口
+    assert attempts == [(1, 1), (2, 1), (3, 1), (3, 0)]
+    assert indexer.pending_retries() == []
+    # 重试列表随索引落盘
+    reloaded = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding)
+    assert reloaded.retry_paths == {"a.md": 3}
+
+    head = commit_files(upstream, "fix", write={"a.md": "# A\nalpha fixed\n"})
+    result = _sync()
+
+    assert result["partial"] is False and result["skipped_files"] == {}
+    assert any("alpha fixed" in text for text in _indexed_texts(indexer)["a.md"])
+    assert indexer.source_head == head
+
+
+def test_cancelled_sync_resumes_from_indexed_head(
+    sync_env: GitSync, upstream: Repo, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """pull 之后、嵌入期间取消：索引不变，下一次同步从记录的提交重新比较。"""
+    _sync()
+    indexed_head = indexer.source_head
+    new_head = commit_files(upstream, "edit", write={"b.md": "# B\nbravo two\n"})
+    job = Job("sync", lambda job: None)
+
+    def cancel_during_embedding(texts: List[str]) -> List[Optional[List[float]]]:
+        job.cancel()
+        return fake_embedding(texts)
+
+    indexer.embedding_fn = cancel_during_embedding
+    with pytest.raises(JobCancelled):
+        _sync(job=job)
+    assert indexer.source_head == indexed_head
+    assert all("bravo two" not in text for text in _indexed_texts(indexer)["b.md"])
+
+    indexer.embedding_fn = fake_embedding
+    result = _sync()
+
+    assert result["changes"]["modified"] == ["b.md"]
+    assert indexer.source_head == new_head
+
+
+def test_unknown_indexed_head_falls_back_to_full(
+    sync_env: GitSync, indexer: NoteIndexer
+) -> None:
+    """记录的提交在仓库中不存在（如强制推送）时全量重建。"""
+    _sync()
+    indexer.set_source_head("f" * 40)
+
+    result = _sync()
+
+    assert result["mode"] == "full"
+    assert indexer.source_head == result["new_head"]
+
+
+def test_source_head_survives_reload(
+    tmp_path: Path, sync_env: GitSync, upstream: Repo, indexer: NoteIndexer, fake_embedding: FakeEmbedding
+) -> None:
+    """增量同步记录的提交随增量日志落盘，重新加载索引后仍然可用。"""
+    _sync()
+    new_head = commit_files(upstream, "edit", write={"a.md": "# A\nalpha two\n"})
+    _sync()
+
+    reloaded = make_indexer(tmp_path / "index", tmp_path / "notes", fake_embedding)
+
+    assert reloaded.source_head == new_head
+    assert _indexed_texts(reloaded) == _indexed_texts(indexer)
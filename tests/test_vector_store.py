@@ -0,0 +1,147 @@
+"""
+VectorStore：二进制快照（.npy 向量 + SQLite 元数据）的保存 / 加载与旧格式迁移（含旧版 uuid chunk_id），
+以及索引对应提交（source_head）的记录、不持锁加载时不修复增量日志。
+"""
+
+import json
+import sqlite3
+import uuid
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.api.services.vector_store import VectorStore
+from tests.conftest import delta_entries, save_snapshot, store_vectors
+
+
+def test_save_and_load_roundtrip(tmp_path: Path) -> None:
+    """保存后重新加载得到同样的 chunk、向量与 manifest 信息。"""
+    store = VectorStore(tmp_path)
+    version = save_snapshot(store, [0, 1, 2], source_head="abc")
+
+    reopened = VectorStore(tmp_path)
+    loaded = reopened.load(mmap=False)
+
+    assert loaded is not None
+    _, chunks, embeddings = loaded
+    assert chunks.ids.tolist() == [0, 1, 2]
+    assert np.allclose(embeddings, store_vectors([0, 1, 2]))
+    assert reopened.current is not None and reopened.current.name == version
+    assert reopened.source_head == "abc"
+    assert [s["count"] for s in reopened.list_snapshots()] == [3]
+
+
+def test_load_without_snapshot_returns_none(tmp_path: Path) -> None:
+    """没有快照时 load() 返回 None。"""
+    assert VectorStore(tmp_path).load() is None
+
+
+def test_snapshot_is_binary(tmp_path: Path) -> None:
+    """向量以 float32 的 .npy 保存（加载时内存映射），元数据在 SQLite 中按 pos 与向量行对应，不再写 JSON。"""
+    store = VectorStore(tmp_path)
+    version = save_snapshot(store, [5, 7])
+    snapshot = tmp_path / "snapshots" / version
+
+    vectors = np.load(str(snapshot / "faiss_vectors.npy"))
+    conn = sqlite3.connect(str(snapshot / "faiss_meta.sqlite"))
+    rows = conn.execute("SELECT pos, id, metadata FROM chunks ORDER BY pos").fetchall()
+    conn.close()
+
+    assert vectors.dtype == np.float32 and np.allclose(vectors, store_vectors([5, 7]))
+    assert [(pos, chunk_id) for pos, chunk_id, _ in rows] == [(0, 5), (1, 7)]
+    assert json.loads(rows[1][2])["rel_path"] == "n7.md"
+    assert not list(tmp_path.rglob("faiss_meta.json"))
+    loaded = VectorStore(tmp_path).load()
+    assert loaded is not None and isinstance(loaded[2], np.memmap)
+
+
+def test_legacy_json_metadata_is_migrated(tmp_path: Path) -> None:
+    """旧版 faiss_meta.json（文本 + 元数据 + JSON 向量）在首次加载时迁移为快照，原文件改名为 .bak。"""
+    vecs = store_vectors([0, 1, 2])
+    legacy = [
+        {"text": f"legacy {i}", "metadata": {"rel_path": f"l{i}.md"}, "embedding": (vec * 3).tolist()}
+        for i, vec in enumerate(vecs)
+    ]
+    (tmp_path / "faiss_meta.json").write_text(json.dumps(legacy), encoding="utf-8")
+    flat = faiss.IndexFlatIP(vecs.shape[1])
+    flat.add(vecs)
+    faiss.write_index(flat, str(tmp_path / "faiss.index"))
+
+    store = VectorStore(tmp_path)
+    loaded = store.load()
+
+    assert loaded is not None
+    index, chunks, embeddings = loaded
+    assert [chunks.text(pos) for pos in range(len(chunks))] == ["legacy 0", "legacy 1", "legacy 2"]
+    # 迁移时重新单位化
+    assert np.allclose(embeddings, vecs, atol=1e-6)
+    assert index.ntotal == 3
+    assert (tmp_path / "faiss_meta.json.bak").exists() and not (tmp_path / "faiss.index").exists()
+    assert store.current is not None and (store.current / "faiss_meta.sqlite").exists()
+
+
+def test_legacy_uuid_chunk_ids_are_not_truncated(tmp_path: Path) -> None:
+    """旧版索引的 uuid4 chunk_id（36 字符）在迁移与重新加载后保持完整，不被截断为 32 字节。"""
+    vecs = store_vectors([0, 1])
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(2)]
+    legacy = [
+        {"text": f"legacy {i}", "metadata": {"rel_path": f"l{i}.md", "chunk_id": ids[i]}, "embedding": vec.tolist()}
+        for i, vec in enumerate(vecs)
+    ]
+    (tmp_path / "faiss_meta.json").write_text(json.dumps(legacy), encoding="utf-8")
+    faiss.write_index(faiss.IndexFlatIP(vecs.shape[1]), str(tmp_path / "faiss.index"))
+    VectorStore(tmp_path).load()
+
+    loaded = VectorStore(tmp_path).load()
+
+    assert loaded is not None
+    chunks = loaded[1]
+    assert [chunks.metadata(pos)["chunk_id"] for pos in range(len(chunks))] == ids
+
+
+def test_source_head_follows_delta_records(tmp_path: Path) -> None:
+    """增量日志中的提交标记覆盖快照 manifest 中的 source_head，不带提交的增量保持不变。"""
+    store = VectorStore(tmp_path)
+    save_snapshot(store, [0], source_head="c1")
+    store.append_delta(delta_entries([1]), [], source_head="c2")
+    store.append_delta(delta_entries([2]), [])
+
+    reopened = VectorStore(tmp_path)
+    reopened.load()
+
+    assert store.source_head == "c2"
+    assert reopened.source_head == "c2"
+
+
+def test_source_head_marker_lost_with_truncated_tail(tmp_path: Path) -> None:
+    """崩溃截断了最后一次写入时，提交标记随之丢失，source_head 停留在之前的提交。"""
+    store = VectorStore(tmp_path)
+    save_snapshot(store, [0], source_head="c1")
+    store.append_delta(delta_entries([1]), [], source_head="c2")
+    with store.delta_file.open("r+b") as f:
+        f.truncate(store.delta_file.stat().st_size - 1)
+
+    reopened = VectorStore(tmp_path)
+    reopened.load()
+
+    assert reopened.source_head == "c1"
+
+
+def test_lock_free_load_skips_torn_tail_without_truncating(tmp_path: Path) -> None:
+    """不持锁加载（repair=False）只跳过不完整的尾部记录并置 needs_repair；持锁加载才截断。"""
+    store = VectorStore(tmp_path)
+    save_snapshot(store, [0], source_head="c1")
+    store.append_delta(delta_entries([1]), [], source_head="c2")
+    size = store.delta_file.stat().st_size
+    with store.delta_file.open("r+b") as f:
+        f.truncate(size - 1)
+
+    reader = VectorStore(tmp_path)
+    reader.load(repair=False)
+    assert reader.needs_repair and reader.source_head == "c1"
+    assert store.delta_file.stat().st_size == size - 1
+
+    with reader.write_locked():
+        reader.load()
+    assert not reader.needs_repair and store.delta_file.stat().st_size < size - 1